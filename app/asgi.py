@@ -0,0 +1,446 @@
+# Filename: asgi.py
+# Description: This module is the async (ASGI) entry point of the app
+# Inputs: main (flask app, routes), async_db, db_util, post, university, user
+# Output: ASGI application, entry point of the async server
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import asyncio
+import io
+import sys
+
+import db
+from async_db import DB
+from course import Course
+from db_util import (get_home_page, get_uni_and_course_from_route, parse_feed_cursor,
+                     search_for_course, search_for_university)
+from flask import render_template
+from main import app, not_modified
+from metrics import METRICS
+from post import Post
+from ranking import RANKING
+from session import SESSION
+from university import University
+from user import User
+from view_tracker import VIEW_TRACKER
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+from werkzeug.wrappers import Request
+
+"""
+Serves the same app as main.py over ASGI. The read heavy
+pages (home, university, course, post and search) have
+async handlers: their database work is awaited on the
+bounded executor of async_db, so the event loop keeps
+serving other connections meanwhile. Every other route
+falls through to the regular Flask (sync) view, also run
+on the executor. Run with `python app/asgi.py` (needs
+uvicorn) next to `python app/main.py` to compare the two
+under the same workload.
+
+Bodies are streamed in both directions: the WSGI side
+reads the request body as the ASGI server receives it,
+and every chunk of a response is sent as soon as the app
+yields it, so uploads and exports are never held whole
+in memory.
+"""
+
+HOST = "localhost"
+PORT = 5002
+
+# Export the executor statistics next to the request metrics.
+METRICS.collected(
+    "unihive_async_db_calls_total", "Calls run on the async database executor.", "counter",
+    lambda: {(): DB.stats["calls"]}
+)
+METRICS.collected(
+    "unihive_async_db_running", "Calls running on the async database executor.", "gauge",
+    lambda: {(): DB.stats["running"]}
+)
+
+################################################################################
+
+class RequestBody(io.RawIOBase):
+    """
+    The body of an ASGI HTTP request as a blocking WSGI
+    input stream. Reads run on the executor and wait for
+    the event loop to receive the next chunk, so the body
+    is never read further than the app asked for.
+    """
+    def __init__(self, receive, loop):
+        self.receive = receive     # ASGI receive callable
+        self.loop    = loop        # Event loop receive runs on
+        self.pending = bytearray() # Received, not read yet
+        self.done    = False       # Last chunk received
+        self.data    = None        # Whole body, once load()ed
+
+    def readable(self):
+        """Needed by io for read() to work."""
+        return True
+
+    def feed(self, message: dict):
+        """Buffer a received http.request message."""
+        self.pending += message.get("body", b"")
+        if message["type"] == "http.disconnect" or not message.get("more_body", False):
+            self.done = True
+
+    def readinto(self, buffer):
+        """Read the next received bytes (executor side)."""
+
+        while not self.pending and not self.done:
+            self.feed(asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result())
+
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        del self.pending[:size]
+        return size
+
+    async def load(self):
+        """
+        Receive the whole body (event loop side), for the
+        async handlers that parse small forms themselves.
+        """
+
+        if self.data is None:
+            while not self.done:
+                self.feed(await self.receive())
+            self.data = bytes(self.pending)
+        return self.data
+
+def wsgi_environ(scope: dict, body):
+    """
+    Build the WSGI environ of an ASGI HTTP request so Flask
+    (request context, sessions, url_for) can handle it.
+
+    :param scope: ASGI connection scope.
+    :param body: Request body stream.
+    """
+
+    server = scope.get("server") or (HOST, PORT)
+    client = scope.get("client") or ("", 0)
+
+    environ = {
+        "REQUEST_METHOD"   : scope["method"],
+        "SCRIPT_NAME"      : scope.get("root_path", "").encode().decode("latin1"),
+        "PATH_INFO"        : scope["path"].encode().decode("latin1"),
+        "QUERY_STRING"     : scope["query_string"].decode("latin1"),
+        "SERVER_NAME"      : server[0],
+        "SERVER_PORT"      : str(server[1]),
+        "SERVER_PROTOCOL"  : f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR"      : client[0],
+        "wsgi.version"     : (1, 0),
+        "wsgi.url_scheme"  : scope.get("scheme", "http"),
+        "wsgi.input"       : body,
+        "wsgi.errors"      : sys.stderr,
+        "wsgi.multithread" : True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once"    : False,
+        # The stream ends with the body, even when chunked.
+        "wsgi.input_terminated": True
+    }
+
+    for name, value in scope["headers"]:
+        name  = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+
+    return environ
+
+def call_wsgi(wsgi_app, environ: dict, send):
+    """
+    Call a WSGI app (or response) on the executor and send
+    its output as it is produced, one ASGI message per
+    chunk. send waits until the server took the message,
+    so a slow client slows the app down instead of the
+    output piling up in memory.
+
+    :param send: Blocking version of the ASGI send callable.
+    :returns: The status code.
+    """
+
+    started = {}
+    def start_response(status, headers, exc_info = None):
+        started["status"]  = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+
+    def send_body(chunk: bytes, more_body: bool):
+        if "sent" not in started:
+            started["sent"] = True
+            send({
+                "type"   : "http.response.start",
+                "status" : started["status"],
+                "headers": [(name.lower().encode("latin1"), value.encode("latin1"))
+                            for name, value in started["headers"]]
+            })
+        send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    # A chunk is held back until the next one arrives, so
+    # the last one goes out with more_body = False.
+    result = wsgi_app(environ, start_response)
+    try:
+        previous = b""
+        for chunk in result:
+            if chunk:
+                if previous:
+                    send_body(previous, True)
+                previous = chunk
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+
+    send_body(previous, False)
+    return started["status"]
+
+class AsyncRequest:
+    """
+    An HTTP request being served by an async handler.
+    Wraps the parsed request (args, form), runs the sync
+    parts of a page inside a Flask request context and
+    streams the response.
+    """
+    def __init__(self, scope: dict, receive, send):
+        self.loop    = asyncio.get_running_loop()     # Loop serving the request
+        self.send    = send                           # ASGI send callable
+        self.body    = RequestBody(receive, self.loop) # Request body stream
+        self.environ = wsgi_environ(scope, self.body)  # WSGI view of the request
+        self.request = Request(self.environ)           # Parsed args and form
+
+    @property
+    def args(self):
+        """Query string arguments."""
+        return self.request.args
+
+    async def read_form(self):
+        """Form fields of the body, which is read whole."""
+        await self.body.load()
+        return self.request.form
+
+    def new_environ(self):
+        """
+        Copy of the environ for a WSGI call. The body is
+        replayed if an async handler read it, otherwise it
+        is still streamed.
+        """
+
+        if self.body.data is None:
+            return dict(self.environ)
+        return dict(self.environ, **{"wsgi.input": io.BytesIO(self.body.data)})
+
+    def send_blocking(self, message: dict):
+        """Send an ASGI message from the executor."""
+        asyncio.run_coroutine_threadsafe(self.send(message), self.loop).result()
+
+    async def call(self, view, *args, **kwargs):
+        """
+        Run a sync view function on the executor inside a
+        Flask request context, the same way Flask would call
+        a route (after_request hooks, session, teardown),
+        and send its response.
+
+        :param view: Callable returning anything a route can return.
+        :returns: The status code.
+        """
+        return await DB.run(self._respond, view, args, kwargs)
+
+    async def fallback(self):
+        """
+        Serve the request with the regular Flask app instead,
+        ex: when the async handler found nothing to show, so
+        Flask's routing decides (404 page, redirect, ...).
+        """
+        return await DB.run(call_wsgi, app.wsgi_app, self.new_environ(), self.send_blocking)
+
+    def _respond(self, view, args: tuple, kwargs: dict):
+        """Executor side of call()."""
+
+        environ = self.new_environ()
+        with app.request_context(environ):
+            try:
+                response = app.preprocess_request()
+                if response is None:
+                    response = view(*args, **kwargs)
+                response = app.process_response(app.make_response(response))
+            except HTTPException as e:
+                response = e.get_response(environ)
+            except Exception as e:
+                response = app.make_response(app.handle_exception(e))
+            return call_wsgi(response, environ, self.send_blocking)
+
+################################################################################
+
+def render_page(kind: str, id: int, template: str, **context):
+    """
+    Sync part of a page with an ETag: answer a conditional
+    GET, otherwise render the template.
+
+    :param kind: Kind of the page's entity (ex: "course").
+    :param id: Id of the page's entity.
+    :param template: Template of the page.
+    """
+    return not_modified(kind, id) or render_template(template, **context)
+
+def render_post(post: Post):
+    """
+    Sync part of the post page. The reply tree is only
+    loaded when the client's copy is out of date.
+    """
+
+    # The viewer is only known inside the request context.
+    VIEW_TRACKER.record(SESSION.current_user_id, post.id)
+
+    response = not_modified("post", post.id)
+    if response:
+        return response
+
+    thread = post.thread(User.get_user_by_id(SESSION.current_user_id))
+    return render_template("post.html", post = post, thread = thread)
+
+def render_home(cursor: tuple, everything: bool):
+    """
+    Sync part of the home page. Whose timeline is shown
+    is only known inside the request context.
+    """
+
+    posts, next_cursor, everything = get_home_page(cursor, everything)
+    return render_template("home.html", posts = posts, next_cursor = next_cursor, everything = everything)
+
+async def home(request: AsyncRequest):
+    """Async version of main.home()."""
+
+    cursor = parse_feed_cursor(request.args.get("cursor"))
+    return await request.call(render_home, cursor, request.args.get("feed") == "all")
+
+async def university(request: AsyncRequest, university_acro: str):
+    """Async version of main.university() (GET)."""
+
+    current_university = await DB.run(University.get_university_by_acronym, university_acro)
+    if current_university is None:
+        return await request.fallback()
+
+    return await request.call(
+        render_page, "university", current_university.id,
+        "university_home.html", university = current_university
+    )
+
+async def course(request: AsyncRequest, university_acro: str, course: str):
+    """Async version of main.course() (GET)."""
+
+    stored_university, stored_course = await DB.run(get_uni_and_course_from_route, university_acro, course)
+    if stored_university is None or stored_course is None:
+        return await request.fallback()
+
+    return await request.call(
+        render_page, "course", stored_course.id,
+        "course.html", course = stored_course
+    )
+
+async def post(request: AsyncRequest, university_acro: str, course_name: str, post_identifier: str):
+    """Async version of main.post() (GET)."""
+
+    # Same lookup order as the sync route: by title, then by id.
+    def find_post():
+        university = University.get_university_by_acronym(university_acro)
+        course     = Course.get_course_by_name_combined(university, course_name)
+        return Post.get_post_by_title(post_identifier, course) or Post.get_post_by_id(post_identifier)
+
+    current_post = await DB.run(find_post)
+    if current_post is None:
+        return await request.fallback()
+
+    return await request.call(render_post, current_post)
+
+async def search_university(request: AsyncRequest):
+    """Async version of main.search_university() (POST)."""
+
+    search_content = (await request.read_form()).get("search-content", "")
+    universities   = await DB.run(search_for_university, search_content)
+    return await request.call(
+        render_template, "search_university.html",
+        searched_universities = universities or None,
+        search_content        = search_content
+    )
+
+async def search_course(request: AsyncRequest, university_acro: str):
+    """Async version of main.search_course() (POST)."""
+
+    # The search and the university lookup are independent.
+    search_content = (await request.read_form()).get("search-content", "")
+    courses, current_university = await asyncio.gather(
+        DB.run(search_for_course, search_content, university_acro),
+        DB.run(University.get_university_by_acronym, university_acro)
+    )
+    return await request.call(
+        render_template, "search_course.html",
+        university     = current_university,
+        search_content = search_content,
+        courses        = courses or None
+    )
+
+# Routes served by the async handlers, same URLs as main.py.
+ROUTES = Map([
+    Rule("/",                                                      endpoint = home,              methods = ["GET"]),
+    Rule("/u/<university_acro>",                                   endpoint = university,        methods = ["GET"]),
+    Rule("/u/<university_acro>/<course>",                          endpoint = course,            methods = ["GET"]),
+    Rule("/u/<university_acro>/<course_name>/<post_identifier>",   endpoint = post,              methods = ["GET"]),
+    Rule("/search-university",                                     endpoint = search_university, methods = ["POST"]),
+    Rule("/u/<university_acro>/search-course",                    endpoint = search_course,     methods = ["POST"])
+])
+
+################################################################################
+
+async def lifespan(receive, send):
+    """Handle the ASGI server's startup and shutdown."""
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Same shutdown as main.signal_handler().
+            VIEW_TRACKER.stop()
+            RANKING.stop()
+            DB.shutdown()
+            db.pool.close_all()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    """
+    ASGI application. Requests matching ROUTES go to their
+    async handler, everything else to the Flask app.
+    """
+
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    request = AsyncRequest(scope, receive, send)
+
+    try:
+        handler, arguments = ROUTES.bind_to_environ(request.environ).match()
+    except HTTPException:
+        handler = None
+
+    # The handlers send the response themselves, as it is produced.
+    if handler is not None:
+        await handler(request, **arguments)
+    else:
+        await request.fallback()
+
+def main():
+    '''
+    Entry point for the async app
+    '''
+    try:
+        import uvicorn
+    except ImportError:
+        print("[ASGI ERROR] uvicorn is required to serve the async app (pip install uvicorn)")
+        sys.exit(1)
+
+    uvicorn.run(application, host = HOST, port = PORT)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# Filename: assets.py
+# Description: This module contains the fingerprinted, precompressed static asset pipeline
+# Inputs: Files of app/static (command line to build)
+# Output: ASSETS object instance
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import mimetypes
+import os
+import sys
+
+from flask import abort, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+"""
+The files of app/static are built into app/static/dist
+under a name carrying a hash of their content (ex:
+main.3f2a9c1b04de.css), next to gzip and brotli copies
+of the text files and downscaled copies of the images:
+
+    python3 app/assets.py
+
+Templates link to them with asset_url(filename = ...), which
+takes the same filename as url_for('static') and falls back
+to it for files that haven't been built. A changed file gets
+a new name, so the built files are served by /assets/ with
+immutable far-future cache headers and clients never have to
+revalidate them. Rebuild after changing a static file.
+
+brotli (pip install brotli) and Pillow (pip install Pillow)
+are optional: without them the .br copies and the image
+variants are skipped.
+"""
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR   = os.path.join(STATIC_DIR, "dist")
+
+# Extensions of the files worth precompressing.
+COMPRESSED = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+
+HASH_LENGTH = 12                          # Hex digits of the content hash in names
+IMAGES      = {".png", ".jpg", ".jpeg"}   # Extensions that get downscaled variants
+WIDTHS      = (80, 160, 320, 640, 1280)   # Widths of the image variants (px)
+MAX_AGE     = 365 * 24 * 60 * 60          # Cache lifetime of built files (s)
+
+class Assets:
+    """
+    Manifest of the built static files. Maps the name of
+    a file in app/static to its fingerprinted name, and to
+    the names of its downscaled variants by width.
+    """
+    def __init__(self, static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR):
+        self.static_dir = static_dir # Source files
+        self.dist_dir   = dist_dir   # Built files and manifest
+        self.files      = {}         # Source name -> built name
+        self.variants   = {}         # Source name -> {width: built name}
+        self.loaded     = None       # mtime of the loaded manifest
+
+    @property
+    def manifest(self):
+        """Path of the manifest file."""
+        return os.path.join(self.dist_dir, "manifest.json")
+
+    def load(self):
+        """
+        (Re)load the manifest if it changed on disk, ex: built
+        by another process. Without a manifest nothing is built.
+        """
+
+        try:
+            mtime = os.stat(self.manifest).st_mtime
+        except OSError:
+            self.files, self.variants, self.loaded = {}, {}, None
+            return
+
+        if mtime == self.loaded:
+            return
+
+        with open(self.manifest) as file:
+            manifest = json.load(file)
+        self.files    = manifest["files"]
+        self.variants = {name: {int(width): built for width, built in widths.items()}
+                         for name, widths in manifest["variants"].items()}
+        self.loaded   = mtime
+
+    def url(self, filename: str, width: int = None):
+        """
+        URL of a static file, url_for('static') compatible.
+        Fingerprinted if the file has been built, and for
+        images given a width, the smallest variant at least
+        that wide (the original if none is).
+
+        :param filename: Name of the file in app/static (ex: main.css).
+        :param width: Width the image is shown at (px), doubled for HiDPI by the caller.
+        """
+
+        self.load()
+        built = self.files.get(filename)
+        if built is None:
+            return url_for("static", filename = filename)
+
+        if width is not None:
+            for variant_width, variant in sorted(self.variants.get(filename, {}).items()):
+                if variant_width >= width:
+                    built = variant
+                    break
+
+        return url_for("assets", filename = built)
+
+    def build(self, filenames: list = None):
+        """
+        Build static files into the dist directory and update
+        the manifest. Built files of older versions are kept,
+        so pages rendered before the build still work.
+
+        :param filenames: Names of the files to build, all of app/static if None.
+        :returns: The manifest entries of the built files.
+        """
+
+        os.makedirs(self.dist_dir, exist_ok = True)
+        self.load()
+
+        if filenames is None:
+            filenames = sorted(
+                name for name in os.listdir(self.static_dir)
+                if not name.startswith(".") and os.path.isfile(os.path.join(self.static_dir, name))
+            )
+
+        built = {}
+        for filename in filenames:
+            with open(os.path.join(self.static_dir, filename), "rb") as file:
+                content = file.read()
+
+            self.files[filename] = built[filename] = self.write(filename, content)
+
+            variants = self.write_variants(filename, content)
+            if variants:
+                self.variants[filename] = variants
+            else:
+                self.variants.pop(filename, None)
+
+        # Write the manifest atomically so readers never see half of it.
+        temporary = self.manifest + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump({"files": self.files, "variants": self.variants}, file, indent = 2, sort_keys = True)
+        os.replace(temporary, self.manifest)
+        self.load()
+        return built
+
+    def write(self, filename: str, content: bytes):
+        """
+        Write one file under its fingerprinted name, with its
+        compressed copies. Returns the fingerprinted name.
+        """
+
+        stem, extension = os.path.splitext(filename)
+        name = f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{extension}"
+        path = os.path.join(self.dist_dir, name)
+
+        # Same name, same content: already built.
+        if not os.path.exists(path):
+            with open(path, "wb") as file:
+                file.write(content)
+
+        if extension.lower() in COMPRESSED:
+            for suffix, compressed in compress(content).items():
+                if len(compressed) < len(content):
+                    with open(path + suffix, "wb") as file:
+                        file.write(compressed)
+
+        return name
+
+    def write_variants(self, filename: str, content: bytes):
+        """
+        Write the downscaled variants of an image narrower
+        than it, unless they aren't any smaller. Returns
+        {width: fingerprinted name}, empty for other files
+        or without Pillow.
+        """
+
+        stem, extension = os.path.splitext(filename)
+        if extension.lower() not in IMAGES:
+            return {}
+
+        try:
+            from PIL import Image
+        except ImportError:
+            return {}
+
+        variants = {}
+        with Image.open(io.BytesIO(content)) as image:
+            for width in WIDTHS:
+                if width >= image.width:
+                    break
+
+                height  = max(1, round(image.height * width / image.width))
+                variant = image.resize((width, height), Image.LANCZOS)
+
+                output = io.BytesIO()
+                if extension.lower() == ".png":
+                    variant.save(output, "PNG", optimize = True)
+                else:
+                    variant.convert("RGB").save(output, "JPEG", quality = 85, optimize = True, progressive = True)
+
+                if output.tell() >= len(content):
+                    continue
+                variants[width] = self.write(f"{stem}.{width}w{extension}", output.getvalue())
+        return variants
+
+################################################################################
+
+def compress(content: bytes):
+    """
+    Compressed copies of a file's content, by suffix
+    (.gz, and .br if brotli is installed).
+    """
+
+    # mtime 0 so the same content always gives the same bytes.
+    compressed = {".gz": gzip.compress(content, compresslevel = 9, mtime = 0)}
+
+    try:
+        import brotli
+    except ImportError:
+        return compressed
+
+    compressed[".br"] = brotli.compress(content, quality = 11)
+    return compressed
+
+def send_asset(filename: str):
+    """
+    Response of a built file, from its brotli or gzip copy
+    when the client accepts it, cached for MAX_AGE without
+    revalidation since its name changes with its content.
+
+    :param filename: Fingerprinted name of the file.
+    """
+
+    path = safe_join(ASSETS.dist_dir, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encoding = None
+    for name, suffix in (("br", ".br"), ("gzip", ".gz")):
+        # Not `in`, which ignores q=0 (refused by the client).
+        if request.accept_encodings[name] > 0 and os.path.isfile(path + suffix):
+            filename, encoding = filename + suffix, name
+            break
+
+    response = send_from_directory(ASSETS.dist_dir, filename, mimetype = mimetype, max_age = MAX_AGE)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    if os.path.splitext(path)[1].lower() in COMPRESSED:
+        response.vary.add("Accept-Encoding")
+    response.cache_control.public    = True
+    response.cache_control.immutable = True
+    return response
+
+def main():
+    '''
+    Build every file of app/static (python3 app/assets.py)
+    '''
+
+    built = ASSETS.build(sys.argv[1:] or None)
+    for filename, name in built.items():
+        extras = [f"{width}w" for width in ASSETS.variants.get(filename, {})]
+        for suffix in (".gz", ".br"):
+            if os.path.exists(os.path.join(ASSETS.dist_dir, name + suffix)):
+                extras.append(suffix)
+        print(f"[ASSETS] {filename} -> {name} {' '.join(extras)}")
+
+    # The optional modules, say what was skipped without them.
+    extensions = {os.path.splitext(filename)[1].lower() for filename in built}
+    if extensions & COMPRESSED and importlib.util.find_spec("brotli") is None:
+        print("[ASSETS] brotli is not installed, no .br copies were written (pip install brotli)")
+    if extensions & IMAGES and importlib.util.find_spec("PIL") is None:
+        print("[ASSETS] Pillow is not installed, no image variants were written (pip install Pillow)")
+
+ASSETS = Assets() # Built static files of the app
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Filename: async_db.py
+# Description: This module contains the asyncio friendly database layer
+# Inputs: N/A
+# Output: DB instance
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+"""
+sqlite3 calls block, so awaiting them directly would stall
+the event loop. Instead every blocking call is handed to a
+bounded thread pool. The pool is smaller than the connection
+pool so the view tracker and ranking threads always have a
+connection left, and SQLite never sees more concurrent work
+than it has connections for, however many requests are open.
+"""
+
+WORKERS = db.POOL_SIZE - 2 # Leave connections for the background threads
+
+class AsyncDatabase:
+    """
+    Runs blocking database work (queries, model methods,
+    template rendering that reads lazy properties) on a
+    bounded executor and awaits the result.
+    """
+    def __init__(self, workers: int = WORKERS):
+        self.workers  = workers         # Max calls running at once
+        self.executor = ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "db")
+        self.lock     = threading.Lock() # Guards the statistics
+
+        # Statistics
+        self.calls     = 0   # Calls completed
+        self.running   = 0   # Calls running right now
+        self.peak      = 0   # Most calls running at once
+        self.wait_time = 0.0 # Seconds calls spent queued for a worker
+        self.run_time  = 0.0 # Seconds calls spent running
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Run a blocking callable on the executor.
+
+        :param function: Callable to run (ex: Post.get_post_by_id).
+        :param args: Positional arguments of the callable.
+        :param kwargs: Keyword arguments of the callable.
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(self._call, time.perf_counter(), function, args, kwargs)
+        )
+
+    async def query(self, query: str, parameters: tuple = (), *, count: int = None, factory = None):
+        """Awaitable version of db.query() (same parameters)."""
+        return await self.run(db.query, query, parameters, count = count, factory = factory)
+
+    def _call(self, submitted: float, function, args: tuple, kwargs: dict):
+        """Executor side of run(): time and run the call."""
+
+        start = time.perf_counter()
+        with self.lock:
+            self.running   += 1
+            self.peak       = max(self.peak, self.running)
+            self.wait_time += start - submitted
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            # Return the connection so idle workers don't hold one.
+            db.pool.release()
+            with self.lock:
+                self.running  -= 1
+                self.calls    += 1
+                self.run_time += time.perf_counter() - start
+
+    def shutdown(self):
+        """Wait for running calls and stop the workers."""
+        self.executor.shutdown(wait = True)
+
+    @property
+    def stats(self):
+        """Call counts and the average queue and run times."""
+
+        with self.lock:
+            return {
+                "workers"  : self.workers,
+                "calls"    : self.calls,
+                "running"  : self.running,
+                "peak"     : self.peak,
+                "avg_wait" : self.wait_time / self.calls if self.calls else 0.0,
+                "avg_run"  : self.run_time / self.calls if self.calls else 0.0
+            }
+
+# Database layer of the async (ASGI) app.
+DB = AsyncDatabase()
@@ -0,0 +1,96 @@
+# Filename: blob_store.py
+# Description: This module contains the content addressed file storage
+# Inputs: N/A
+# Output: SYLLABUS_STORE instance
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import hashlib
+import os
+import tempfile
+
+"""
+Uploaded files are kept on disk instead of as BLOBs in
+the database. Each file is named by the SHA-256 digest
+of its contents, so identical uploads are only stored
+once and the digest doubles as a strong HTTP ETag.
+"""
+
+SYLLABUS_DIR = "app/database/syllabi"
+
+CHUNK_SIZE = 64 * 1024 # Bytes read/written per chunk while streaming
+
+class BlobStore:
+    """
+    Directory of immutable files addressed by content digest.
+    Files live in <root>/<first 2 hex chars>/<digest>.
+    """
+    def __init__(self, root: str):
+        self.root = root # Directory the files are stored in
+
+    def path(self, digest: str):
+        """Path of the file with the given digest."""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: str):
+        """Return if a file with the given digest is stored."""
+        return os.path.isfile(self.path(digest))
+
+    def put(self, stream):
+        """
+        Stream a file into the store chunk by chunk, hashing it
+        as it is written so it is never held whole in memory.
+        If the same contents are already stored, the new copy
+        is discarded.
+
+        :param stream: File-like object to read from (ex: an upload).
+        :returns: (digest, size) of the stored file.
+        """
+
+        os.makedirs(self.root, exist_ok = True)
+
+        digest = hashlib.sha256()
+        size   = 0
+
+        # Write to a temporary file next to the store so that
+        # it can be atomically moved into place when complete.
+        handle, temp_path = tempfile.mkstemp(dir = self.root, suffix = ".part")
+        try:
+            with os.fdopen(handle, "wb") as temp:
+                while chunk := stream.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+
+            digest = digest.hexdigest()
+            if self.exists(digest):   # Duplicate contents,
+                os.remove(temp_path)  # keep the stored copy.
+            else:
+                os.makedirs(os.path.dirname(self.path(digest)), exist_ok = True)
+                os.replace(temp_path, self.path(digest))
+
+        except BaseException:
+            # Never leave partial files behind.
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return digest, size
+
+    def put_bytes(self, data: bytes):
+        """
+        Store a file that is already in memory.
+        :returns: (digest, size) of the stored file.
+        """
+
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.exists(digest):
+            os.makedirs(os.path.dirname(self.path(digest)), exist_ok = True)
+            handle, temp_path = tempfile.mkstemp(dir = self.root, suffix = ".part")
+            with os.fdopen(handle, "wb") as temp:
+                temp.write(data)
+            os.replace(temp_path, self.path(digest))
+        return digest, len(data)
+
+# Store of the uploaded syllabus files.
+SYLLABUS_STORE = BlobStore(SYLLABUS_DIR)
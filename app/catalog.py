@@ -0,0 +1,314 @@
+# Filename: catalog.py
+# Description: This module contains the bulk import of course catalogs
+# Inputs: Catalog file (CSV, JSON or JSON Lines), university acronym
+# Output: Import report
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+
+from db import query, query_many, transaction
+from university import University
+from versions import bump
+
+"""
+A catalog lists the courses of one university, one per
+row, with the department each belongs to:
+
+    department,department_name,course_number,course_name,description,hours
+    EECS,Electrical Engineering & Comp Sci,581,Software Engineering II,,3
+
+Only department, course_number and course_name are
+required. The catalog is read and validated first, so
+a slow upload never holds the write lock, then imported
+in a single transaction: departments are resolved in
+memory (one query per batch for the new ones), rows are
+written with executemany, and rows that already exist
+are skipped by the unique keys of departments
+(university, abbreviation) and courses (department,
+course_number) instead of being looked up first.
+"""
+
+BATCH_SIZE     = 1000 # Rows written per executemany
+MAX_ERRORS     = 20   # Invalid rows described in the report
+REQUIRED       = ("department", "course_number", "course_name")
+
+def read_csv(stream):
+    """
+    Stream the rows of a CSV catalog with a header row.
+    :param stream: Binary or text file-like object.
+    """
+
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding = "utf-8-sig", newline = "")
+    yield from csv.DictReader(stream)
+
+def read_json_lines(stream):
+    """
+    Stream the rows of a JSON Lines catalog (one object
+    per line). Invalid lines are yielded as None.
+    """
+
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+def read_json(stream):
+    """
+    Rows of a JSON catalog: either an array of objects, or
+    {"courses": [...]}. Arrays are parsed whole, use JSON
+    Lines for catalogs too large for memory.
+    """
+
+    catalog = json.load(stream)
+    yield from catalog["courses"] if isinstance(catalog, dict) else catalog
+
+# Catalog readers by format name.
+READERS = {
+    "csv"  : read_csv,
+    "json" : read_json,
+    "jsonl": read_json_lines
+}
+
+def catalog_format(filename: str = "", content_type: str = ""):
+    """
+    Guess the format of a catalog from its file name or
+    content type (ex: "courses.csv", "application/json").
+    Returns None if it can't be told.
+    """
+
+    filename     = (filename or "").lower()
+    content_type = (content_type or "").lower()
+
+    if filename.endswith((".jsonl", ".ndjson")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "jsonl"
+    if filename.endswith(".json") or "json" in content_type:
+        return "json"
+    if filename.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    return None
+
+def clean(row):
+    """
+    Normalize a catalog row. Returns the row as a tuple
+    (abbreviation, department name, course number, course
+    name, description, hours), or None if it is invalid.
+    """
+
+    if not isinstance(row, dict):
+        return None
+
+    values = {key: str(row.get(key) or "").strip() for key in
+              ("department", "department_name", "course_number", "course_name", "description", "hours")}
+    if not all(values[key] for key in REQUIRED):
+        return None
+
+    try:
+        hours = int(values["hours"]) if values["hours"] else 0
+    except ValueError:
+        return None
+
+    # Stored like the create course page does: EECS, 581h
+    abbreviation = values["department"].upper()
+    return (
+        abbreviation,
+        values["department_name"] or abbreviation,
+        values["course_number"].lower(),
+        values["course_name"],
+        values["description"],
+        hours
+    )
+
+class CatalogImport:
+    """
+    Import of one catalog into a university. Keeps the
+    departments it has resolved and the running counts
+    of the report.
+    """
+    def __init__(self, university: University):
+        self.university  = university # University the catalog belongs to
+        self.departments = {}         # Abbreviation -> department id
+
+        # Report
+        self.rows        = 0  # Rows read
+        self.invalid     = 0  # Rows missing required fields
+        self.errors      = [] # (row number, reason) of the first invalid rows
+        self.departments_created = 0
+        self.courses_created     = 0
+
+    def load_departments(self, abbreviations: list = None):
+        """
+        Resolve department ids in one query: every department
+        of the university, or just the given abbreviations.
+        """
+
+        sql        = "SELECT abbreviation, id FROM departments WHERE university = ?"
+        parameters = [self.university.id]
+        if abbreviations:
+            sql        += f" AND abbreviation IN ({', '.join('?' * len(abbreviations))})"
+            parameters += abbreviations
+        self.departments.update(query(sql + ";", tuple(parameters)))
+
+    def write(self, batch: list):
+        """Write a batch of clean rows (in the open transaction)."""
+
+        # Create the departments not seen yet.
+        new = {row[0]: row[1] for row in batch if row[0] not in self.departments}
+        if new:
+            before = len(self.departments)
+            query_many(
+                """
+                INSERT INTO departments (name, abbreviation, university) VALUES (?, ?, ?)
+                ON CONFLICT (university, abbreviation) DO NOTHING;
+                """,
+                [(name, abbreviation, self.university.id) for abbreviation, name in new.items()]
+            )
+            self.load_departments(list(new))
+            self.departments_created += len(self.departments) - before
+
+        query_many(
+            """
+            INSERT INTO courses (name, description, course_number, department, hours, university)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (department, course_number) DO NOTHING;
+            """,
+            [
+                (name, description, number, self.departments[abbreviation], hours, self.university.id)
+                for abbreviation, _, number, name, description, hours in batch
+            ]
+        )
+
+    def count_courses(self):
+        """Number of courses of the university."""
+        return query("SELECT COUNT(*) FROM courses WHERE university = ?;", (self.university.id,), count = 1)[0]
+
+    def read(self, rows):
+        """
+        Read and validate every catalog row, counting the
+        invalid ones. Runs before the transaction, since the
+        rows may come straight from an upload.
+
+        :param rows: Iterable of row dicts (see the readers).
+        :returns: The clean rows (see clean()).
+        """
+
+        valid = []
+        for number, row in enumerate(rows, 1):
+            self.rows += 1
+            row = clean(row)
+            if row is None:
+                self.invalid += 1
+                if len(self.errors) < MAX_ERRORS:
+                    self.errors.append((number, f"needs {', '.join(REQUIRED)} and numeric hours"))
+                continue
+            valid.append(row)
+        return valid
+
+    def run(self, rows):
+        """
+        Import catalog rows in a single transaction.
+
+        :param rows: Iterable of row dicts (see the readers).
+        :returns: The report (see report()), or None if the
+                  transaction failed and nothing was imported.
+        """
+
+        start  = time.perf_counter()
+        done   = False
+        before = 0
+        rows   = self.read(rows)
+
+        # Only the writes hold the lock.
+        with transaction():
+            self.load_departments()
+            before = self.count_courses()
+
+            for index in range(0, len(rows), BATCH_SIZE):
+                self.write(rows[index:index + BATCH_SIZE])
+
+            self.courses_created = self.count_courses() - before
+            if self.courses_created or self.departments_created:
+                bump(("university", self.university.id))
+            done = True
+
+        self.seconds = time.perf_counter() - start
+        return self.report() if done else None
+
+    def report(self):
+        """Counts of the import, conflicts are rows that already existed."""
+        return {
+            "university"         : self.university.acronym,
+            "rows"               : self.rows,
+            "courses_created"    : self.courses_created,
+            "departments_created": self.departments_created,
+            "conflicts"          : self.rows - self.invalid - self.courses_created,
+            "invalid"            : self.invalid,
+            "errors"             : [{"row": row, "error": error} for row, error in self.errors],
+            "seconds"            : round(self.seconds, 3),
+            "rows_per_second"    : round(self.rows / self.seconds) if self.seconds else self.rows
+        }
+
+def import_catalog(university: University, stream, format: str):
+    """
+    Import a catalog file into a university.
+
+    :param university: The university the courses belong to.
+    :param stream: The catalog (binary or text file-like object).
+    :param format: One of READERS (csv, json, jsonl).
+    :returns: The import report, None if it failed.
+    """
+
+    if format != "csv" and not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding = "utf-8-sig")
+
+    try:
+        return CatalogImport(university).run(READERS[format](stream))
+    except (ValueError, KeyError, TypeError, csv.Error) as e:
+        # Malformed file (ex: JSON that isn't a catalog).
+        print("[IMPORT ERROR]", e)
+        return None
+
+def main():
+    '''
+    Entry point of the catalog import command
+    '''
+    parser = argparse.ArgumentParser(description = "Import a course catalog into a university.")
+    parser.add_argument("university", help = "acronym of the university (ex: KU)")
+    parser.add_argument("catalog", help = "catalog file (.csv, .json, .jsonl)")
+    parser.add_argument("--format", choices = READERS, help = "catalog format (default: from the file name)")
+    args = parser.parse_args()
+
+    university = University.get_university_by_acronym(args.university)
+    if university is None:
+        print(f"[IMPORT ERROR] University {args.university} does not exist")
+        sys.exit(1)
+
+    format = args.format or catalog_format(args.catalog)
+    if format is None:
+        print(f"[IMPORT ERROR] Can't tell the format of {args.catalog}, use --format")
+        sys.exit(1)
+
+    with open(args.catalog, "rb") as stream:
+        report = import_catalog(university, stream, format)
+    if report is None:
+        sys.exit(1)
+
+    print(
+        f"[IMPORT] {report['rows']} rows in {report['seconds']}s ({report['rows_per_second']} rows/s): "
+        f"{report['courses_created']} courses and {report['departments_created']} departments created, "
+        f"{report['conflicts']} already existed, {report['invalid']} invalid"
+    )
+    for error in report["errors"]:
+        print(f"    row {error['row']}: {error['error']}")
+
+if __name__ == "__main__":
+    main()
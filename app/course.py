@@ -8,28 +8,61 @@
 from enum import IntEnum
 
 from course import *
-from db import query
+from db import query, transaction
 from department import Department
+from eager import load_many, preload
+from identity_map import hydrate, lookup
 from session import SESSION
 from university import University
+from versions import bump
 
 COURSE_PARAMS = "courses.id, courses.name, description, course_number, department, courses.university"
 
 class Course:
+    __slots__ = (
+        "id", "name", "description", "course_number", "department_id", "university_id",
+        "sort_post_type", "_department", "_university"
+    )
+
+    # Relationships that eager.preload can batch load.
+    relations = {
+        "department": ("department_id", "_department", Department.get_departments_by_ids),
+        "university": ("university_id", "_university", University.get_universities_by_ids)
+    }
+
     def __init__(self, id, name, description, course_number, department_id, university_id):
         self.id             = id            # database id
         self.name           = name          # Ex: Software Engineering
         self.description    = description   # Ex: An introduction to software
         self.course_number  = course_number # Ex: 581
-        self.department     = Department.get_department_by_id(department_id) # Department
-        self.university     = University.get_university_by_id(university_id) # University
+        self.department_id  = department_id # Database ID of the department
+        self.university_id  = university_id # Database ID of the university
+        self._department    = None          # Loaded on first access
+        self._university    = None          # Loaded on first access
 
         # self.likes = self.get_num_likes(self.id)
 
-        # Full name, Ex: EECS-581
-        self.name_combined = self.department.name + "-" + str(self.course_number)
         self.sort_post_type = "created" # default sort type 
 
+    @property
+    def department(self):
+        """Department of the course, loaded on first access."""
+        if self._department is None:
+            self._department = Department.get_department_by_id(self.department_id)
+        return self._department
+
+    @property
+    def university(self):
+        """University of the course, loaded on first access."""
+        if self._university is None:
+            self._university = University.get_university_by_id(self.university_id)
+        return self._university
+
+    @property
+    def name_combined(self):
+        """Full name, Ex: EECS-581"""
+        return self.department.abbreviation + "-" + str(self.course_number)
+
     @property
     def posts(self):
         """
@@ -41,63 +74,83 @@ class Course:
         from post import Post
 
         query_str = f"""
-                SELECT id, created, title, content, author, course FROM posts
+                SELECT id, created, title, content, author_id, course FROM posts
                 WHERE course = ? AND parent IS NULL
                 ORDER BY {self.sort_post_type} DESC;
             """
 
 
-        # Return a list of all posts that aren't replies.
-        return [Post(*params) for params in query(
+        # Return a list of all posts that aren't replies,
+        # with the authors the listing shows.
+        return preload(query(
             query_str,
-            (self.id,)
-        )]
+            (self.id,),
+            factory = Post
+        ), "author", "course")
 
 
     @property
-    def average_difficulty(self):
-        """Average difficulty of course getter."""
+    def stats(self):
+        """
+        Running rating aggregates of the course, kept up to
+        date by store_info. Returns (difficulty_sum,
+        difficulty_count, grade_sum, grade_count).
+        """
 
-        # Get all the difficulties that have
-        # been submitted in course ratings.
-        difficulties = query(
+        stats = query(
             """
-                SELECT difficulty FROM course_ratings
-                WHERE course = ? AND difficulty IS NOT NULL;
+                SELECT difficulty_sum, difficulty_count, grade_sum, grade_count
+                FROM course_stats WHERE course = ?;
             """,
-            (self.id,)
+            (self.id,),
+            count = 1
         )
+        return stats or (0, 0, 0, 0)
+
+    def stat_counts(self, field: str):
+        """
+        Histogram of a rating field ('hours', 'grade' or
+        'instructor'), most submitted value first.
+        :return: List of (value, count) tuples.
+        """
+
+        return query(
+            """
+                SELECT value, count FROM course_stat_counts
+                WHERE course = ? AND field = ?
+                ORDER BY count DESC, value;
+            """,
+            (self.id, field)
+        )
+
+    @property
+    def average_difficulty(self):
+        """Average difficulty of course getter."""
+
+        difficulty_sum, difficulty_count, _, _ = self.stats
 
         # If there haven't been any entries
         # for difficulty, then return None.
-        if not len(difficulties):
+        if not difficulty_count:
             return None
 
         # Return the average difficulty across all ratings.
-        return sum(i[0] for i in difficulties) / len(difficulties)
+        return difficulty_sum / difficulty_count
 
 
     @property
     def average_grade(self):
         """Average grade of course getter."""
 
-        # Get all the grade ints that have
-        # been submitted in course ratings.
-        grades = query(
-            """
-                SELECT grade FROM course_ratings
-                WHERE course = ? AND grade IS NOT NULL;
-            """,
-            (self.id,)
-        )
+        _, _, grade_sum, grade_count = self.stats
 
         # If there haven't been any entries
         # for grade value, then return None.
-        if not len(grades):
+        if not grade_count:
             return None
 
         # Get the average grade across all entries.
-        mean = sum(i[0] for i in grades) / len(grades)
+        mean = grade_sum / grade_count
 
         # Cast the result to a Grade enum.
         return Grade(round(mean))
@@ -106,65 +159,21 @@ class Course:
     def credit_hours(self):
         """Mode credit hours of course getter."""
 
-
-        # Get all the credit hours that have
-        # been submitted in course ratings.
-        hours = query(
-            """
-                SELECT hours FROM course_ratings
-                WHERE course = ? AND hours IS NOT NULL;
-            """,
-            (self.id,)
-        )
+        # Get the mode of credit_hours. Presumably,
+        # the mode will be the "correct" value.
+        hours = self.stat_counts("hours")
 
         # If there haven't been any entries
         # for credit hours, then return None.
-        if not len(hours):
+        if not hours:
             return None
 
-        hour_table = {}                         # Create frequency map
-        for submission in hours:                # For each submission,
-            if submission[0] in hour_table:     # If already in the table,
-                hour_table[submission[0]] += 1  # Increment the frequency
-            else:                               # Otherwise, new value
-                hour_table[submission[0]] = 1   # Set the frequency to one
-
-        # Get the mode of credit_hours. Presumably,
-        # the mode will be the "correct" value.
-        new_hours = max(hour_table, key = lambda x: hour_table[x])
-        query(
-            """
-            UPDATE courses 
-            SET hours = ?
-            WHERE id = ?
-            """,
-            (new_hours, self.id)
-        )
-
-
-        return new_hours
+        return hours[0][0]
 
     @property
     def instructors(self) -> list[str]:
-        """Instructors that supposedly teach this course."""
-
-        # Get all the instructors that have
-        # been submitted in course ratings.
-        instructors = query(
-            """
-                SELECT instructor FROM course_ratings
-                WHERE course = ? AND instructor IS NOT NULL;
-            """,
-            (self.id,)
-        )
-
-        # If there haven't been any entries
-        # for instructors return empty list.
-        if not len(instructors):
-            return []
-
-        # Deconstruct the query array to strings.
-        return [i[0] for i in instructors]
+        """Instructors that supposedly teach this course, most submitted first."""
+        return [instructor for instructor, _ in self.stat_counts("instructor")]
 
     @property 
     def syllabus_names(self): 
@@ -184,6 +193,17 @@ class Course:
         return [name[0] for name in syllabus_file_names]
 
 
+    @staticmethod
+    def from_row(id, name, description, course_number, department_id, university_id):
+        """
+        Construct a course from a database row,
+        reusing the request's copy if already loaded.
+        """
+        return hydrate(
+            ("course", id),
+            lambda: Course(id, name, description, course_number, department_id, university_id)
+        )
+
     @staticmethod
     def get_course_by_id(id: int):
         """
@@ -191,13 +211,23 @@ class Course:
         Return None if course not found.
         """
 
-        params = query(
-            f"SELECT {COURSE_PARAMS} FROM courses WHERE id = ?",
-            (id,),
-            count = 1
-        )
-        if not params: return None # Course not found
-        return Course(*params)     # Construct course object
+        def load():
+            return query(
+                f"SELECT {COURSE_PARAMS} FROM courses WHERE id = ?",
+                (id,),
+                count   = 1,
+                factory = Course.from_row
+            ) or None # None if course not found
+
+        return lookup(("course", id), load)
+
+    @staticmethod
+    def get_courses_by_ids(ids: list):
+        """
+        Get courses by their database ids in one query.
+        Returns a dict of id -> Course of the ids found.
+        """
+        return load_many("course", ids, f"SELECT {COURSE_PARAMS} FROM courses", Course.from_row)
 
     @staticmethod
     def get_course_by_name_combined(university: University, name_combined: str):
@@ -209,7 +239,7 @@ class Course:
         :returns: Course object or None if course not found.
         """
 
-        params = query(
+        return query(
             f"""
                 SELECT {COURSE_PARAMS} FROM courses
                 INNER JOIN departments
@@ -218,10 +248,9 @@ class Course:
                 AND (departments.abbreviation || '-' || courses.course_number) = ?;
             """,
             (university.id, name_combined.upper()),
-            count = 1
-        )
-        if not params: return None # Course not found
-        return Course(*params)     # Construct course object
+            count   = 1,
+            factory = Course.from_row
+        ) or None # None if course not found
 
     @staticmethod
     def get_course_by_name(university: University, name: str):
@@ -233,13 +262,12 @@ class Course:
         :returns: Course object or None if course not found.
         """
 
-        params = query(
+        return query(
             f"SELECT {COURSE_PARAMS} FROM courses WHERE name = ? AND university = ?",
             (name, university.id),
-            count = 1
-        )
-        if not params: return None # Course not found
-        return Course(*params)     # Construct course object
+            count   = 1,
+            factory = Course.from_row
+        ) or None # None if course not found
 
     @staticmethod
     def get_course_by_course_number(university: University, department: Department, course_number: int):
@@ -252,16 +280,15 @@ class Course:
         :returns: Course object or None if course not found.
         """
 
-        params = query(
+        return query(
             f"""
                 SELECT {COURSE_PARAMS} FROM courses
                 WHERE university = ? AND department = ? AND course_number = ?;
             """,
             (university.id, department.id, course_number),
-            count = 1
-        )
-        if not params: return None # Course not found
-        return Course(*params)     # Construct course object
+            count   = 1,
+            factory = Course.from_row
+        ) or None # None if course not found
 
 
 
@@ -279,53 +306,108 @@ class Course:
         :param instructor: The name of the course's professor.
         """
 
-        # Check if the user has already submitted
-        # information for this particular course.
-        user_already_submitted = bool(query(
-            """
-                SELECT * FROM course_ratings
-                WHERE user = ? AND course = ?;
-            """,
-            (user.id, self.id),
-            count = 1
-        ))
-
-        if user_already_submitted:
-            # If the user has submitted info to this course
-            # before, we modify their existing information.
-            query(
+        with transaction():
+            # Get the user's previous submission for this
+            # course, if they have already submitted one.
+            old = query(
                 """
-                    UPDATE course_ratings SET
-                        difficulty = COALESCE(?, difficulty),
-                        grade      = COALESCE(?, grade),
-                        hours      = COALESCE(?, hours),
-                        instructor = COALESCE(?, instructor)
+                    SELECT difficulty, grade, hours, instructor FROM course_ratings
                     WHERE user = ? AND course = ?;
                 """,
-                (difficulty, grade, credit_hours, instructor, user.id, self.id)
+                (user.id, self.id),
+                count = 1
+            ) or (None, None, None, None)
+
+            # If the user has submitted info to this course before, we
+            # modify their existing information, otherwise we create a
+            # new entry for their info. Either way, get the new entry.
+            new = query(
+                """
+                    INSERT INTO course_ratings (user, course, difficulty, grade, hours, instructor)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (user, course) DO UPDATE SET
+                        difficulty = COALESCE(excluded.difficulty, difficulty),
+                        grade      = COALESCE(excluded.grade, grade),
+                        hours      = COALESCE(excluded.hours, hours),
+                        instructor = COALESCE(excluded.instructor, instructor)
+                    RETURNING difficulty, grade, hours, instructor;
+                """,
+                (user.id, self.id, difficulty, grade, credit_hours, instructor),
+                count = 1
             )
 
-            # also have to store inside course  (yeah this is bad)
-            # query(
-            #     """
-            #         UPDATE courses SET
-            #             hours      = COALESCE(?, hours),
-            #         WHERE user = ? AND course = ?;
-            #     """,
-            #     (credit_hours, user.id, self.id)
-            # )
-        else:
-            # Otherwise, if this is the first time,
-            # we create a new entry for their info.
+            self._update_stats(old, new)
+            bump(("course", self.id))
+
+    def _update_stats(self, old: tuple, new: tuple):
+        """
+        Apply the change from an old to a new rating submission
+        to the course's aggregates. Must run in the same
+        transaction as the rating change itself.
+
+        :param old: Previous (difficulty, grade, hours, instructor), Nones if none.
+        :param new: New (difficulty, grade, hours, instructor).
+        """
+
+        def delta(old_value, new_value):
+            """Change to the running (sum, count) of a field."""
+            return (
+                (new_value or 0) - (old_value or 0),
+                (new_value is not None) - (old_value is not None)
+            )
+
+        query(
+            """
+                INSERT INTO course_stats (course, difficulty_sum, difficulty_count, grade_sum, grade_count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (course) DO UPDATE SET
+                    difficulty_sum   = difficulty_sum   + excluded.difficulty_sum,
+                    difficulty_count = difficulty_count + excluded.difficulty_count,
+                    grade_sum        = grade_sum        + excluded.grade_sum,
+                    grade_count      = grade_count      + excluded.grade_count;
+            """,
+            (self.id, *delta(old[0], new[0]), *delta(old[1], new[1]))
+        )
+
+        # Move the submission between histogram buckets.
+        for field, old_value, new_value in zip(("grade", "hours", "instructor"), old[1:], new[1:]):
+            if old_value == new_value:
+                continue
+
+            for value, change in ((old_value, -1), (new_value, 1)):
+                if value is None:
+                    continue
+                query(
+                    """
+                        INSERT INTO course_stat_counts (course, field, value, count)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT (course, field, value) DO UPDATE SET
+                            count = count + excluded.count;
+                    """,
+                    (self.id, field, value, change)
+                )
+
             query(
                 """
-                    INSERT INTO course_ratings (user, course, difficulty, grade, hours, instructor)
-                    VALUES (?, ?, ?, ?, ?, ?);
+                    DELETE FROM course_stat_counts
+                    WHERE course = ? AND field = ? AND count <= 0;
                 """,
-                (user.id, self.id, difficulty, grade, credit_hours, instructor)
+                (self.id, field)
             )
 
-
+            # Keep the courses.hours column (used for sorting) on the mode.
+            if field == "hours":
+                query(
+                    """
+                        UPDATE courses SET hours = (
+                            SELECT value FROM course_stat_counts
+                            WHERE course = ? AND field = 'hours'
+                            ORDER BY count DESC, value LIMIT 1
+                        )
+                        WHERE id = ?;
+                    """,
+                    (self.id, self.id)
+                )
 
 
 class Grade(IntEnum):
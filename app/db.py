@@ -5,7 +5,14 @@
 # Authors: Andrew Ward
 # Creation Date: 10/24/2024
 
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import query_log
 
 """
 Decided to go with SQLite for development since
@@ -15,14 +22,179 @@ is interoperable with PostgresSQL allowing easy
 migration to a more fitting database later.
 """
 
-DATABASE_FILE = "app/database/unihive.db"
+# Path of the database, UNIHIVE_DATABASE overrides it (ex: benchmark datasets).
+DATABASE_FILE = os.environ.get("UNIHIVE_DATABASE", "app/database/unihive.db")
+
+POOL_SIZE        = 8         # Connections kept open for reuse
+CHECKOUT_TIMEOUT = 5         # Seconds to wait for an idle connection
+CACHE_SIZE       = -16000    # Page cache per connection (negative = KiB)
+MMAP_SIZE        = 268435456 # Bytes of the DB file to memory map (256 MiB)
+BUSY_TIMEOUT     = 5000      # Milliseconds SQLite waits on a locked DB
+BUSY_RETRIES     = 3         # Extra attempts when the DB is still locked
+STREAM_BATCH     = 500       # Rows fetched at a time by stream()
+
+class ConnectionPool:
+    """
+    Pool of SQLite connections. Every thread checks out
+    its own connection on first use and keeps it until
+    it is released (ex: at the end of a request), so
+    requests no longer contend on a single connection.
+    Connections run in WAL mode so readers do not block
+    behind writers.
+    """
+    def __init__(self, database: str, size: int = POOL_SIZE):
+        self.database = database          # Path to the database file
+        self.size     = size              # Max idle connections kept
+        self.idle     = queue.LifoQueue() # Connections ready for reuse
+        self.local    = threading.local() # Connection of each thread
+        self.lock     = threading.Lock()  # Guards the counters below
+        self.opened   = 0                 # Connections currently open
+
+        # Statistics
+        self.checkouts    = 0   # Connections handed to threads
+        self.wait_time    = 0.0 # Seconds spent waiting on checkouts
+        self.busy_retries = 0   # Statements retried on a locked DB
+
+    def _open(self):
+        """Open a new connection with the tuned pragmas."""
+
+        connection = sqlite3.connect(
+            self.database,
+            timeout           = BUSY_TIMEOUT / 1000,
+            check_same_thread = False # Connections move between threads
+        )
+        connection.execute("PRAGMA journal_mode = WAL;")
+        connection.execute("PRAGMA synchronous = NORMAL;")
+        connection.execute(f"PRAGMA cache_size = {int(CACHE_SIZE)};")
+        connection.execute(f"PRAGMA mmap_size = {int(MMAP_SIZE)};")
+        connection.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT)};")
+        return connection
+
+    def connection(self):
+        """
+        Get the calling thread's connection, checking one out
+        of the pool (or opening a new one) on first use. Waits
+        up to CHECKOUT_TIMEOUT for an idle connection when the
+        pool is exhausted, then opens an overflow connection.
+        """
+
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            return connection
+
+        start = time.perf_counter()
+        try:
+            connection = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.size
+                if can_open:
+                    self.opened += 1
+            try:
+                connection = self._open() if can_open else self.idle.get(timeout = CHECKOUT_TIMEOUT)
+            except queue.Empty:
+                with self.lock:
+                    self.opened += 1
+                connection = self._open()
+
+        with self.lock:
+            self.checkouts += 1
+            self.wait_time += time.perf_counter() - start
+
+        self.local.connection = connection
+        self.local.depth      = 0 # Transaction nesting depth
+        return connection
+
+    def release(self):
+        """
+        Return the calling thread's connection to the pool.
+        Any transaction left open is rolled back first.
+        """
+
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            return
+
+        self.local.connection = None
+        if connection.in_transaction:
+            connection.rollback()
+
+        # Keep the connection for reuse unless the pool is full.
+        if self.idle.qsize() < self.size:
+            self.idle.put(connection)
+        else:
+            with self.lock:
+                self.opened -= 1
+            connection.close()
+
+    def close_all(self):
+        """Close every idle connection (ex: on shutdown)."""
 
-# Create a connection to the database housed inside the database file.
-connection = sqlite3.connect(DATABASE_FILE, check_same_thread = False)
+        self.release()
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self.lock:
+                self.opened -= 1
+
+    @property
+    def depth(self):
+        """Transaction nesting depth of the calling thread."""
+        return getattr(self.local, "depth", 0)
+
+    @depth.setter
+    def depth(self, value):
+        self.local.depth = value
+
+    @property
+    def stats(self):
+        """Pool statistics for reporting."""
+        with self.lock:
+            return {
+                "open"        : self.opened,
+                "idle"        : self.idle.qsize(),
+                "checkouts"   : self.checkouts,
+                "wait_time"   : self.wait_time,
+                "busy_retries": self.busy_retries
+            }
+
+# Pool of connections to the database housed inside the database file.
+pool = ConnectionPool(DATABASE_FILE)
 
 ################################################################################
 
-def query(query: str, parameters: tuple = tuple(), *, count: int = None):
+def is_busy(error: sqlite3.Error):
+    """Return if the error is a locked/busy database."""
+    return isinstance(error, sqlite3.OperationalError) and \
+        ("locked" in str(error) or "busy" in str(error))
+
+def execute(connection: sqlite3.Connection, cursor: sqlite3.Cursor, query: str, parameters):
+    """
+    Execute a statement, retrying up to BUSY_RETRIES times if
+    the database is still locked after SQLite's busy timeout.
+    Statements inside a transaction are never retried alone.
+    """
+
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            return cursor.execute(query, parameters)
+        except sqlite3.Error as e:
+            if not is_busy(e) or connection.in_transaction or attempt == BUSY_RETRIES:
+                raise
+            with pool.lock:
+                pool.busy_retries += 1
+
+def row_factory(factory):
+    """
+    SQLite row factory building each row with a model
+    constructor (ex: Course.from_row) called with the
+    row's columns, instead of returning a tuple.
+    """
+    return lambda cursor, row: factory(*row)
+
+def query(query: str, parameters: tuple = tuple(), *, count: int = None, factory = None):
     """
     Wrapper function for all database queries. Used
     to abstract away the database & add portability.
@@ -30,12 +202,21 @@ def query(query: str, parameters: tuple = tuple(), *, count: int = None):
     :param query: SQL query to execute safely.
     :param parameters: Injection proof params.
     :param count: Number of rows to fetch for.
+    :param factory: Builds each row from its columns (ex: User.from_row).
     """
 
+    connection = pool.connection()                # Thread's own connection
+    cursor     = connection.cursor()              # Create a database cursor
+    start      = time.perf_counter()              # Timed for the query log
+    if factory is not None:                       # Rows as model objects
+        cursor.row_factory = row_factory(factory)
     try:
-        cursor = connection.cursor()               # Create a database cursor
-        result = cursor.execute(query, parameters) # Execute the query safely
-        connection.commit()                        # Commit the changes to DB
+        result = execute(connection, cursor, query, parameters) # Execute the query safely
+
+        # Writes outside of transaction() are committed right away.
+        # Reads never open a transaction, so they skip the commit.
+        if not pool.depth and connection.in_transaction:
+            connection.commit()
 
         if count is None:                  # If the count was not set
             return result.fetchall()       # Fetch every row in query
@@ -45,6 +226,11 @@ def query(query: str, parameters: tuple = tuple(), *, count: int = None):
             return result.fetchmany(count) # Fetch desired row amount
 
     except sqlite3.Error as e:
+        # Inside a transaction the error is raised
+        # so that the whole transaction is undone.
+        if pool.depth:
+            raise
+
         # If the query encounters an error,
         # print the error and return false.
         print("[QUERY ERROR]", e)
@@ -53,6 +239,141 @@ def query(query: str, parameters: tuple = tuple(), *, count: int = None):
     finally:
         # Always close the database cursor.
         cursor.close()
+        query_log.record(query, parameters, time.perf_counter() - start)
+
+def query_many(query: str, parameters: list):
+    """
+    Batched counterpart of query(). Executes the same
+    statement once for every parameter tuple given,
+    as a single executemany call.
+
+    :param query: SQL query to execute safely.
+    :param parameters: List of injection proof param tuples.
+    :returns: True on success, else False.
+    """
+
+    connection = pool.connection()                # Thread's own connection
+    cursor     = connection.cursor()              # Create a database cursor
+    start      = time.perf_counter()              # Timed for the query log
+    try:
+        cursor.executemany(query, parameters)     # Execute the batch safely
+
+        if not pool.depth and connection.in_transaction:
+            connection.commit()                    # Commit unless in transaction()
+        return True
+
+    except sqlite3.Error as e:
+        # Inside a transaction the error is raised
+        # so that the whole transaction is undone.
+        if pool.depth:
+            raise
+
+        # If the query encounters an error,
+        # print the error and return false.
+        print("[QUERY ERROR]", e)
+        return False
+
+    finally:
+        # Always close the database cursor.
+        cursor.close()
+        query_log.record(query, parameters, time.perf_counter() - start)
+
+def stream(query: str, parameters: tuple = tuple(), batch: int = STREAM_BATCH):
+    """
+    Generator counterpart of query() for reads too large to
+    fetch at once (ex: exports). SQLite steps the statement
+    only as rows are fetched, so fetching batch rows at a
+    time keeps memory constant however many rows match.
+    Errors are printed like in query() and end the stream.
+
+    :param query: SQL query to execute safely.
+    :param parameters: Injection proof params.
+    :param batch: Rows fetched per step.
+    """
+
+    connection = pool.connection()                # Thread's own connection
+    cursor     = connection.cursor()              # Create a database cursor
+    elapsed    = 0.0                              # Time spent in SQLite only
+    try:
+        start = time.perf_counter()
+        execute(connection, cursor, query, parameters)
+        rows     = cursor.fetchmany(batch)
+        elapsed += time.perf_counter() - start
+
+        while rows:
+            yield from rows
+            start    = time.perf_counter()
+            rows     = cursor.fetchmany(batch)
+            elapsed += time.perf_counter() - start
+
+    except sqlite3.Error as e:
+        if pool.depth:
+            raise
+        print("[QUERY ERROR]", e)
+
+    finally:
+        # Also closes the statement if iteration stopped early.
+        cursor.close()
+        query_log.record(query, parameters, elapsed)
+
+@contextmanager
+def transaction():
+    """
+    Unit of work: group every query made inside of the
+    with block into a single atomic transaction. It is
+    committed once when the block ends or rolled back on
+    error. Transactions may be nested; only the outermost
+    one commits. Errors are printed like in query().
+    """
+
+    connection = pool.connection()
+    pool.depth += 1
+    if pool.depth == 1:
+        pool.local.on_commit = [] # Callbacks of on_commit()
+
+    committed = False
+    try:
+        if pool.depth == 1:  # Outermost transaction, take the write lock now.
+            execute(connection, connection.cursor(), "BEGIN IMMEDIATE;", ())
+        yield
+    except sqlite3.Error as e:
+        if pool.depth > 1:  # Let the outermost
+            raise           # transaction handle it.
+
+        # Undo every query made in the transaction.
+        if connection.in_transaction:
+            connection.rollback()
+        print("[TRANSACTION ERROR]", e)
+    except BaseException:
+        if pool.depth == 1 and connection.in_transaction:
+            connection.rollback()
+        raise
+    else:
+        if pool.depth == 1:
+            connection.commit()
+            committed = True
+    finally:
+        pool.depth -= 1
+
+    # Run outside of the transaction, in registration order.
+    if committed:
+        for callback in pool.local.on_commit:
+            callback()
+
+def on_commit(callback):
+    """
+    Run a callback once the current unit of work commits
+    (ex: invalidating a cache of the rows it wrote). It is
+    dropped if the transaction is rolled back, and runs
+    right away when called outside of a transaction.
+
+    :param callback: Callable taking no arguments.
+    """
+
+    if pool.depth:
+        pool.local.on_commit.append(callback)
+    else:
+        callback()
 
 ################################################################################
 
@@ -195,13 +516,13 @@ def create_tables():
 
     try:
         # Create database cursor
-        cursor = connection.cursor()
+        cursor = pool.connection().cursor()
 
         for table in tables:      # For every table listed above,
             cursor.execute(table) # Create the table for the DB.
 
         # Commit query to database.
-        connection.commit()
+        pool.connection().commit()
 
     except sqlite3.Error as e:
         # If the query encounters an error,
@@ -218,5 +539,10 @@ def create_tables():
 
 ################################################################################
 
-# Initialize the tables on load
+# Initialize the tables and bring the schema up to date on load
 create_tables()
+
+from migrations import migrate
+
+migrate()
+pool.release()
@@ -6,16 +6,22 @@
 # Creation Date: 10/25/2024
 
 
-from io import BytesIO
+import os
+import re
 
+from blob_store import SYLLABUS_STORE
 from course import *
-from db import query
+from db import on_commit, query, transaction
+from eager import preload
 from department import *
 from flask import send_file
+from fragment_cache import SIDEBAR_CACHE
 from post import *
 from session import *
+from timeline import TIMELINE
 from university import *
 from user import *
+from versions import bump
 
 ################################################################################
 
@@ -29,13 +35,17 @@ def store_course(course_name: str, course_number: int, department: Department):
     :param department: The department the course belongs to.
     """
 
-    return query(
-        """
-            INSERT INTO courses (name, description, course_number, department, hours, university)
-            VALUES (?, ?, ?, ?, ?, ?);
-        """,
-        (course_name, "", course_number, department.id, 0, department.university.id)
-    )
+    result = False # Stays False if the transaction fails
+    with transaction():
+        result = query(
+            """
+                INSERT INTO courses (name, description, course_number, department, hours, university)
+                VALUES (?, ?, ?, ?, ?, ?);
+            """,
+            (course_name, "", course_number, department.id, 0, department.university.id)
+        )
+        bump(("university", department.university.id))
+    return result
 
 def store_university_follow(university: University):
     """
@@ -44,10 +54,18 @@ def store_university_follow(university: University):
     """
 
     user = USERS[SESSION.current_user_id] # @TODO: Replace this
-    return query(
-        "INSERT INTO user_universities (user, university) VALUES (?, ?);",
-        (user.id, university.id)
-    )
+    result = False # Stays False if the transaction fails
+    with transaction():
+        result = query(
+            "INSERT INTO user_universities (user, university) VALUES (?, ?);",
+            (user.id, university.id)
+        )
+        bump(("user", user.id))
+        TIMELINE.follow(user.id, university = university) # Add its posts to the home timeline
+
+        # Re-render the user's sidebar once the follow is saved.
+        on_commit(lambda: SIDEBAR_CACHE.invalidate(user.id, "followed_universities"))
+    return result
 
 def store_course_follow(course: Course):
     """
@@ -56,10 +74,18 @@ def store_course_follow(course: Course):
     """
 
     user = USERS[SESSION.current_user_id] # @TODO: Replace this
-    return query(
-        "INSERT INTO user_courses (user, course) VALUES (?, ?);",
-        (user.id, course.id)
-    )
+    result = False # Stays False if the transaction fails
+    with transaction():
+        result = query(
+            "INSERT INTO user_courses (user, course) VALUES (?, ?);",
+            (user.id, course.id)
+        )
+        bump(("user", user.id))
+        TIMELINE.follow(user.id, course = course) # Add its posts to the home timeline
+
+        # Re-render the user's sidebar once the follow is saved.
+        on_commit(lambda: SIDEBAR_CACHE.invalidate(user.id, "followed_courses"))
+    return result
 
 def store_course_info(course: Course, difficulty: float, grade: Grade, hours: int):
     """
@@ -122,16 +148,17 @@ def get_posts_user_recent():
     from post import Post
 
     query_str = f"""
-            SELECT id, created, title, content, author, course FROM posts
-            WHERE author = ? AND parent IS NULL ORDER BY created DESC;
+            SELECT id, created, title, content, author_id, course FROM posts
+            WHERE author_id = ? AND parent IS NULL ORDER BY created DESC;
         """
 
-    # Return a list of all posts that aren't replies.
-    # TODO: should be comparing the author id, not the author username for more safety but this works
-    posts = [Post(*params) for params in query(
+    # Return a list of all posts that aren't replies, with the
+    # courses (and their universities) the profile links to.
+    posts = preload(query(
         query_str,
-        (USERS[SESSION.current_user_id].username,)
-    )] 
+        (SESSION.current_user_id,),
+        factory = Post
+    ), "author", "course.department", "course.university")
 
     # kind of bad but it works 
     # uses slicing to get recent posts
@@ -144,23 +171,28 @@ def get_posts_user_recent():
 
 ################################################################################
 
-def store_syllabus(course_name_combined: str, file_name: str, file: bytes): 
+def store_syllabus(course: Course, file_name: str, file): 
     """
-    Upload syllabus to the database using, the course_name_combined, file_name,
-    and file (in bytes) 
+    Upload syllabus to the syllabus file store using, the course,
+    file_name, and file. The file is streamed to disk, identical files are
+    only stored once, and the database only records the file's digest.
 
-    :param coursename: Course name combined (ex: EECS-388)
+    :param course: The course the syllabus belongs to
     :param file_name: File name (ex: eecs388-syllabus)
-    :param file: Actual file data in bytes 
-    """
-    # TODO: store syllabus course 
-    return query(
-        """
-        INSERT INTO syllabus (coursename, filename, file)
-        VALUES (?, ?, ?);
-        """,
-        (course_name_combined, file_name, file)
-    )
+    :param file: File-like object to read the upload from
+    """
+    digest, size = SYLLABUS_STORE.put(file)
+    result = False # Stays False if the transaction fails
+    with transaction():
+        result = query(
+            """
+            INSERT INTO syllabus (coursename, filename, digest, size)
+            VALUES (?, ?, ?, ?);
+            """,
+            (course.name_combined, file_name, digest, size)
+        )
+        bump(("course", course.id))
+    return result
 
 def store_department(department_name: str, abbreviation: str, university: University):
     """
@@ -214,14 +246,22 @@ def store_post(course: Course, title: str, post_body: str):
 
     user = USERS[SESSION.current_user_id] # @TODO: Replace this
 
-    # Insert a new post into the database.
-    return query(
-        """
-        INSERT INTO posts (title, content, author, author_id, course)
-        VALUES (?, ?, ?, ?, ?);
-        """,
-        (title, post_body, user.username, user.id, course.id)
-    )
+    # Insert a new post into the database and add
+    # it to the home timelines of the followers.
+    result = False # Stays False if the transaction fails
+    with transaction():
+        result = query(
+            """
+            INSERT INTO posts (title, content, author, author_id, course)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING id, created;
+            """,
+            (title, post_body, user.username, user.id, course.id),
+            count = 1
+        )
+        TIMELINE.fan_out(course, *result)
+        bump(("course", course.id))
+    return result
 
 ################################################################################
 
@@ -238,7 +278,7 @@ def sort_courses(sort_type : str, university: University):
     elif sort_type == "Department": 
         university.sort_course_type = "name" 
     elif sort_type == "Popularity": 
-        university.sort_course_type = "popularity_score" 
+        university.sort_course_type = "hot" 
     elif sort_type == "Credit Hours": 
         university.sort_course_type = "hours" 
 
@@ -253,80 +293,217 @@ def sort_posts(sort_type : str, course: Course):
     if sort_type == "Date Created": 
         course.sort_post_type = "created" 
     elif sort_type == "Popularity": 
-        course.sort_post_type = "likes" 
+        course.sort_post_type = "hot" 
 
 ################################################################################
 
 def download_syllabus(filename : str, course_name_combined : str) : 
     """
-    Show a syllabus file from the sqlite database 
+    Show a syllabus file from the syllabus file store. The file is sent
+    straight from disk (sendfile when the server supports it) with its
+    digest as ETag, so conditional and Range requests are supported.
 
     :param filename: the filename (ex: syllabus2024.pdf) 
-    :param course_name_combined: the syllabus from the particular course (ex: eecs-581) 
+    :param course_name_combined: the syllabus from the particular course (ex: EECS-581) 
     """
-    syllabus_data = query("""SELECT file FROM syllabus WHERE coursename = ? AND filename = ?;""" ,(course_name_combined,filename))
-    
-    if syllabus_data is None: 
+    syllabus_data = query(
+        """SELECT digest FROM syllabus WHERE coursename = ? AND filename = ?;""",
+        (course_name_combined.upper(), filename), # Old links are lowercase
+        count = 1
+    )
+
+    if not syllabus_data or not SYLLABUS_STORE.exists(syllabus_data[0]): 
         return None
 
-    file_data = syllabus_data[0][0]
-    # print(file_data)
-    file_stream = BytesIO(file_data)
+    digest = syllabus_data[0]
 
     # shows the user the file in browser 
     # if you wanted to download the file immediately after the request, change as_attachment
     # to true 
-    return send_file(file_stream, as_attachment=False, download_name=filename) 
+    return send_file(
+        os.path.abspath(SYLLABUS_STORE.path(digest)),
+        as_attachment = False,
+        download_name = filename,
+        conditional   = True,         # Answer Range / If-None-Match
+        etag          = digest,       # Contents never change for a digest
+        max_age       = 60 * 60 * 24
+    )
 
 ################################################################################
 
-def search_for_university(search_content : str): 
+SEARCH_LIMIT = 50 # Max number of search results
+
+def search_terms(search_content: str):
+    """
+    Convert raw search box text into an FTS5 query where
+    every word must match as a prefix (ex: "eec 58" ->
+    '"eec"* "58"*'). Returns None if there are no words.
+
+    :param search_content: The text typed in the search box.
     """
-    Return a list of universities corresponding to search_content
+
+    words = re.findall(r"\w+", search_content or "")
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+def search_for_university(search_content : str, limit: int = SEARCH_LIMIT): 
+    """
+    Return a list of universities corresponding to search_content,
+    most relevant first. Matches name or acronym word prefixes.
 
     :param search_content: the universities we are searching for  
+    :param limit: max number of universities returned
     """
-    searched_universities = query("""SELECT acronym, name FROM universities WHERE acronym LIKE :search_acro OR name LIKE :search_name""", ({"search_acro": '%' + search_content + '%', "search_name": '%' + search_content + '%'}))
 
+    terms = search_terms(search_content)
+    if terms is None:
+        return []
 
-    return [University.get_university_by_acronym(uni[0]) for uni in searched_universities]
+    return query(
+        """
+        SELECT universities.id, universities.name, universities.acronym, description
+        FROM universities_search
+        INNER JOIN universities ON universities.id = universities_search.rowid
+        WHERE universities_search MATCH ?
+        ORDER BY universities_search.rank
+        LIMIT ?;
+        """,
+        (terms, limit),
+        factory = University.from_row
+    )
 
 
-def search_for_course(search_content : str, university_acro : str): 
+def search_for_course(search_content : str, university_acro : str, limit: int = SEARCH_LIMIT): 
     """
-    Return a list of universities corresponding to search_content
+    Return a list of courses in a university corresponding to
+    search_content, most relevant first. Matches course name,
+    number or department abbreviation word prefixes (ex: EECS-58).
 
-
-    :param search_content: the universities we are searching for  
+    :param search_content: the courses we are searching for  
+    :param university_acro: acronym of the university to search in
+    :param limit: max number of courses returned
     """
 
     uni = University.get_university_by_acronym(university_acro)
 
-    # TODO: Add the ability for user to search for a course by department
-    searched_courses = query("""SELECT id, name, course_number, university FROM courses WHERE (name LIKE :search_name OR course_number LIKE :search_course_number) AND university == :university_id""", ({"search_name": '%' + search_content + '%', "search_course_number": '%' + search_content + '%', "university_id": uni.id})) 
-    # print(searched_courses, uni.id)
+    terms = search_terms(search_content)
+    if uni is None or terms is None:
+        return []
+
+    # Get the courses together with their departments
+    # so that the results are hydrated in one query.
+    searched_courses = query(
+        """
+        SELECT courses.id, courses.name, courses.description, courses.course_number,
+               courses.department, courses.university,
+               departments.name, departments.abbreviation
+        FROM courses_search
+        INNER JOIN courses ON courses.id = courses_search.rowid
+        INNER JOIN departments ON departments.id = courses.department
+        WHERE courses_search MATCH ? AND courses.university = ?
+        ORDER BY courses_search.rank
+        LIMIT ?;
+        """,
+        (terms, uni.id, limit)
+    )
 
-    courses = [Course.get_course_by_id(c[0]) for c in searched_courses]
+    courses = []
+    for *params, department_name, abbreviation in searched_courses:
+        Department.from_row(params[4], department_name, abbreviation, uni.id)
+        courses.append(Course.from_row(*params))
     return courses
 
 ################################################################################
 
-def get_all_posts():
+FEED_PAGE_SIZE = 20 # Number of posts per home feed page
+
+def get_feed_page(cursor: tuple = None, page_size: int = FEED_PAGE_SIZE):
     """
-    Retrieve all posts from the database, ordered by creation date (most recent first).
+    Get one page of the home feed (top-level posts, most
+    recent first). Uses keyset pagination on the posts_feed
+    index so every page costs the same regardless of depth.
+
+    :param cursor: (created, id) of the last post of the previous page.
+    :param page_size: Number of posts per page.
+    :returns: (posts, next_cursor) where next_cursor is None on the last page.
     """
-    params = query(
-        """
-        SELECT id, created, title, content, author, course FROM posts
-        ORDER BY created DESC;
-        """
+
+    where_clauses = ["parent IS NULL"] # SQL where statement clauses.
+    where_params  = []                 # SQL query parameters.
+
+    # Continue strictly after the previous page's last post.
+    if cursor is not None:
+        where_clauses.append("(created, id) < (?, ?)")
+        where_params.extend(cursor)
+
+    # Fetch one extra row to know if there is a next page. The
+    # content is cut to the 300 chars (+1 for the ellipsis check)
+    # the feed shows so long posts don't get copied around.
+    rows = query(
+        f"""
+        SELECT id, created, title, substr(content, 1, 301), author_id, course FROM posts
+        WHERE {' AND '.join(where_clauses)}
+        ORDER BY created DESC, id DESC
+        LIMIT ?;
+        """,
+        (*where_params, page_size + 1)
     )
-    return [Post(*row) for row in params]  # Construct Post objects for each row
 
-    
+    # Load the authors and courses the feed shows in one query each.
+    posts = preload([Post(*row) for row in rows[:page_size]], "author", "course")
+
+    # The cursor of the next page is the last post shown.
+    next_cursor = None
+    if len(rows) > page_size:
+        next_cursor = (posts[-1].created, posts[-1].id)
+
+    return posts, next_cursor
+
+def get_home_page(cursor: tuple = None, everything: bool = False, page_size: int = FEED_PAGE_SIZE):
+    """
+    Get one page of the home page. Logged in users see
+    their timeline (the courses and universities they
+    follow), everyone else sees the site-wide feed, as
+    do users whose timeline is empty.
+
+    :param cursor: (created, id) of the last post of the previous page.
+    :param everything: Show the site-wide feed even when logged in.
+    :param page_size: Number of posts per page.
+    :returns: (posts, next_cursor, everything) where everything is
+        True if the posts are from the site-wide feed.
+    """
+
+    user_id = SESSION.current_user_id
+    if user_id is None or everything:
+        return *get_feed_page(cursor, page_size), True
 
+    posts, next_cursor = TIMELINE.page(user_id, cursor, page_size)
 
+    # An empty timeline may have never been built (first
+    # visit of the home page), build it and read again.
+    # Built timelines that are empty stay a plain read.
+    if not posts and cursor is None and not TIMELINE.built(user_id):
+        with transaction():
+            TIMELINE.build(user_id)
+        posts, next_cursor = TIMELINE.page(user_id, cursor, page_size)
 
+    # Nothing followed has any posts, show everything instead.
+    if not posts and cursor is None:
+        return *get_feed_page(cursor, page_size), True
 
+    return posts, next_cursor, False
 
+def parse_feed_cursor(cursor: str):
+    """
+    Parse a feed cursor from its URL form ("created,id").
+    Returns None if the cursor is missing or malformed.
+    """
 
+    if not cursor or "," not in cursor:
+        return None
+
+    created, id = cursor.rsplit(",", 1)
+    if not id.isdigit():
+        return None
+    return (created, int(id))
@@ -6,15 +6,44 @@
 # Creation Date: 10/24/2024
 
 from db import query
+from eager import load_many
+from identity_map import hydrate, lookup
 from university import University
 
 
 class Department:
+    __slots__ = ("id", "name", "abbreviation", "university_id", "_university")
+
+    # Relationships that eager.preload can batch load.
+    relations = {
+        "university": ("university_id", "_university", University.get_universities_by_ids)
+    }
+
     def __init__(self, id, name, abbreviation, university_id):
-        self.id           = id                                             # Database ID
-        self.name         = name                                           # Name of department (ex: Electrical Engineering)
-        self.abbreviation = abbreviation                                   # Department abbreviation (ex: EECS)
-        self.university   = University.get_university_by_id(university_id) # University department belongs to
+        self.id            = id            # Database ID
+        self.name          = name          # Name of department (ex: Electrical Engineering)
+        self.abbreviation  = abbreviation  # Department abbreviation (ex: EECS)
+        self.university_id = university_id # Database ID of the university
+        self._university   = None          # Loaded on first access
+
+    @property
+    def university(self):
+        """University department belongs to, loaded on first access."""
+        if self._university is None:
+            self._university = University.get_university_by_id(self.university_id)
+        return self._university
+
+    @staticmethod
+    def from_row(id, name, abbreviation, university_id):
+        """
+        Construct a department from a database row,
+        reusing the request's copy if already loaded.
+        """
+        return hydrate(
+            ("department", id),
+            lambda: Department(id, name, abbreviation, university_id),
+            ("department", "abbreviation", university_id, abbreviation)
+        )
 
     @staticmethod
     def get_department_by_id(id: int):
@@ -23,13 +52,27 @@ class Department:
         Return None if department not found.
         """
 
-        params = query(
-            "SELECT id, name, abbreviation, university FROM departments WHERE id = ?",
-            (id,),
-            count = 1
+        def load():
+            return query(
+                "SELECT id, name, abbreviation, university FROM departments WHERE id = ?",
+                (id,),
+                count   = 1,
+                factory = Department.from_row
+            ) or None # None if department not found
+
+        return lookup(("department", id), load)
+
+    @staticmethod
+    def get_departments_by_ids(ids: list):
+        """
+        Get departments by their database ids in one query.
+        Returns a dict of id -> Department of the ids found.
+        """
+        return load_many(
+            "department", ids,
+            "SELECT id, name, abbreviation, university FROM departments",
+            Department.from_row
         )
-        if not params: return None # Department not found
-        return Department(*params) # Construct department object
 
     @staticmethod
     def get_department_by_abbreviation(university: University, abbreviation: str):
@@ -42,13 +85,15 @@ class Department:
         :return: Department object or None if not found.
         """
 
-        params = query(
-            """
-                SELECT id, name, abbreviation, university FROM departments
-                WHERE university = ? AND abbreviation = ?;
-            """,
-            (university.id, abbreviation.upper()),
-            count = 1
-        )
-        if not params: return None # Department not found
-        return Department(*params) # Construct department object
+        def load():
+            return query(
+                """
+                    SELECT id, name, abbreviation, university FROM departments
+                    WHERE university = ? AND abbreviation = ?;
+                """,
+                (university.id, abbreviation.upper()),
+                count   = 1,
+                factory = Department.from_row
+            ) or None # None if department not found
+
+        return lookup(("department", "abbreviation", university.id, abbreviation.upper()), load)
@@ -0,0 +1,113 @@
+# Filename: eager.py
+# Description: This module contains the batch loading of model relationships
+# Inputs: N/A
+# Output: preload and load_many helpers
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import json
+
+from db import query
+from identity_map import current_identity_map
+
+"""
+Relationships of the models (ex: the author of a post)
+are loaded on first access, one query per object. For
+listing pages that is one query per row, so listings
+preload the relationships their template shows instead:
+
+    posts = course.posts
+    preload(posts, "author", "course.university")
+
+loads the authors of every post in one query, then the
+courses, then the universities of those courses, no
+matter how many posts there are. Each model lists its
+relationships in its relations attribute as
+
+    name: (id attribute, cache attribute, many-getter)
+
+where the many-getter (ex: User.get_users_by_ids) takes
+a list of ids and returns a dict of id -> object. Objects
+already in the request's identity map are not queried.
+The ids are passed as one JSON array parameter, so each
+relationship is one query however many ids there are.
+"""
+
+def load_many(kind: str, ids, select: str, factory):
+    """
+    Load entities of one kind by id, reusing the ones the
+    identity map already holds and fetching the rest with
+    one IN (...) query.
+
+    :param kind: Identity map kind of the entities (ex: "user").
+    :param ids: Database ids, duplicates and None are ignored.
+    :param select: SELECT ... FROM ... statement of the entity's columns.
+    :param factory: Builds an entity from a row (ex: User.from_row).
+    :returns: Dict of id -> entity of the ids that exist.
+    """
+
+    identity_map = current_identity_map()
+    found        = {} # id -> entity
+    missing      = [] # ids that must be queried
+
+    for id in set(ids):
+        if id is None:
+            continue
+        entity = identity_map.entities.get((kind, id)) if identity_map else None
+        if entity is not None:
+            identity_map.hits += 1
+            found[id] = entity
+        else:
+            missing.append(id)
+
+    if missing:
+        for entity in query(
+            f"{select} WHERE id IN (SELECT value FROM json_each(?));",
+            (json.dumps(missing),),
+            factory = factory
+        ) or []:
+            found[entity.id] = entity
+
+    if identity_map is not None:
+        identity_map.misses += len(missing)
+    return found
+
+def preload(entities: list, *paths: str):
+    """
+    Load relationships of a list of model objects, one
+    query per relationship, so reading them afterwards
+    takes no queries. Nested relationships are written
+    with dots (ex: "course.department").
+
+    :param entities: Objects of one model (ex: a list of posts).
+    :param paths: Relationships to load (ex: "author", "course.university").
+    :returns: The entities, for chaining.
+    """
+
+    if not entities:
+        return entities
+
+    # Group the paths by their first relationship so
+    # "course" and "course.university" share a query.
+    nested = {} # relationship -> paths below it
+    for path in paths:
+        name, _, rest = path.partition(".")
+        nested.setdefault(name, [])
+        if rest:
+            nested[name].append(rest)
+
+    relations = type(entities[0]).relations
+    for name, rest in nested.items():
+        id_attribute, cache_attribute, get_many = relations[name]
+
+        # Only query the objects that haven't loaded it yet.
+        pending = [entity for entity in entities if getattr(entity, cache_attribute) is None]
+        loaded  = get_many([getattr(entity, id_attribute) for entity in pending])
+        for entity in pending:
+            setattr(entity, cache_attribute, loaded.get(getattr(entity, id_attribute)))
+
+        if rest:
+            targets = [getattr(entity, cache_attribute) for entity in entities]
+            preload(list({id(target): target for target in targets if target is not None}.values()), *rest)
+
+    return entities
@@ -0,0 +1,130 @@
+# Filename: export.py
+# Description: This module contains the streaming export of course discussions
+# Inputs: Course, export format
+# Output: NDJSON or JSON chunks
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import argparse
+import json
+import sys
+
+from course import Course
+from db import stream
+from db_util import get_uni_and_course_from_route
+
+"""
+Exports every post and reply of a course, one record per
+post with the author and course fields already resolved,
+so consumers never need a second lookup. Rows are read
+straight off the posts_course index through db.stream()
+and turned into text chunks as they are read: no Post
+objects are built and memory stays constant however big
+the course is. Records come in index order, top-level
+posts first (oldest first), then replies grouped by the
+post they answer; "parent" rebuilds the threads.
+"""
+
+CHUNK_SIZE = 65536 # Bytes of text per yielded chunk
+
+# Record fields, in the order of the export query's columns.
+FIELDS = (
+    "id", "parent", "created", "title", "content",
+    "likes", "dislikes", "reply_count", "views",
+    "author_id", "author",
+    "course_id", "course", "course_name", "university"
+)
+
+EXPORT_QUERY = """
+    SELECT posts.id, posts.parent, posts.created, posts.title, posts.content,
+           posts.likes, posts.dislikes, posts.reply_count, posts.views,
+           posts.author_id, users.username,
+           courses.id, departments.abbreviation || '-' || courses.course_number, courses.name,
+           universities.acronym
+    FROM posts
+    INNER JOIN courses      ON courses.id      = posts.course
+    INNER JOIN universities ON universities.id = courses.university
+    LEFT  JOIN departments  ON departments.id  = courses.department
+    LEFT  JOIN users        ON users.id        = posts.author_id
+    WHERE posts.course = ?
+    ORDER BY posts.course, posts.parent, posts.created;
+"""
+
+# Content type of each export format.
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json"  : "application/json"
+}
+
+def records(course: Course):
+    """Stream the export records (dicts) of a course's posts."""
+    for row in stream(EXPORT_QUERY, (course.id,)):
+        yield dict(zip(FIELDS, row))
+
+def ndjson_lines(course: Course):
+    """One JSON document per line (NDJSON)."""
+    for record in records(course):
+        yield json.dumps(record, ensure_ascii = False) + "\n"
+
+def json_lines(course: Course):
+    """A single JSON array, written one element at a time."""
+
+    separator = "[\n"
+    for record in records(course):
+        yield separator + json.dumps(record, ensure_ascii = False)
+        separator = ",\n"
+    yield "[]\n" if separator == "[\n" else "\n]\n"
+
+def export_chunks(course: Course, format: str = "ndjson"):
+    """
+    Stream the export of a course as text chunks of about
+    CHUNK_SIZE bytes, ready to be written or sent as a
+    response body.
+
+    :param course: The course whose posts are exported.
+    :param format: One of FORMATS (ndjson, json).
+    """
+
+    lines  = ndjson_lines(course) if format == "ndjson" else json_lines(course)
+    buffer = []
+    size   = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer = []
+            size   = 0
+    if buffer:
+        yield "".join(buffer)
+
+def export_filename(course: Course, format: str):
+    """File name of an export (ex: KU-EECS-581.ndjson)."""
+    return f"{course.university.acronym}-{course.department.abbreviation}-{course.course_number}.{format}"
+
+def main():
+    '''
+    Entry point of the course export command
+    '''
+    parser = argparse.ArgumentParser(description = "Export the posts and replies of a course.")
+    parser.add_argument("university", help = "acronym of the university (ex: KU)")
+    parser.add_argument("course", help = "course (ex: EECS-581)")
+    parser.add_argument("--format", choices = FORMATS, default = "ndjson", help = "export format (default: ndjson)")
+    parser.add_argument("--out", help = "file to write (default: standard output)")
+    args = parser.parse_args()
+
+    _, course = get_uni_and_course_from_route(args.university, args.course)
+    if course is None:
+        print(f"[EXPORT ERROR] Course {args.university} {args.course} does not exist", file = sys.stderr)
+        sys.exit(1)
+
+    file = open(args.out, "w", encoding = "utf-8") if args.out else sys.stdout
+    try:
+        for chunk in export_chunks(course, args.format):
+            file.write(chunk)
+    finally:
+        if args.out:
+            file.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Filename: fragment_cache.py
+# Description: This module contains the cache of rendered template fragments
+# Inputs: N/A
+# Output: SIDEBAR_CACHE instance
+# Authors: Xavier Ruyle
+# Creation Date: 10/18/2026
+
+import threading
+import time
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+"""
+Parts of a page that only change when the user does
+something (ex: following a course) are rendered once
+and reused until that action invalidates them. The
+cache lives in the process, so every worker keeps
+its own copy: fragments can also be stored with a
+version (ex: the user's entity version), and an entry
+of an older version is rendered again, so writes made
+through another worker are picked up too.
+"""
+
+class FragmentCache:
+    """
+    LRU cache of rendered HTML fragments keyed by
+    (fragment name, user id), with hit/miss metrics.
+    """
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries      # Entries kept before evicting
+        self.fragments   = OrderedDict()    # (name, user id) -> (version, Markup)
+        self.lock        = threading.Lock() # Guards fragments and metrics
+
+        # Statistics
+        self.hits        = 0   # Fragments served from the cache
+        self.misses      = 0   # Fragments that had to be rendered
+        self.render_time = 0.0 # Seconds spent rendering misses
+
+    def get(self, name: str, user_id: int, render, version: int = 0):
+        """
+        Get a rendered fragment, rendering and storing it
+        with the render callable on a miss.
+
+        :param name: Name of the fragment (ex: followed_courses).
+        :param user_id: The user the fragment was rendered for.
+        :param render: Callable returning the fragment's HTML.
+        :param version: Version of the data the fragment shows.
+        """
+
+        key = (name, user_id)
+
+        with self.lock:
+            entry = self.fragments.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                self.fragments.move_to_end(key)
+                return entry[1]
+
+        start    = time.perf_counter()
+        fragment = Markup(render())
+        elapsed  = time.perf_counter() - start
+
+        with self.lock:
+            self.misses      += 1
+            self.render_time += elapsed
+            self.fragments[key] = (version, fragment)
+            self.fragments.move_to_end(key)
+            if len(self.fragments) > self.max_entries:
+                self.fragments.popitem(last = False)
+
+        return fragment
+
+    def invalidate(self, user_id: int, name: str = None):
+        """
+        Drop a user's cached fragments so they are rendered
+        again on their next request.
+
+        :param user_id: The user whose fragments changed.
+        :param name: Only drop this fragment, all if None.
+        """
+
+        with self.lock:
+            for key in list(self.fragments):
+                if key[1] == user_id and (name is None or key[0] == name):
+                    del self.fragments[key]
+
+    @property
+    def stats(self):
+        """
+        Hit rate of the cache and the render time it saved,
+        estimated as hits times the average miss render time.
+        """
+
+        with self.lock:
+            lookups     = self.hits + self.misses
+            render_cost = self.render_time / self.misses if self.misses else 0.0
+            return {
+                "hits"       : self.hits,
+                "misses"     : self.misses,
+                "hit_rate"   : self.hits / lookups if lookups else 0.0,
+                "render_time": self.render_time,
+                "saved_time" : self.hits * render_cost,
+                "entries"    : len(self.fragments)
+            }
+
+# Cache of the per-user sidebar fragments in base.html.
+SIDEBAR_CACHE = FragmentCache()
@@ -0,0 +1,118 @@
+# Filename: identity_map.py
+# Description: This module contains the request scoped entity identity map
+# Inputs: N/A
+# Output: IdentityMap container and lookup helpers
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+from flask import g, has_app_context
+
+"""
+Every model getter (get_*_by_id, get_*_by_acronym) goes
+through this map so that each university, department,
+course, and user is only ever loaded once per request.
+Objects are keyed by (kind, id) and secondary lookups,
+such as acronyms, are stored as aliases of those keys.
+"""
+
+class IdentityMap:
+    """
+    Container of entities that have already been loaded
+    during the current request. Tracks hit/miss counts.
+    """
+    def __init__(self):
+        self.entities = {} # (kind, id) -> entity object
+        self.aliases  = {} # (kind, field, value) -> (kind, id)
+        self.hits     = 0  # Lookups served from the map
+        self.misses   = 0  # Lookups that had to query the DB
+
+    def get(self, key):
+        """
+        Return the entity stored under key (or alias of key),
+        recording a hit or a miss. Returns None when absent.
+        """
+
+        key = self.aliases.get(key, key) # Resolve alias to real key
+
+        if key in self.entities:         # If entity already loaded,
+            self.hits += 1               # count it as a hit.
+            return self.entities[key]
+
+        self.misses += 1                 # Otherwise, it is a miss.
+        return None
+
+    def add(self, key, entity, *aliases):
+        """
+        Store an entity under its key and any alias keys.
+        If the key is already taken, the existing entity
+        is kept and returned so there is only one copy.
+        """
+
+        entity = self.entities.setdefault(key, entity)
+        for alias in aliases:
+            self.aliases[alias] = key
+        return entity
+
+    @property
+    def stats(self):
+        """Hit/miss counts of the map for reporting."""
+        return {
+            "hits"    : self.hits,
+            "misses"  : self.misses,
+            "entities": len(self.entities)
+        }
+
+################################################################################
+
+def current_identity_map():
+    """
+    Get the identity map of the current request,
+    creating it on first use. Returns None when
+    called outside of a Flask app/request context.
+    """
+
+    if not has_app_context():
+        return None
+
+    if "identity_map" not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
+
+def lookup(key, loader):
+    """
+    Get an entity through the identity map. On a miss the
+    loader is called and must return the entity or None.
+    Not found (None) results are never stored in the map.
+
+    :param key: The identity key, ex: ("university", 1).
+    :param loader: Callable that fetches the entity from the DB.
+    """
+
+    identity_map = current_identity_map()
+    if identity_map is None:  # No request, no caching.
+        return loader()
+
+    entity = identity_map.get(key)
+    if entity is None:
+        entity = loader()
+    return entity
+
+def hydrate(key, constructor, *aliases):
+    """
+    Construct an entity from an already fetched database
+    row, reusing the copy in the identity map if it has
+    already been loaded during this request.
+
+    :param key: The identity key, ex: ("course", 4).
+    :param constructor: Callable that builds the entity.
+    :param aliases: Secondary keys, ex: ("university", "acronym", "KU").
+    """
+
+    identity_map = current_identity_map()
+    if identity_map is None:  # No request, no caching.
+        return constructor()
+
+    entity = identity_map.entities.get(key)
+    if entity is None:
+        entity = constructor()
+    return identity_map.add(key, entity, *aliases)
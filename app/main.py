@@ -8,18 +8,30 @@
 import os
 import signal
 import sys
+import time
 from functools import wraps
 
 import db
+import query_log
+from assets import ASSETS, send_asset
+from catalog import READERS, catalog_format, import_catalog
 from course import *
-from db import connection  # your existing database connection
 from db_util import *
-from flask import (Flask, flash, redirect, render_template, request,
-                   send_from_directory, session, url_for)
+from export import FORMATS as EXPORT_FORMATS
+from export import export_chunks, export_filename
+from flask import (Flask, flash, g, redirect, render_template, request,
+                   send_from_directory, session, stream_with_context, url_for)
+from fragment_cache import SIDEBAR_CACHE
+from identity_map import current_identity_map
+from metrics import (IDENTITY_MAP, METRICS, REQUEST_DB_TIME, REQUEST_DURATION,
+                     REQUEST_QUERIES, REQUESTS_IN_FLIGHT)
 from post import *
+from ranking import RANKING
 from session import *
 from university import *
 from user import *
+from versions import etag, version
+from view_tracker import VIEW_TRACKER
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
 
@@ -29,8 +41,9 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'pdf'}
 DEVELOPMENT = False
 
 app = Flask(__name__) # initialize flask
-app.secret_key = b'_5#y2L"F4Q8z\n\xec]/' # flask app secret key required for form requests
+app.secret_key = os.environ.get("UNIHIVE_SECRET_KEY", b'_5#y2L"F4Q8z\n\xec]/') # flask app secret key required for form requests, same for every worker
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.session_interface = SESSION_STORE # sessions live in the database, the cookie holds a signed id
 
 
 
@@ -46,11 +59,17 @@ def allowed_file(filename):
 def signal_handler(sig, frame):
     """Handle shutdown signals gracefully"""
     print('\nShutting down gracefully...')
+
+    # Write out the buffered post views
+    print('Flushing post views...')
+    VIEW_TRACKER.stop()
+
+    # Stop refreshing the hot scores
+    RANKING.stop()
     
-    # Close database connection
-    if connection:
-        print('Closing database connection...')
-        connection.close()
+    # Close database connections
+    print('Closing database connections...')
+    db.pool.close_all()
     
     # Clear session data
     if SESSION:
@@ -65,28 +84,185 @@ def signal_handler(sig, frame):
 signal.signal(signal.SIGINT, signal_handler)    # Handles Ctrl+C
 signal.signal(signal.SIGTERM, signal_handler)   # Handles termination request
 
+# Keep the post and course hot scores up to date in the background
+RANKING.start()
+
+# Export the database, cache and background thread statistics
+METRICS.collected(
+    "unihive_db_busy_retries_total", "Statements retried on a locked database.", "counter",
+    lambda: {(): db.pool.stats["busy_retries"]}
+)
+METRICS.collected(
+    "unihive_db_pool_wait_seconds_total", "Time spent waiting for a pooled connection.", "counter",
+    lambda: {(): db.pool.stats["wait_time"]}
+)
+METRICS.collected(
+    "unihive_db_connections", "Database connections by state.", "gauge",
+    lambda: {("open",): db.pool.stats["open"], ("idle",): db.pool.stats["idle"]}, ("state",)
+)
+METRICS.collected(
+    "unihive_cache_hit_ratio", "Hit ratio of the fragment caches.", "gauge",
+    lambda: {("sidebar",): SIDEBAR_CACHE.stats["hit_rate"], ("users",): USERS.stats["hit_rate"]}, ("cache",)
+)
+METRICS.collected(
+    "unihive_post_views_buffered", "Post views waiting to be written.", "gauge",
+    lambda: {(): len(VIEW_TRACKER.buffer)}
+)
+
+def sidebar_fragment(name):
+    """
+    Render a sidebar fragment (templates/sidebar/) for the
+    current user, served from the per-user fragment cache.
+    Entries are checked against the user's version, which
+    follows bump in any worker. Empty when logged out.
+    """
+    user = USERS.get(SESSION.current_user_id)
+    if user is None:
+        return ""
+
+    if "user_version" not in g:
+        g.user_version = version("user", user.id)
+    return SIDEBAR_CACHE.get(
+        name, user.id,
+        lambda: render_template(f"sidebar/{name}.html", user = user),
+        g.user_version
+    )
+
 @app.context_processor
 def inject_default():
     """Inject default information into HTML templates."""
     return dict(
         USERS   = USERS, 
         SESSION = SESSION,
-        active  = None
+        active  = None,
+        sidebar_fragment = sidebar_fragment,
+        asset_url        = ASSETS.url
     )
 
+@app.before_request
+def start_request_metrics():
+    """Start timing the request and count it as in flight."""
+    g.request_start    = time.perf_counter()
+    g.request_endpoint = request.endpoint or "none"
+    REQUESTS_IN_FLIGHT.inc(g.request_endpoint)
+
+@app.before_request
+def start_query_log():
+    """Account for the queries of the request."""
+    query_log.start(f"{request.method} {request.path}")
+
+@app.teardown_request
+def finish_query_log(exception):
+    """Report the N+1 query patterns of the request."""
+    log = query_log.finish()
+    if log is not None:
+        log.report()
+
+@app.teardown_request
+def finish_request_metrics(exception):
+    """Record the request's duration, it is no longer in flight."""
+    if "request_start" not in g:
+        return
+
+    REQUEST_DURATION.observe(
+        time.perf_counter() - g.request_start,
+        g.request_endpoint, request.method, g.get("response_status", 500)
+    )
+    REQUESTS_IN_FLIGHT.dec(g.request_endpoint)
+
+@app.teardown_request
+def release_connection(exception):
+    """Return the request thread's DB connection to the pool."""
+    db.pool.release()
+
+@app.after_request
+def report_identity_map(response):
+    """Report the identity map hit/miss counts of the request."""
+    identity_map = current_identity_map()
+    if identity_map is not None:
+        response.headers["X-Identity-Map"] = \
+            "hits={hits}; misses={misses}; entities={entities}".format(**identity_map.stats)
+    return response
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the status, query time and identity map use of the request."""
+    g.response_status = response.status_code
+    endpoint          = g.get("request_endpoint", "none")
+
+    log = query_log.current()
+    if log is not None:
+        REQUEST_DB_TIME.observe(log.time, endpoint)
+        REQUEST_QUERIES.inc(endpoint, amount = log.count)
+
+    identity_map = current_identity_map()
+    if identity_map is not None:
+        IDENTITY_MAP.inc("hit",  amount = identity_map.hits)
+        IDENTITY_MAP.inc("miss", amount = identity_map.misses)
+    return response
+
+@app.after_request
+def report_queries(response):
+    """Report the query count and time of the request."""
+    log = query_log.current()
+    if log is not None:
+        response.headers["X-Queries"] = f"count={log.count}; time={log.time * 1000:.1f}ms"
+    return response
+
+def not_modified(kind: str, id: int):
+    """
+    Check a GET request against the weak ETag of an entity's
+    page (see versions.py). Returns a 304 response if the
+    client's copy is current, otherwise None and the ETag
+    is sent with the rendered page.
+
+    :param kind: Kind of the page's entity (ex: "course").
+    :param id: Id of the page's entity.
+    """
+
+    # Pending flashed messages are part of the page.
+    if request.method != "GET" or session.get("_flashes"):
+        return None
+
+    g.etag = etag(kind, id, SESSION.current_user_id)
+    if request.if_none_match.contains_weak(g.etag):
+        response = app.response_class(status = 304)
+        response.set_etag(g.etag, weak = True)
+        response.headers["Cache-Control"] = "no-cache, private"
+        return response
+    return None
+
+@app.after_request
+def send_etag(response):
+    """Send the ETag computed by not_modified() with the page."""
+    if "etag" in g and response.status_code == 200:
+        response.set_etag(g.etag, weak = True)
+        response.headers["Cache-Control"] = "no-cache, private"
+    return response
+
+@app.route("/assets/<path:filename>")
+def assets(filename):
+    '''
+    Fingerprinted static files built by app/assets.py
+    '''
+    return send_asset(filename)
+
+@app.route("/metrics")
+def metrics():
+    '''
+    Metrics of the app in the Prometheus text format
+    '''
+    return METRICS.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 @app.route("/") 
 def home(): 
     '''
     Route function for root page home.html
     Base html Template Dependecies: followed universities, followed courses
     '''
-    posts = [Post(*params) for params in query(
-        """
-        SELECT id, created, title, content, author, course FROM posts
-        ORDER BY created DESC;
-        """
-    )]
-    return render_template('home.html', posts=posts)
+    cursor = parse_feed_cursor(request.args.get('cursor'))
+    posts, next_cursor, everything = get_home_page(cursor, request.args.get('feed') == 'all')
+    return render_template('home.html', posts=posts, next_cursor=next_cursor, everything=everything)
 
 
 def login_required(f):
@@ -125,7 +301,7 @@ def login():
             # Verify user credentials
             if user_data and (DEVELOPMENT or check_password_hash(user_data[1], password)):
                 # Set the session user ID and store user in USERS
-                SESSION.current_user_id = user_data[0]
+                SESSION.login(user_data[0])
                 USERS[user_data[0]] = User(user_data[0], username)
                 print(f"User {username} logged in successfully.")
                 
@@ -153,9 +329,7 @@ def login():
 
 @app.route("/logout")
 def logout():
-    SESSION.current_user_id = None
-    if '_flashes' in session:
-        del session['_flashes']
+    SESSION.logout() # also drops pending flashed messages
     
     flash("You have been logged out")
     return redirect(url_for('login'))
@@ -198,25 +372,22 @@ def register():
             # Hash the password before storing
             hashed_password = generate_password_hash(password)
 
-            # Insert new user into the database
-            query(
-                """
-                INSERT INTO users (username, password)
-                VALUES (?, ?);
-                """,
-                (username, hashed_password)
-            )
-
-            # Get the newly created user
-            new_user = query(
-                "SELECT id, username FROM users WHERE username = ?",
-                (username,),
-                count=1
-            )
+            # Insert new user into the database and get it back
+            new_user = None
+            with transaction():
+                new_user = query(
+                    """
+                    INSERT INTO users (username, password)
+                    VALUES (?, ?)
+                    RETURNING id, username;
+                    """,
+                    (username, hashed_password),
+                    count=1
+                )
 
             if new_user:
-                # Update session and USERS dictionary
-                SESSION.current_user_id = new_user[0]
+                # Update session and USERS cache
+                SESSION.login(new_user[0])
                 USERS[new_user[0]] = User(new_user[0], username)
 
                 flash('Registration successful! Welcome to UniHive!', 'success')
@@ -255,6 +426,8 @@ def profile():
         if file and allowed_file(file.filename): 
             filename = secure_filename("profile_pic.jpg")
             file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            if filename in ASSETS.files: # rebuild it so pages link to the new picture
+                ASSETS.build([filename])
             return redirect(url_for('profile', user=user, recent_posts=get_posts_user_recent()))
 
 
@@ -272,6 +445,9 @@ def university(university_acro=None, university_name=None):
     if current_university is None:
         return render_template('404.html'), 404
 
+    # The page hasn't changed since the client's copy.
+    if response := not_modified("university", current_university.id):
+        return response
 
     # detect if there is a follow request for the university 
     if request.method == "POST": 
@@ -347,6 +523,10 @@ def course(university_acro=None, course=None):
     if stored_university is None or stored_course is None:
         return render_template('404.html'), 404
 
+    # The page hasn't changed since the client's copy.
+    if response := not_modified("course", stored_course.id):
+        return response
+
     # detect if there was a post request 
     if request.method == "POST": 
         # handle post creation 
@@ -399,8 +579,8 @@ def course(university_acro=None, course=None):
 
             if allowed_file(file.filename): 
                 filename = secure_filename(file.filename)  
-                # store the syllabus file into database
-                store_syllabus(stored_course.name_combined, filename, file.read()) 
+                # stream the syllabus file into the syllabus store
+                store_syllabus(stored_course, filename, file.stream) 
                 # DEBUG (to make sure it was inserted into the db): 
                 # print(query("SELECT coursename FROM syllabus;"))
                 return redirect(url_for('course', university_acro=stored_university.acronym, course=stored_course.name_combined))
@@ -440,29 +620,59 @@ def create_course(university_acro=None, university="placeholder"):
             flash("University does not exist")
             return render_template('create_course.html', university_acro=university_acro, uni=university)
 
-        # Get the requested department from the DB
-        stored_department = Department.get_department_by_abbreviation(stored_university, department)
+        created = None # The new course, None if it exists or creating it failed
 
-        # Just in case the department doesn't already exist
-        if stored_department is None:
-            # Create a new department and use it
-            store_department(department, department, stored_university)
+        # Create the department (if needed) and the course as one unit of work
+        with transaction():
+            # Get the requested department from the DB
             stored_department = Department.get_department_by_abbreviation(stored_university, department)
 
-        # Get the requested course from the DB
-        stored_course = Course.get_course_by_course_number(stored_university, stored_department, course_number)
+            # Just in case the department doesn't already exist
+            if stored_department is None:
+                # Create a new department and use it
+                store_department(department, department, stored_university)
+                stored_department = Department.get_department_by_abbreviation(stored_university, department)
 
-        # check if course exists
-        if stored_course is None: 
-            # TODO: course name should be a form option 
-            store_course(course_name, course_number, stored_department) # STORE: Course obj
-            stored_course = Course.get_course_by_course_number(stored_university, stored_department, course_number)
+            # check if course exists
+            if Course.get_course_by_course_number(stored_university, stored_department, course_number) is None:
+                # TODO: course name should be a form option 
+                store_course(course_name, course_number, stored_department) # STORE: Course obj
+                created = Course.get_course_by_course_number(stored_university, stored_department, course_number)
 
-            return redirect(url_for('course', university_acro=stored_university.acronym, course=stored_course.name_combined)) # redirect user to the course page 
+        if created is not None:
+            return redirect(url_for('course', university_acro=stored_university.acronym, course=created.name_combined)) # redirect user to the course page 
         else: 
             flash("Course already exists", 'error') # Inform user that course exists
 
-    return render_template('create_course.html', university_acro=university_acro, uni=university)  # render create course page 
+    return render_template('create_course.html', university_acro=university_acro, uni=university)  # render create course page
+
+@app.route("/u/<university_acro>/import-catalog", methods=["POST"])
+@login_required
+def import_course_catalog(university_acro=None):
+    '''
+    Bulk import of a course catalog (CSV, JSON or JSON Lines)
+    sent as the "catalog" file of a form or as the raw body.
+    Responds with the import report as JSON.
+    '''
+    stored_university = University.get_university_by_acronym(university_acro)
+    if stored_university is None:
+        return {"error": "University does not exist"}, 404
+
+    # Multipart upload, or the catalog streamed as the body
+    upload = request.files.get("catalog")
+    if upload is not None:
+        stream, format = upload.stream, catalog_format(upload.filename, upload.mimetype)
+    else:
+        stream, format = request.stream, catalog_format(content_type = request.mimetype)
+    format = request.args.get("format", format)
+
+    if format not in READERS:
+        return {"error": "Unknown catalog format, use csv, json or jsonl"}, 400
+
+    report = import_catalog(stored_university, stream, format)
+    if report is None:
+        return {"error": "The catalog could not be imported"}, 400
+    return report
 
 @app.route("/user/<username>", methods=["GET", "POST"])
 def profile_page(username):
@@ -479,7 +689,32 @@ def download(filename, coursename):
     Shows the user the chosen file in the browser 
     User can download or preview the file
     """
-    return download_syllabus(filename, coursename) 
+    response = download_syllabus(filename, coursename)
+    if response is None:
+        return render_template("404.html"), 404
+    return response
+
+@app.route("/export/<university_acro>/<course>")
+def export_course(university_acro, course):
+    """
+    Streams every post and reply of a course as NDJSON
+    (default) or as a JSON array with ?format=json
+    """
+    format = request.args.get("format", "ndjson")
+    if format not in EXPORT_FORMATS:
+        return {"error": "Unknown export format, use ndjson or json"}, 400
+
+    _, stored_course = get_uni_and_course_from_route(university_acro, course)
+    if stored_course is None:
+        return render_template("404.html"), 404
+
+    # Keep the request (and its DB connection) open while streaming
+    response = app.response_class(
+        stream_with_context(export_chunks(stored_course, format)),
+        mimetype = EXPORT_FORMATS[format]
+    )
+    response.headers.set("Content-Disposition", "attachment", filename = export_filename(stored_course, format))
+    return response
 
 @app.route("/u/<university_acro>/<course_name>/<post_identifier>", methods=['GET', 'POST'])
 def post(university_acro=None, course_name=None, post_identifier=None):
@@ -566,8 +801,19 @@ def post(university_acro=None, course_name=None, post_identifier=None):
             return render_template('auth/login.html')
 
 
+    # Count the view, buffered and written in the background.
+    if request.method == "GET":
+        VIEW_TRACKER.record(SESSION.current_user_id, post.id)
+
+    # The page hasn't changed since the client's copy.
+    if response := not_modified("post", post.id):
+        return response
+
+    # Load the whole reply tree in a constant number of queries.
+    thread = post.thread(User.get_user_by_id(SESSION.current_user_id))
+
     # Return the post HTML template.
-    return render_template("post.html", post=post)
+    return render_template("post.html", post=post, thread=thread)
 
 def main(): 
     '''
@@ -0,0 +1,225 @@
+# Filename: metrics.py
+# Description: This module contains the Prometheus metrics of the app
+# Inputs: N/A
+# Output: METRICS registry and the request metrics
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import threading
+import weakref
+
+"""
+Metrics are exported at /metrics in the Prometheus text
+format. Updates happen on every request, so they never
+take a lock: each thread writes to its own shard of a
+metric and the shards are only added up when /metrics is
+scraped. Shards of threads that have exited are folded
+into a single retired shard at scrape time.
+"""
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def escape(value):
+    """Escape a label value for the text format."""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(names: tuple, values: tuple, extra: str = None):
+    """Render {name="value",...}, empty if there are no labels."""
+
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value: float):
+    """Render a sample value (integers without a decimal point)."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    """
+    Base of the metric types. Values are lists of floats
+    keyed by label values, kept in per-thread shards.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name    = name              # ex: unihive_requests_in_flight
+        self.help    = help              # Description shown by Prometheus
+        self.labels  = labels            # Label names
+        self.local   = threading.local() # Shard of the calling thread
+        self.shards  = []                # (thread, shard) of every thread
+        self.retired = {}                # Shards of exited threads, added up
+        self.lock    = threading.Lock()  # Guards shards (not the hot path)
+
+    def size(self):
+        """Length of a value list."""
+        return 1
+
+    def values(self, label_values: tuple):
+        """Value list of the calling thread for the label values."""
+
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = {}
+            with self.lock:
+                self.shards.append((weakref.ref(threading.current_thread()), shard))
+
+        values = shard.get(label_values)
+        if values is None:
+            values = shard[label_values] = [0.0] * self.size()
+        return values
+
+    def collect(self):
+        """Add up every shard. Returns {label values: value list}."""
+
+        with self.lock:
+            alive = []
+            for thread, shard in self.shards:
+                if thread() is None or not thread().is_alive():
+                    self.merge(self.retired, shard.copy())
+                else:
+                    alive.append((thread, shard))
+            self.shards = alive
+
+            total = {}
+            self.merge(total, self.retired)
+            for _, shard in alive:
+                self.merge(total, shard.copy())
+            return total
+
+    @staticmethod
+    def merge(into: dict, shard: dict):
+        """Add a shard's value lists into another."""
+        for label_values, values in shard.items():
+            current = into.setdefault(label_values, [0.0] * len(values))
+            for index, value in enumerate(values):
+                current[index] += value
+
+    def samples(self):
+        """(suffix, labels, value) of every sample."""
+        for label_values, values in sorted(self.collect().items()):
+            yield "", format_labels(self.labels, label_values), values[0]
+
+    def render(self):
+        """The metric in the text format."""
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """Value that only goes up."""
+    kind = "counter"
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values(label_values)[0] += amount
+
+class Gauge(Metric):
+    """Value that goes up and down (ex: requests in flight)."""
+    kind = "gauge"
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values(label_values)[0] += amount
+
+    def dec(self, *label_values, amount: float = 1):
+        self.values(label_values)[0] -= amount
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+    Value lists are [count per bucket..., sum, count].
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets # Upper bounds, ascending
+
+    def size(self):
+        return len(self.buckets) + 2
+
+    def observe(self, value: float, *label_values):
+        values = self.values(label_values)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                values[index] += 1
+                break
+        values[-2] += value
+        values[-1] += 1
+
+    def samples(self):
+        for label_values, values in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                yield "_bucket", format_labels(self.labels, label_values, f'le="{bound}"'), cumulative
+            yield "_bucket", format_labels(self.labels, label_values, 'le="+Inf"'), values[-1]
+            yield "_sum",    format_labels(self.labels, label_values), values[-2]
+            yield "_count",  format_labels(self.labels, label_values), values[-1]
+
+class Collected(Metric):
+    """
+    Metric read from elsewhere when scraped (ex: the pool
+    statistics), through a callable returning
+    {label values: value}.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, collect, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self.kind     = kind    # counter or gauge
+        self.callback = collect # Returns the current values
+
+    def collect(self):
+        return {label_values: [value] for label_values, value in self.callback().items()}
+
+class Registry:
+    """The metrics exported at /metrics."""
+    def __init__(self):
+        self.metrics = [] # In registration order
+
+    def register(self, metric: Metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple = ()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def collected(self, name: str, help: str, kind: str, collect, labels: tuple = ()):
+        return self.register(Collected(name, help, kind, collect, labels))
+
+    def render(self):
+        """Every metric in the text format."""
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+# Metrics of the app, rendered at /metrics.
+METRICS = Registry()
+
+# Request metrics, recorded by the request hooks in main.py.
+REQUEST_DURATION = METRICS.histogram(
+    "unihive_request_duration_seconds", "Time to handle a request.",
+    ("endpoint", "method", "status")
+)
+REQUESTS_IN_FLIGHT = METRICS.gauge(
+    "unihive_requests_in_flight", "Requests being handled right now.",
+    ("endpoint",)
+)
+REQUEST_DB_TIME = METRICS.histogram(
+    "unihive_request_db_seconds", "Time a request spent in database queries.",
+    ("endpoint",)
+)
+REQUEST_QUERIES = METRICS.counter(
+    "unihive_db_queries_total", "Database queries made by requests.",
+    ("endpoint",)
+)
+IDENTITY_MAP = METRICS.counter(
+    "unihive_identity_map_lookups_total", "Identity map lookups of requests.",
+    ("result",)
+)
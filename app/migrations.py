@@ -0,0 +1,634 @@
+# Filename: migrations.py
+# Description: This module contains the versioned database schema migrations
+# Inputs: N/A
+# Output: N/A
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import time
+
+from blob_store import SYLLABUS_STORE
+from db import query, transaction
+
+"""
+The schema version of a database is stored in its
+PRAGMA user_version. Every entry of MIGRATIONS moves
+the database up one version, so existing databases
+are upgraded in place instead of being wiped. Never
+edit a migration that has shipped, append a new one.
+
+A migration is a (description, steps) tuple, where
+a step is either a SQL statement or a function that
+is called with no arguments. All the steps of one
+migration run in a single transaction.
+"""
+
+MIGRATIONS = [
+    # Version 1
+    (
+        "Add hot path indexes",
+        [
+            # Home feed: top-level posts by (created, id) cursor. Its
+            # leading column also serves reply lookups by parent.
+            # Not covering on purpose: the feed shows the content,
+            # and copying every post body into the index would about
+            # double the table. A page reads its 21 rows by rowid.
+            """
+            CREATE INDEX IF NOT EXISTS posts_feed
+            ON posts (parent, created DESC, id DESC);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS posts_course
+            ON posts (course, parent, created);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS user_post_likes_post
+            ON user_post_likes (post, is_like);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS course_ratings_course
+            ON course_ratings (course);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS user_courses_user
+            ON user_courses (user);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS user_universities_user
+            ON user_universities (user);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS departments_university
+            ON departments (university, abbreviation);
+            """
+        ]
+    ),
+
+    # Version 2
+    (
+        "Add full text search of universities and courses",
+        [
+            # Full text search index of universities (rowid = university id).
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS universities_search
+            USING fts5 (name, acronym);
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS universities_search_insert
+            AFTER INSERT ON universities BEGIN
+                INSERT INTO universities_search (rowid, name, acronym)
+                VALUES (new.id, new.name, new.acronym);
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS universities_search_update
+            AFTER UPDATE OF name, acronym ON universities BEGIN
+                UPDATE universities_search SET name = new.name, acronym = new.acronym
+                WHERE rowid = new.id;
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS universities_search_delete
+            AFTER DELETE ON universities BEGIN
+                DELETE FROM universities_search WHERE rowid = old.id;
+            END;
+            """,
+            """
+            INSERT INTO universities_search (rowid, name, acronym)
+            SELECT id, name, acronym FROM universities
+            WHERE id NOT IN (SELECT rowid FROM universities_search);
+            """,
+
+            # Full text search index of courses (rowid = course id).
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS courses_search
+            USING fts5 (name, course_number, abbreviation);
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS courses_search_insert
+            AFTER INSERT ON courses BEGIN
+                INSERT INTO courses_search (rowid, name, course_number, abbreviation)
+                VALUES (
+                    new.id, new.name, new.course_number,
+                    (SELECT abbreviation FROM departments WHERE id = new.department)
+                );
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS courses_search_update
+            AFTER UPDATE OF name, course_number, department ON courses BEGIN
+                UPDATE courses_search SET
+                    name          = new.name,
+                    course_number = new.course_number,
+                    abbreviation  = (SELECT abbreviation FROM departments WHERE id = new.department)
+                WHERE rowid = new.id;
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS courses_search_delete
+            AFTER DELETE ON courses BEGIN
+                DELETE FROM courses_search WHERE rowid = old.id;
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS courses_search_department
+            AFTER UPDATE OF abbreviation ON departments BEGIN
+                UPDATE courses_search SET abbreviation = new.abbreviation
+                WHERE rowid IN (SELECT id FROM courses WHERE department = new.id);
+            END;
+            """,
+            """
+            INSERT INTO courses_search (rowid, name, course_number, abbreviation)
+            SELECT courses.id, courses.name, course_number, abbreviation
+            FROM courses LEFT JOIN departments ON departments.id = courses.department
+            WHERE courses.id NOT IN (SELECT rowid FROM courses_search);
+            """
+        ]
+    ),
+
+    # Version 3
+    (
+        "Recount post like/dislike/reply counters",
+        [
+            """
+            UPDATE posts SET
+                likes       = (SELECT COUNT(*) FROM user_post_likes
+                               WHERE post = posts.id AND is_like = TRUE),
+                dislikes    = (SELECT COUNT(*) FROM user_post_likes
+                               WHERE post = posts.id AND is_like = FALSE),
+                reply_count = (SELECT COUNT(*) FROM posts AS replies
+                               WHERE replies.parent = posts.id);
+            """
+        ]
+    ),
+
+    # Version 4
+    (
+        "Move syllabus files out of the database",
+        [
+            """
+            CREATE TABLE syllabus_files (
+                id          INTEGER PRIMARY KEY,
+                coursename  VARCHAR NOT NULL,
+                filename    VARCHAR NOT NULL,
+                digest      VARCHAR NOT NULL,
+                size        INTEGER NOT NULL
+            );
+            """,
+            lambda: move_syllabus_blobs(),
+            "DROP TABLE syllabus;",
+            "ALTER TABLE syllabus_files RENAME TO syllabus;",
+            """
+            CREATE INDEX IF NOT EXISTS syllabus_course
+            ON syllabus (coursename, filename);
+            """
+        ]
+    ),
+
+    # Version 5
+    (
+        "Add incrementally maintained course rating aggregates",
+        [
+            # One rating per user per course, keeping the latest.
+            """
+            DELETE FROM course_ratings WHERE id NOT IN (
+                SELECT MAX(id) FROM course_ratings GROUP BY user, course
+            );
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS course_ratings_user
+            ON course_ratings (user, course);
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS course_stats (
+                course           INTEGER PRIMARY KEY,
+                difficulty_sum   REAL    DEFAULT 0 NOT NULL,
+                difficulty_count INTEGER DEFAULT 0 NOT NULL,
+                grade_sum        REAL    DEFAULT 0 NOT NULL,
+                grade_count      INTEGER DEFAULT 0 NOT NULL
+            );
+            """,
+            # Histograms of the hours, grade and instructor fields.
+            """
+            CREATE TABLE IF NOT EXISTS course_stat_counts (
+                course INTEGER NOT NULL,
+                field  VARCHAR NOT NULL,
+                value           NOT NULL,
+                count  INTEGER DEFAULT 0 NOT NULL,
+                PRIMARY KEY (course, field, value)
+            ) WITHOUT ROWID;
+            """,
+            """
+            INSERT INTO course_stats (course, difficulty_sum, difficulty_count, grade_sum, grade_count)
+            SELECT course, TOTAL(difficulty), COUNT(difficulty), TOTAL(grade), COUNT(grade)
+            FROM course_ratings GROUP BY course;
+            """,
+            """
+            INSERT INTO course_stat_counts (course, field, value, count)
+            SELECT course, 'hours', hours, COUNT(*) FROM course_ratings
+            WHERE hours IS NOT NULL GROUP BY course, hours
+            UNION ALL
+            SELECT course, 'grade', grade, COUNT(*) FROM course_ratings
+            WHERE grade IS NOT NULL GROUP BY course, grade
+            UNION ALL
+            SELECT course, 'instructor', instructor, COUNT(*) FROM course_ratings
+            WHERE instructor IS NOT NULL GROUP BY course, instructor;
+            """,
+            """
+            UPDATE courses SET hours = (
+                SELECT value FROM course_stat_counts
+                WHERE course = courses.id AND field = 'hours'
+                ORDER BY count DESC, value LIMIT 1
+            )
+            WHERE id IN (SELECT course FROM course_stat_counts WHERE field = 'hours');
+            """
+        ]
+    ),
+
+    # Version 6
+    (
+        "Add post view counts",
+        [
+            "ALTER TABLE posts ADD COLUMN views INTEGER DEFAULT 0 NOT NULL;",
+            """
+            CREATE INDEX IF NOT EXISTS user_post_views_post
+            ON user_post_views (post, created);
+            """,
+            """
+            UPDATE posts SET views = (
+                SELECT COUNT(*) FROM user_post_views WHERE post = posts.id
+            );
+            """
+        ]
+    ),
+
+    # Version 7
+    (
+        "Add hot ranking scores of posts and courses",
+        [
+            "ALTER TABLE posts ADD COLUMN hot REAL;",
+            "ALTER TABLE courses ADD COLUMN hot REAL;",
+            """
+            CREATE INDEX IF NOT EXISTS posts_course_hot
+            ON posts (course, parent, hot DESC);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS courses_university_hot
+            ON courses (university, hot DESC);
+            """,
+            # Top-level posts whose score must be refreshed.
+            """
+            CREATE TABLE IF NOT EXISTS ranking_dirty (
+                post INTEGER PRIMARY KEY
+            );
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS ranking_dirty_insert
+            AFTER INSERT ON posts WHEN new.parent IS NULL BEGIN
+                INSERT OR IGNORE INTO ranking_dirty (post) VALUES (new.id);
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS ranking_dirty_update
+            AFTER UPDATE OF likes, dislikes, reply_count, views ON posts
+            WHEN new.parent IS NULL BEGIN
+                INSERT OR IGNORE INTO ranking_dirty (post) VALUES (new.id);
+            END;
+            """,
+            """
+            INSERT OR IGNORE INTO ranking_dirty (post)
+            SELECT id FROM posts WHERE parent IS NULL;
+            """
+        ]
+    ),
+
+    # Version 8
+    (
+        "Add entity version counters for ETags",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS entity_versions (
+                kind    VARCHAR NOT NULL,
+                id      INTEGER NOT NULL,
+                version INTEGER DEFAULT 0 NOT NULL,
+                PRIMARY KEY (kind, id)
+            ) WITHOUT ROWID;
+            """
+        ]
+    ),
+
+    # Version 9
+    (
+        "Add unique keys of departments and courses",
+        [
+            # Merge duplicate departments into the oldest one.
+            "UPDATE departments SET abbreviation = UPPER(abbreviation);",
+            """
+            CREATE TEMP TABLE department_duplicates AS
+            SELECT id, (
+                SELECT MIN(keep.id) FROM departments AS keep
+                WHERE keep.university = departments.university
+                AND keep.abbreviation = departments.abbreviation
+            ) AS keeper
+            FROM departments;
+            """,
+            "DELETE FROM department_duplicates WHERE id = keeper;",
+            """
+            UPDATE courses SET department = (
+                SELECT keeper FROM department_duplicates WHERE id = courses.department
+            )
+            WHERE department IN (SELECT id FROM department_duplicates);
+            """,
+            "DELETE FROM departments WHERE id IN (SELECT id FROM department_duplicates);",
+            "DROP TABLE department_duplicates;",
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS departments_abbreviation
+            ON departments (university, abbreviation);
+            """,
+
+            # Merge duplicate courses (same department and number)
+            # into the oldest one, moving everything that points
+            # at the duplicates over to it.
+            """
+            CREATE TEMP TABLE course_duplicates AS
+            SELECT id, (
+                SELECT MIN(keep.id) FROM courses AS keep
+                WHERE keep.department = courses.department
+                AND keep.course_number = courses.course_number
+            ) AS keeper
+            FROM courses;
+            """,
+            "DELETE FROM course_duplicates WHERE id = keeper;",
+            *[
+                f"""
+                UPDATE {table} SET course = (
+                    SELECT keeper FROM course_duplicates WHERE id = {table}.course
+                )
+                WHERE course IN (SELECT id FROM course_duplicates);
+                """
+                for table in ("posts", "user_courses", "course_moderators")
+            ],
+            # One rating per user per course, the keeper's wins.
+            """
+            UPDATE OR IGNORE course_ratings SET course = (
+                SELECT keeper FROM course_duplicates WHERE id = course_ratings.course
+            )
+            WHERE course IN (SELECT id FROM course_duplicates);
+            """,
+            "DELETE FROM course_ratings WHERE course IN (SELECT id FROM course_duplicates);",
+            # Rebuild the rating aggregates of the merged courses.
+            """
+            DELETE FROM course_stats WHERE course IN (
+                SELECT id FROM course_duplicates UNION SELECT keeper FROM course_duplicates
+            );
+            """,
+            """
+            DELETE FROM course_stat_counts WHERE course IN (
+                SELECT id FROM course_duplicates UNION SELECT keeper FROM course_duplicates
+            );
+            """,
+            """
+            INSERT INTO course_stats (course, difficulty_sum, difficulty_count, grade_sum, grade_count)
+            SELECT course, TOTAL(difficulty), COUNT(difficulty), TOTAL(grade), COUNT(grade)
+            FROM course_ratings WHERE course IN (SELECT keeper FROM course_duplicates)
+            GROUP BY course;
+            """,
+            """
+            INSERT INTO course_stat_counts (course, field, value, count)
+            SELECT course, 'hours', hours, COUNT(*) FROM course_ratings
+            WHERE hours IS NOT NULL AND course IN (SELECT keeper FROM course_duplicates)
+            GROUP BY course, hours
+            UNION ALL
+            SELECT course, 'grade', grade, COUNT(*) FROM course_ratings
+            WHERE grade IS NOT NULL AND course IN (SELECT keeper FROM course_duplicates)
+            GROUP BY course, grade
+            UNION ALL
+            SELECT course, 'instructor', instructor, COUNT(*) FROM course_ratings
+            WHERE instructor IS NOT NULL AND course IN (SELECT keeper FROM course_duplicates)
+            GROUP BY course, instructor;
+            """,
+            # The keepers' hot scores now cover the moved posts.
+            """
+            INSERT OR IGNORE INTO ranking_dirty (post)
+            SELECT id FROM posts
+            WHERE parent IS NULL AND course IN (SELECT keeper FROM course_duplicates);
+            """,
+            "DELETE FROM courses WHERE id IN (SELECT id FROM course_duplicates);",
+            "DROP TABLE course_duplicates;",
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS courses_number
+            ON courses (department, course_number);
+            """
+        ]
+    ),
+
+    # Version 10
+    (
+        "Add server-side sessions",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id      VARCHAR PRIMARY KEY,
+                user    INTEGER,
+                data    VARCHAR NOT NULL,
+                expires INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS sessions_expires
+            ON sessions (expires);
+            """
+        ]
+    ),
+
+    # Version 11
+    (
+        "Add home timelines",
+        [
+            # One row per (follower, post), newest last in the key.
+            """
+            CREATE TABLE IF NOT EXISTS timelines (
+                user    INTEGER NOT NULL,
+                created TIMESTAMP NOT NULL,
+                post    INTEGER NOT NULL,
+                PRIMARY KEY (user, created, post)
+            ) WITHOUT ROWID;
+            """,
+            # Users whose timeline has been built.
+            """
+            CREATE TABLE IF NOT EXISTS timeline_users (
+                user INTEGER PRIMARY KEY
+            );
+            """,
+            # Courses whose posts are merged in at read time.
+            """
+            CREATE TABLE IF NOT EXISTS timeline_pull (
+                course INTEGER PRIMARY KEY
+            );
+            """,
+            # Followers of a course or university, for fanning out.
+            """
+            CREATE INDEX IF NOT EXISTS user_courses_course
+            ON user_courses (course);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS user_universities_university
+            ON user_universities (university);
+            """,
+            lambda: mark_pull_courses()
+        ]
+    ),
+
+    # Version 12
+    (
+        "Key syllabus files by department abbreviation",
+        [
+            # Course names used to be built from the department's
+            # name (ex: eecs-581), they now use its abbreviation.
+            """
+            UPDATE syllabus SET coursename = (
+                SELECT departments.abbreviation || '-' || courses.course_number
+                FROM courses INNER JOIN departments ON departments.id = courses.department
+                WHERE departments.name || '-' || courses.course_number = syllabus.coursename
+                LIMIT 1
+            )
+            WHERE coursename IN (
+                SELECT departments.name || '-' || courses.course_number
+                FROM courses INNER JOIN departments ON departments.id = courses.department
+            );
+            """
+        ]
+    ),
+
+    # Version 13
+    (
+        "Index the timeline rows of each post",
+        [
+            # Deleting a post removes it from every timeline.
+            """
+            CREATE INDEX IF NOT EXISTS timelines_post
+            ON timelines (post);
+            """,
+            # Rows of the posts deleted before that.
+            """
+            DELETE FROM timelines WHERE post NOT IN (SELECT id FROM posts);
+            """
+        ]
+    ),
+]
+
+################################################################################
+
+def move_syllabus_blobs():
+    """
+    Write every syllabus BLOB to the syllabus file store
+    and record its digest in syllabus_files. Rows are read
+    one at a time so only a single file is held in memory.
+    """
+
+    for (id,) in query("SELECT id FROM syllabus;"):
+        coursename, filename, file = query(
+            "SELECT coursename, filename, file FROM syllabus WHERE id = ?;",
+            (id,),
+            count = 1
+        )
+        digest, size = SYLLABUS_STORE.put_bytes(file)
+        query(
+            """
+            INSERT INTO syllabus_files (id, coursename, filename, digest, size)
+            VALUES (?, ?, ?, ?, ?);
+            """,
+            (id, coursename, filename, digest, size)
+        )
+
+def mark_pull_courses():
+    """
+    List the courses that already have too many followers
+    to fan out in timeline_pull. The timelines themselves
+    are built per user, on their first visit of the home
+    page.
+    """
+
+    # Avoid circular import.
+    from timeline import FANOUT_LIMIT
+
+    query(
+        """
+        INSERT OR IGNORE INTO timeline_pull (course)
+        SELECT courses.id FROM courses
+        LEFT JOIN (
+            SELECT course, COUNT(*) AS follows FROM user_courses GROUP BY course
+        ) AS course_follows ON course_follows.course = courses.id
+        LEFT JOIN (
+            SELECT university, COUNT(*) AS follows FROM user_universities GROUP BY university
+        ) AS university_follows ON university_follows.university = courses.university
+        WHERE IFNULL(course_follows.follows, 0) + IFNULL(university_follows.follows, 0) > ?;
+        """,
+        (FANOUT_LIMIT,)
+    )
+
+def schema_version():
+    """Return the schema version of the database."""
+    return query("PRAGMA user_version;", count = 1)[0]
+
+def step_name(step):
+    """Short name of a migration step for the log."""
+
+    if callable(step):
+        # Steps are lambdas calling a function defined below.
+        names = step.__code__.co_names
+        return f"{names[0] if names else step.__name__}()"
+
+    name = " ".join(step.split())
+    return name if len(name) <= 60 else name[:57] + "..."
+
+def migrate():
+    """
+    Apply every migration newer than the database's
+    schema version, in order, printing how long each
+    step and each migration took. Stops at the first
+    migration that fails.
+
+    Several processes (ex: gunicorn workers) may start
+    at once, so the version is checked again once the
+    migration's write transaction holds the lock, and
+    migrations another process applied are skipped.
+
+    :returns: True if the database is up to date, else False.
+    """
+
+    for number in range(schema_version() + 1, len(MIGRATIONS) + 1):
+        description, steps = MIGRATIONS[number - 1]
+        start   = time.perf_counter()
+        applied = False # Already applied by another process
+
+        with transaction():
+            if schema_version() >= number:
+                applied = True
+            else:
+                for step in steps:
+                    step_start = time.perf_counter()
+
+                    if callable(step):      # Run the step, either
+                        step()              # as a function or
+                    else:                   # as SQL.
+                        query(step)
+
+                    print(f"[MIGRATION]   {number}: {step_name(step)} ({time.perf_counter() - step_start:.3f}s)")
+
+                # Bump the version in the same transaction.
+                query(f"PRAGMA user_version = {number};")
+
+        elapsed = time.perf_counter() - start
+
+        # The transaction was rolled back on error.
+        if schema_version() < number:
+            print(f"[MIGRATION ERROR] {number}: {description}")
+            return False
+
+        if applied:
+            print(f"[MIGRATION] {number}: {description} (applied by another process)")
+        else:
+            print(f"[MIGRATION] {number}: {description} ({elapsed:.3f}s)")
+
+    return True
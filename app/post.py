@@ -8,19 +8,55 @@
 import datetime
 
 from course import Course
-from db import query
+from db import query, transaction
+from eager import preload
+from timeline import TIMELINE
 from university import University
 from user import User
-
+from versions import bump, bump_post
+
+# Recursive CTE selecting the ids of a post and every reply below it.
+THREAD_CTE = """
+    WITH RECURSIVE thread(id) AS (
+        SELECT id FROM posts WHERE id = ?
+        UNION ALL
+        SELECT posts.id FROM posts
+        INNER JOIN thread ON posts.parent = thread.id
+    )
+"""
 
 class Post: 
+    __slots__ = ("id", "created", "title", "content", "author_id", "course_id", "_author", "_course")
+
+    # Relationships that eager.preload can batch load.
+    relations = {
+        "author": ("author_id", "_author", User.get_users_by_ids),
+        "course": ("course_id", "_course", Course.get_courses_by_ids)
+    }
+
     def __init__(self, id, created, title, content, author, course_id): 
-        self.id      = id                                 # Database ID       
-        self.created = created                            # Date Created  
-        self.title   = title                              # Title of post        
-        self.content = content                            # Post body  
-        self.author  = User.get_user_by_id(author)        # Author of post
-        self.course  = Course.get_course_by_id(course_id) # Course post belongs to  
+        self.id        = id        # Database ID       
+        self.created   = created   # Date Created  
+        self.title     = title     # Title of post        
+        self.content   = content   # Post body  
+        self.author_id = author    # Database ID of the author
+        self.course_id = course_id # Database ID of the course
+        self._author   = None      # Loaded on first access
+        self._course   = None      # Loaded on first access
+
+    @property
+    def author(self):
+        """Author of post, loaded on first access."""
+        if self._author is None:
+            self._author = User.get_user_by_id(self.author_id)
+        return self._author
+
+    @property
+    def course(self):
+        """Course post belongs to, loaded on first access."""
+        if self._course is None:
+            self._course = Course.get_course_by_id(self.course_id)
+        return self._course
 
     @property
     def replies(self):
@@ -31,84 +67,52 @@ class Post:
         """
 
         # Get the top-level replies from the database.
-        return [Post(*params) for params in query(
+        return preload(query(
             """
                 SELECT id, created, title, content, author_id, course FROM posts
                 WHERE parent = ?
                 ORDER BY created DESC;
             """,
-            (self.id,)
-        )]
+            (self.id,),
+            factory = Post
+        ), "author")
     
     @property
     def likes(self):
-        """Post like count getter."""
-
-        num_likes = query(
-            """
-                SELECT COUNT(*) FROM user_post_likes 
-                WHERE is_like = TRUE AND post = ?;
-            """,
+        """
+        Post like count getter. The count is kept
+        up to date by the vote toggle, so this is
+        a plain read of the posts.likes column.
+        """
+        return query(
+            "SELECT likes FROM posts WHERE id = ?;",
             (self.id,),
             count = 1
         )[0]
 
-
-        # quick hack for adding likes to a post in the posts table 
-        # TODO: this sucks :/
-        query(
-            """
-            UPDATE posts 
-            SET likes = ?
-            WHERE id = ?
-            """,
-            (num_likes, self.id)
-        )
-
-        # Another quick hack for updating course popularity score lol
-        # TODO: this sucks :/
-        popularity_score = query(
-            """
-                SELECT COUNT(*) FROM courses 
-                WHERE id = ?;
-            """,
-            (self.course.id,)
-        )[0][0]
-
-        # BUG: User could just keep liking and unliking to boost popularity_score
-        query(
-            """
-            UPDATE courses 
-            SET popularity_score = ?
-            WHERE id = ?
-            """,
-            (popularity_score+1, self.id)
-        )
-
-        # DEBUG: can remove 
-        # print(query(
-        #     """
-        #     select * FROM courses
-        #     WHERE id = ?
-        #     """,
-        #     (self.course.id, )))
-        # print(query(
-        #     """
-        #     select * FROM posts 
-        #     WHERE id = ?
-        #     """,
-        #     (self.id, )))
-
-        return num_likes
-
     @property
     def dislikes(self):
-        """Post dislike count getter."""
+        """Post dislike count getter (posts.dislikes column)."""
         return query(
-            """
-                SELECT COUNT(*) FROM user_post_likes 
-                WHERE is_like = FALSE AND post = ?;
-            """,
+            "SELECT dislikes FROM posts WHERE id = ?;",
+            (self.id,),
+            count = 1
+        )[0]
+
+    @property
+    def reply_count(self):
+        """Direct reply count getter (posts.reply_count column)."""
+        return query(
+            "SELECT reply_count FROM posts WHERE id = ?;",
+            (self.id,),
+            count = 1
+        )[0]
+    
+    @property
+    def views(self):
+        """View count getter (posts.views column, flushed in batches)."""
+        return query(
+            "SELECT views FROM posts WHERE id = ?;",
             (self.id,),
             count = 1
         )[0]
@@ -127,21 +131,38 @@ class Post:
     
     def edit(self, new_content):
         """Edit an existing post with the new content."""
-        query(
-            """
-                UPDATE posts SET content = ?
-                WHERE id = ?;
-            """,
-            (new_content, self.id)
-        )
+        with transaction():
+            query(
+                """
+                    UPDATE posts SET content = ?
+                    WHERE id = ?;
+                """,
+                (new_content, self.id)
+            )
+            bump_post(self.id)
+            bump(("course", self.course.id))
         self.content = new_content
 
     def delete(self):
         """Delete calling post from the database."""
-        query(
-            """DELETE FROM posts WHERE id = ?""",
-            (self.id,)
-        )
+        with transaction():
+            # The post's page and those above it change.
+            bump_post(self.id)
+            bump(("course", self.course.id))
+
+            # Remove the post from its parent's reply count.
+            query(
+                """
+                    UPDATE posts SET reply_count = reply_count - 1
+                    WHERE id = (SELECT parent FROM posts WHERE id = ?);
+                """,
+                (self.id,)
+            )
+            query(
+                """DELETE FROM posts WHERE id = ?""",
+                (self.id,)
+            )
+            TIMELINE.remove(self.id) # Take it off the home timelines
     
     def authored_by(self, user):
         """Simply return if user is the author."""
@@ -180,33 +201,64 @@ class Post:
     def _toggle_like_or_dislike(self, user: User, is_like: bool):
         """
         Insert either a like or a dislike into the database.
+        The vote and the post's like/dislike counters are
+        written in one transaction.
 
         :param user: The user that supplies the like/dislike.
         :param is_like: True if is like. False if is dislike.
         """
 
-        # If the user already liked/disliked the post,
-        # remove that like/dislike instead (i.e. toggle).
-        if (is_like and self.liked_by(user)) or \
-            (not is_like and self.disliked_by(user)):
-            query(
+        with transaction():
+            # Get the user's current vote on the post, if any.
+            previous = query(
                 """
-                DELETE FROM user_post_likes
-                WHERE is_like = ? AND user = ? AND post = ?;
+                SELECT is_like FROM user_post_likes
+                WHERE user = ? AND post = ?;
                 """,
-                (is_like, user.id, self.id)
+                (user.id, self.id),
+                count = 1
             )
-            return
 
-        # The database will automatically deal with duplicates.
-        # It will replace old like/dislike status with new one.
-        query(
-            """
-            INSERT INTO user_post_likes (is_like, user, post)
-            VALUES (?, ?, ?)
-            """,
-            (is_like, user.id, self.id)
-        )
+            likes    = 0 # Change to the like count
+            dislikes = 0 # Change to the dislike count
+
+            if previous is not None:
+                # Take back the previous vote from the counters.
+                likes    -= bool(previous[0])
+                dislikes -= not previous[0]
+
+            # If the user already liked/disliked the post,
+            # remove that like/dislike instead (i.e. toggle).
+            if previous is not None and bool(previous[0]) == is_like:
+                query(
+                    """
+                    DELETE FROM user_post_likes
+                    WHERE user = ? AND post = ?;
+                    """,
+                    (user.id, self.id)
+                )
+            else:
+                # The database will automatically deal with duplicates.
+                # It will replace old like/dislike status with new one.
+                query(
+                    """
+                    INSERT INTO user_post_likes (is_like, user, post)
+                    VALUES (?, ?, ?)
+                    """,
+                    (is_like, user.id, self.id)
+                )
+                likes    += is_like
+                dislikes += not is_like
+
+            # Apply the change to the denormalized counters.
+            query(
+                """
+                UPDATE posts SET likes = likes + ?, dislikes = dislikes + ?
+                WHERE id = ?;
+                """,
+                (likes, dislikes, self.id)
+            )
+            bump_post(self.id)
 
     def toggle_like(self, user):
         """
@@ -222,6 +274,14 @@ class Post:
         """
         self._toggle_like_or_dislike(user, False)
 
+    def thread(self, viewer: User = None):
+        """
+        Load the entire reply tree below the calling post.
+        :param viewer: User whose own votes should be marked.
+        :return: Thread object with the tree built in memory.
+        """
+        return Thread(self, viewer)
+
     def add_reply(self, user, content):
         """
         Add a reply to the calling post.
@@ -229,13 +289,23 @@ class Post:
         :param user: Author of reply.
         :param body: Content of reply.
         """
-        query(
-            """
-            INSERT INTO posts (title, content, author, author_id, course, parent, is_reply)
-            VALUES ('', ?, ?, ?, ?, ?, TRUE);
-            """,
-            (content, user.id, user.id, self.course.id, self.id,)
-        )
+        with transaction():
+            query(
+                """
+                INSERT INTO posts (title, content, author, author_id, course, parent, is_reply)
+                VALUES ('', ?, ?, ?, ?, ?, TRUE);
+                """,
+                (content, user.id, user.id, self.course.id, self.id,)
+            )
+            query(
+                """
+                UPDATE posts SET reply_count = reply_count + 1
+                WHERE id = ?;
+                """,
+                (self.id,)
+            )
+            bump_post(self.id)
+            bump(("course", self.course.id))
 
     @staticmethod
     def get_post_by_id(id: int):
@@ -244,16 +314,15 @@ class Post:
         Return None if post not found.
         """
 
-        params = query(
+        return query(
             """
                 SELECT id, created, title, content, author_id, course FROM posts
                 WHERE id = ?;
             """,
             (id,),
-            count = 1
-        )
-        if not params: return None # Post not found
-        return Post(*params)       # Construct Post object
+            count   = 1,
+            factory = Post
+        ) or None # None if post not found
 
     @staticmethod
     def get_post_by_title(title: str, course: Course = None):
@@ -275,17 +344,87 @@ class Post:
             where_params.append(course.id)
 
         # Conduct the database query.
-        params = query(
+        return query(
             f"""
                 SELECT id, created, title, content, author_id, course FROM posts
                 WHERE {' AND '.join(where_clauses)};
             """,
             tuple(where_params),
-            count = 1
+            count   = 1,
+            factory = Post
+        ) or None # None if post not found
+
+class ThreadNode:
+    """
+    A single post/reply of a thread together with its
+    preloaded vote counts and direct child replies.
+    """
+    def __init__(self, post):
+        self.post     = post  # Post object of this node
+        self.children = []    # Direct replies, newest first
+        self.likes    = 0     # Like count
+        self.dislikes = 0     # Dislike count
+        self.liked    = False # Viewer liked this post
+        self.disliked = False # Viewer disliked this post
+
+class Thread:
+    """
+    Reply tree of a post. The whole subtree (including
+    the vote counters) and the viewer's votes are each
+    loaded in one query, then assembled in memory.
+    """
+    def __init__(self, post: Post, viewer: User = None):
+        self.root  = ThreadNode(post) # Node of the thread's post
+        self.nodes = {post.id: self.root}
+
+        # Get every post in the subtree with its vote counters and
+        # its author's username, so authors are hydrated without queries.
+        rows = query(
+            THREAD_CTE + """
+                SELECT posts.id, posts.created, title, content, author_id, course, parent,
+                       likes, dislikes, users.username
+                FROM posts INNER JOIN thread ON posts.id = thread.id
+                LEFT JOIN users ON users.id = posts.author_id
+                ORDER BY posts.created DESC, posts.id DESC;
+            """,
+            (post.id,)
         )
 
-        if not params: return None # Post not found
-        return Post(*params)       # Construct Post object
+        parents = {} # Reply id -> parent id
+        for id, created, title, content, author_id, course_id, parent, likes, dislikes, username in rows:
+            if id == post.id:
+                node = self.root
+            else:
+                if username is not None:
+                    User.from_row(author_id, username)
+                node = ThreadNode(Post(id, created, title, content, author_id, course_id))
+                self.nodes[id] = node
+                parents[id] = parent
+
+            node.likes    = likes
+            node.dislikes = dislikes
+
+        # Attach every reply to its parent, keeping the newest first order.
+        for id, parent in parents.items():
+            if parent in self.nodes:
+                self.nodes[parent].children.append(self.nodes[id])
+
+        # Mark the posts that the viewer has voted on.
+        if viewer is not None:
+            for id, is_like in query(
+                THREAD_CTE + """
+                    SELECT post, is_like FROM user_post_likes
+                    WHERE user = ? AND post IN (SELECT id FROM thread);
+                """,
+                (post.id, viewer.id)
+            ):
+                self.nodes[id].liked    = bool(is_like)
+                self.nodes[id].disliked = not is_like
+
+    @property
+    def reply_count(self):
+        """Total number of replies in the thread."""
+        return len(self.nodes) - 1
 
 class Reply(Post): 
     def __init__(self):
@@ -0,0 +1,159 @@
+# Filename: query_log.py
+# Description: This module contains the per request query accounting and N+1 detection
+# Inputs: N/A
+# Output: N/A
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import heapq
+import os
+import re
+import sys
+from collections import Counter
+from contextvars import ContextVar
+
+"""
+db.query() and db.query_many() report every statement
+they run here. Within a request (see start()) the count,
+total time and slowest statements are kept, and so is
+how many times each statement shape ran: the same shape
+running over and over is usually a loop doing one query
+per item (N+1) that should be a single query. Statements
+slower than SLOW_QUERY_MS are logged even outside of a
+request (ex: the background threads).
+
+Parameters are never logged, only their types.
+"""
+
+SLOW_QUERY_MS = float(os.environ.get("UNIHIVE_SLOW_QUERY_MS", 100)) # Statements slower than this are logged
+N_PLUS_ONE    = int(os.environ.get("UNIHIVE_N_PLUS_ONE", 10))       # Runs of one shape in a request that count as N+1
+SLOWEST_KEPT  = 5 # Slowest statements kept per request
+SITE_FRAMES   = 4 # Frames of the call site reported
+
+APP_DIR      = os.path.dirname(os.path.abspath(__file__))
+SKIPPED      = {"db.py", "query_log.py", "identity_map.py"} # Frames that are never the call site
+PLACEHOLDERS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")      # (?, ?, ...) lists of any length
+
+# Query log of the current request, None outside of one.
+CURRENT = ContextVar("query_log", default = None)
+
+def shape(query: str):
+    """
+    Shape of a statement: its SQL with whitespace collapsed
+    and placeholder lists of any length made the same, so
+    "IN (?, ?)" and "IN (?, ?, ?)" count as one shape.
+    """
+    return PLACEHOLDERS.sub("(?, ...)", " ".join(query.split()))
+
+def redact(parameters):
+    """Types of the parameters, never their values."""
+
+    if isinstance(parameters, list):    # query_many() batches
+        return f"<{len(parameters)} rows>"
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return tuple(type(value).__name__ for value in parameters)
+
+def call_site():
+    """
+    Innermost app frames outside of the database layer that
+    led to the current statement, ex: "post.py:30 in __init__
+    <- course.py:52 in posts".
+    """
+
+    frames = []
+    frame  = sys._getframe(1)
+    while frame is not None and len(frames) < SITE_FRAMES:
+        path = frame.f_code.co_filename
+        name = os.path.basename(path)
+        if os.path.dirname(os.path.abspath(path)) == APP_DIR and name not in SKIPPED:
+            frames.append(f"{name}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return " <- ".join(frames) or "unknown"
+
+class QueryLog:
+    """
+    Query accounting of a single request: statement count,
+    total time, slowest statements and runs per shape.
+    """
+    def __init__(self, name: str):
+        self.name    = name      # What is being logged (ex: GET /u/KU)
+        self.count   = 0         # Statements run
+        self.time    = 0.0       # Seconds spent in statements
+        self.slowest = []        # Min-heap of (seconds, order, shape, parameter types)
+        self.shapes  = Counter() # Shape -> times it ran
+        self.sites   = {}        # Shape -> call site when it became an N+1
+
+    def record(self, query: str, parameters, elapsed: float):
+        """
+        Account for a statement.
+
+        :param query: SQL of the statement.
+        :param parameters: Its parameters (only their types are kept).
+        :param elapsed: Seconds it took.
+        """
+
+        self.count += 1
+        self.time  += elapsed
+
+        statement = shape(query)
+        self.shapes[statement] += 1
+        if self.shapes[statement] == N_PLUS_ONE:
+            self.sites[statement] = call_site()
+
+        entry = (elapsed, self.count, statement, redact(parameters))
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    @property
+    def n_plus_one(self):
+        """(shape, runs, call site) of every N+1, most runs first."""
+        return [(statement, self.shapes[statement], site) for statement, site in
+                sorted(self.sites.items(), key = lambda item: -self.shapes[item[0]])]
+
+    @property
+    def stats(self):
+        """Summary of the log for reporting."""
+        return {
+            "count"     : self.count,
+            "time"      : self.time,
+            "slowest"   : [(elapsed, statement, types) for elapsed, _, statement, types in sorted(self.slowest, reverse = True)],
+            "n_plus_one": self.n_plus_one
+        }
+
+    def report(self):
+        """Print the N+1 patterns found, if any."""
+        for statement, runs, site in self.n_plus_one:
+            print(f"[N+1 QUERY] {self.name}: {runs}x {statement} at {site}")
+
+def start(name: str):
+    """Start logging the queries of the current request."""
+    log = QueryLog(name)
+    CURRENT.set(log)
+    return log
+
+def current():
+    """Query log of the current request, None if not logging."""
+    return CURRENT.get()
+
+def finish():
+    """Stop logging and return the request's query log."""
+    log = CURRENT.get()
+    CURRENT.set(None)
+    return log
+
+def record(query: str, parameters, elapsed: float):
+    """
+    Called by the database layer after every statement.
+    Logs slow statements and accounts for the statement
+    in the current request's log.
+    """
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        print(f"[SLOW QUERY] {elapsed * 1000:.1f}ms {shape(query)} {redact(parameters)} at {call_site()}")
+
+    log = CURRENT.get()
+    if log is not None:
+        log.record(query, parameters, elapsed)
@@ -0,0 +1,186 @@
+# Filename: ranking.py
+# Description: This module contains the time decayed "hot" ranking of posts and courses
+# Inputs: N/A
+# Output: RANKING instance
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import calendar
+import math
+import threading
+import time
+
+import db
+from db import query, query_many, transaction
+
+"""
+Posts are scored like so:
+
+    hot = log10(activity) + (created - EPOCH) / DECAY_SECONDS
+
+where activity = net votes + weighted replies and views.
+Newer posts gain a constant boost over older ones, which
+is the same as decaying every older post, but the order
+of posts that nobody touched never changes. Scores only
+need to be refreshed for posts touched since the last
+refresh, which triggers record in the ranking_dirty table.
+
+A course's score is the log10 of the summed 10^hot of its
+hottest posts, so it is dominated by its best posts while
+still rewarding courses with many active threads.
+"""
+
+EPOCH         = 1704067200 # 2024-01-01 UTC, keeps the time term small
+DECAY_SECONDS = 45000      # Seconds of age worth one order of magnitude of activity
+REPLY_WEIGHT  = 2          # Activity of a reply relative to a vote
+VIEW_WEIGHT   = 0.1        # Activity of a view relative to a vote
+
+REFRESH_INTERVAL = 30   # Seconds between background refreshes
+REFRESH_BATCH    = 5000 # Max dirty posts refreshed per transaction
+COURSE_TOP_POSTS = 50   # Hottest posts that make up a course's score
+
+def post_score(created: str, likes: int, dislikes: int, reply_count: int, views: int):
+    """
+    Hot score of a post.
+
+    :param created: Creation timestamp of the post (YYYY-MM-DD HH:MM:SS, UTC).
+    :param likes: Like count.
+    :param dislikes: Dislike count.
+    :param reply_count: Direct reply count.
+    :param views: View count.
+    """
+
+    activity = (likes - dislikes) + REPLY_WEIGHT * reply_count + VIEW_WEIGHT * views
+    order    = math.log10(max(abs(activity), 1))
+    sign     = 1 if activity > 0 else -1 if activity < 0 else 0
+    seconds  = calendar.timegm(time.strptime(created[:19], "%Y-%m-%d %H:%M:%S")) - EPOCH
+    return sign * order + seconds / DECAY_SECONDS
+
+def course_score(post_scores: list):
+    """
+    Hot score of a course from the scores of its hottest
+    posts (log10 of the summed 10^score, computed stably).
+    Returns None for a course without scored posts.
+    """
+
+    if not post_scores:
+        return None
+    top = max(post_scores)
+    return top + math.log10(sum(10 ** (score - top) for score in post_scores))
+
+class RankingEngine:
+    """
+    Refreshes the hot scores of the posts touched since the
+    last run (and of their courses), periodically on a
+    background thread or on demand.
+    """
+    def __init__(self):
+        self.lock    = threading.Lock()  # One refresh at a time
+        self.stopped = threading.Event() # Tells the thread to exit
+        self.thread  = None              # Background refresh thread
+
+        # Statistics
+        self.refreshed_posts   = 0    # Post scores written
+        self.refreshed_courses = 0    # Course scores written
+        self.last_refresh      = None # Time of the last refresh
+
+    def refresh(self):
+        """
+        Refresh the scores of every dirty post and of the courses
+        they belong to, REFRESH_BATCH posts per transaction.
+
+        :returns: (posts, courses) refreshed.
+        """
+
+        posts   = 0
+        courses = 0
+
+        with self.lock:
+            while True:
+                batch = self._refresh_batch()
+                if batch is None:
+                    break
+                posts   += batch[0]
+                courses += batch[1]
+
+            self.refreshed_posts   += posts
+            self.refreshed_courses += courses
+            self.last_refresh       = time.time()
+
+        # Return the connection so the thread doesn't hold one.
+        db.pool.release()
+        return posts, courses
+
+    def _refresh_batch(self):
+        """
+        Refresh one batch of dirty posts in a transaction.
+        :returns: (posts, courses) refreshed, or None when done.
+        """
+
+        done = None
+        with transaction():
+            dirty = [post for (post,) in query(
+                "SELECT post FROM ranking_dirty LIMIT ?;",
+                (REFRESH_BATCH,)
+            )]
+            if not dirty:
+                return None
+
+            # Score the dirty posts that still exist.
+            rows = query(
+                f"""
+                SELECT id, course, created, likes, dislikes, reply_count, views
+                FROM posts WHERE id IN ({', '.join('?' * len(dirty))});
+                """,
+                tuple(dirty)
+            )
+            query_many(
+                "UPDATE posts SET hot = ? WHERE id = ?;",
+                [(post_score(*row[2:]), row[0]) for row in rows]
+            )
+            query_many(
+                "DELETE FROM ranking_dirty WHERE post = ?;",
+                [(post,) for post in dirty]
+            )
+
+            # Rescore the courses of the refreshed posts.
+            touched = {row[1] for row in rows}
+            for course in touched:
+                scores = [score for (score,) in query(
+                    """
+                    SELECT hot FROM posts
+                    WHERE course = ? AND parent IS NULL AND hot IS NOT NULL
+                    ORDER BY hot DESC LIMIT ?;
+                    """,
+                    (course, COURSE_TOP_POSTS)
+                )]
+                query(
+                    "UPDATE courses SET hot = ? WHERE id = ?;",
+                    (course_score(scores), course)
+                )
+
+            done = (len(rows), len(touched))
+
+        # None here means the transaction failed, stop for now.
+        return done
+
+    def run(self):
+        """Background thread loop, refreshes every REFRESH_INTERVAL."""
+        while not self.stopped.is_set():
+            self.refresh()
+            self.stopped.wait(REFRESH_INTERVAL)
+
+    def start(self):
+        """Start the background refresh thread if not running."""
+        if self.thread is None:
+            self.thread = threading.Thread(target = self.run, name = "ranking", daemon = True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop the background refresh thread."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+# Engine of the post and course hot scores.
+RANKING = RankingEngine()
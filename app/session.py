@@ -1,24 +1,194 @@
 # Filename: session.py
 # Description: This module contains session related objects and methods
 # Inputs: N/A
-# Output: DEBUG SESSION object instance 
-# Authors: Xavier Ruyle
+# Output: SESSION object instance, SESSION_STORE session interface
+# Authors: Xavier Ruyle, Andrew Ward
 # Creation Date: 10/24/2024
 
+import itertools
+import secrets
+import time
+from datetime import datetime, timezone
+
+from db import query
+from flask import has_request_context
+from flask import session as flask_session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+"""
+Sessions are stored server-side in the sessions table,
+and the cookie only carries the session id, signed with
+the app's secret key. Any worker process sharing the
+database (and the secret key) can serve any visitor, so
+the app can run as several processes. The logged in
+user's id is the "user_id" key of the session.
+"""
+
+PURGE_EVERY = 1000 # Session writes between purges of expired sessions
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Session of one visitor, loaded from the sessions
+    table. Tracks changes so unchanged sessions are
+    never written back.
+    """
+    def __init__(self, initial: dict = None, sid: str = None, expires: int = 0):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid      = sid     # Session id, None until first saved
+        self.expires  = expires # Unix time the session expires at
+        self.modified = False   # Changed during the request
+        self.accessed = False   # Read during the request (Vary: Cookie)
+        self.rotate   = False   # Save under a new id (ex: on login)
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default = None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default = None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+class SessionStore(SessionInterface):
+    """
+    Flask session interface keeping the sessions in the
+    database. Sessions are only written when they change
+    or are past half of their lifetime (sliding expiry).
+    """
+    serializer = TaggedJSONSerializer() # Same format as Flask's cookie sessions
+    salt       = "unihive-session"      # Signer salt of the session cookie
+
+    def __init__(self):
+        self.writes = itertools.count(1) # Session writes, for purging
+
+    def signer(self, app):
+        """Signs and verifies the session id of the cookie."""
+        return Signer(app.secret_key, salt = self.salt, key_derivation = "hmac")
+
+    def open_session(self, app, request):
+        """Load the request's session, a new one if none is valid."""
+
+        # Static files never use the session, don't load it.
+        if request.path.startswith((f"{app.static_url_path}/", "/assets/")):
+            return ServerSession()
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie or not app.secret_key:
+            return ServerSession()
+
+        try:
+            sid = self.signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return ServerSession()
+
+        row = query(
+            "SELECT data, expires FROM sessions WHERE id = ? AND expires > ?;",
+            (sid, int(time.time())),
+            count = 1
+        )
+        if not row:                     # Expired or logged out elsewhere
+            return ServerSession()
+        return ServerSession(self.serializer.loads(row[0]), sid, row[1])
+
+    def save_session(self, app, session: ServerSession, response):
+        """Write the session back if needed and set its cookie."""
+
+        name   = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path   = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # Emptied (ex: logged out with nothing flashed), forget it.
+        if not session:
+            if session.sid is not None:
+                query("DELETE FROM sessions WHERE id = ?;", (session.sid,))
+                response.delete_cookie(name, domain = domain, path = path)
+            return
+
+        now      = int(time.time())
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        if not (session.modified or session.rotate or session.sid is None or session.expires - now < lifetime // 2):
+            return
+
+        if session.rotate and session.sid is not None:
+            query("DELETE FROM sessions WHERE id = ?;", (session.sid,))
+        if session.rotate or session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+
+        session.expires = now + lifetime
+        query(
+            """
+            INSERT INTO sessions (id, user, data, expires) VALUES (?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                user = excluded.user, data = excluded.data, expires = excluded.expires;
+            """,
+            (session.sid, session.get("user_id"), self.serializer.dumps(dict(session)), session.expires)
+        )
+
+        response.set_cookie(
+            name,
+            self.signer(app).sign(session.sid).decode(),
+            expires  = datetime.fromtimestamp(session.expires, timezone.utc),
+            httponly = self.get_cookie_httponly(app),
+            domain   = domain,
+            path     = path,
+            secure   = self.get_cookie_secure(app),
+            samesite = self.get_cookie_samesite(app)
+        )
+
+        if next(self.writes) % PURGE_EVERY == 0:
+            query("DELETE FROM sessions WHERE expires <= ?;", (now,))
+
 class Session:
     '''
     Class which identifies current user from the database
     Informs the website what user is viewing the pages
+    Inside a request the user comes from the visitor's own
+    server-side session; outside of one (scripts, benchmarks)
+    a process wide user is used.
     '''
     def __init__(self):
-        self.current_user_id = None  # Start with no user logged in
-        
+        self.default_user_id = None  # User outside of requests, none logged in
+
+    @property
+    def current_user_id(self):
+        if has_request_context():
+            return flask_session.get("user_id")
+        return self.default_user_id
+
+    @current_user_id.setter
+    def current_user_id(self, user_id):
+        if not has_request_context():
+            self.default_user_id = user_id
+        elif user_id is not None:
+            flask_session["user_id"] = user_id
+        elif "user_id" in flask_session:
+            del flask_session["user_id"]
+
     def login(self, user_id):
         self.current_user_id = user_id
-        
+        if has_request_context():
+            flask_session.rotate = True # New session id, against session fixation
+
     def logout(self):
-        self.current_user_id = None
-        
+        if has_request_context():
+            flask_session.clear()       # Also drops pending flashed messages
+            flask_session.rotate = True
+        else:
+            self.default_user_id = None
+
     @property
     def is_authenticated(self):
         return self.current_user_id is not None
@@ -26,4 +196,5 @@ class Session:
 # Initialize session with no user logged in
 SESSION = Session()
 
-
+# Session interface of the flask app.
+SESSION_STORE = SessionStore()
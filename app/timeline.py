@@ -0,0 +1,269 @@
+# Filename: timeline.py
+# Description: This module contains the personalized home timelines of the users
+# Inputs: N/A
+# Output: TIMELINE object instance
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import itertools
+
+from db import query
+from eager import preload
+
+"""
+The home page of a logged in user shows the top-level
+posts of the courses they follow, directly or through
+a university. Filtering the whole posts table by the
+user's follows on every request would be a large join,
+so new posts are fanned out on write instead: store_post
+adds a (user, created, post) row to the timelines table
+of every follower, and a page of a timeline is one range
+scan of that table's primary key. A user's timeline is
+built from their follows on their first visit of the home
+page (timeline_users), posts are only fanned out to the
+timelines that have been built.
+
+Courses with more than FANOUT_LIMIT followers would cost
+too many rows per post. Their posts are not fanned out,
+the course is listed in timeline_pull instead and its
+posts are merged into the timelines of its followers at
+read time. A timeline keeps about TIMELINE_CAP posts; the
+followers of every TRIM_EVERY-th fanned out post have
+their timelines trimmed. Deleted posts are removed from
+every timeline in the transaction of their delete, so a
+page never comes back short.
+"""
+
+TIMELINE_CAP = 1000 # Posts kept per timeline
+FANOUT_LIMIT = 5000 # Followers above which a course's posts are pulled
+TRIM_EVERY   = 100  # Fanned out posts between trims of the followers
+
+# Users following a course, directly or through its university.
+FOLLOWERS = """
+    SELECT user FROM user_courses WHERE course = ?
+    UNION
+    SELECT user FROM user_universities WHERE university = ?
+"""
+
+# Courses a user follows, directly or through a university.
+FOLLOWED_COURSES = """
+    SELECT course FROM user_courses WHERE user = ?
+    UNION
+    SELECT courses.id FROM courses
+    INNER JOIN user_universities ON user_universities.university = courses.university
+    WHERE user_universities.user = ?
+"""
+
+# Pulled courses a user follows, directly or through a university.
+FOLLOWED_PULL_COURSES = """
+    SELECT course FROM timeline_pull
+    WHERE course IN (SELECT course FROM user_courses WHERE user = ?)
+    UNION
+    SELECT timeline_pull.course FROM timeline_pull
+    INNER JOIN courses ON courses.id = timeline_pull.course
+    WHERE courses.university IN (SELECT university FROM user_universities WHERE user = ?)
+"""
+
+class Timeline:
+    """
+    Fan-out-on-write home timelines. Writes go through
+    fan_out (new posts), follow (new follows) and remove
+    (deleted posts), reads through page.
+    """
+    def __init__(self):
+        self.fanouts = itertools.count(1) # Fanned out posts, for trimming
+
+    def fan_out(self, course, post_id: int, created: str):
+        """
+        Add a new top-level post to the timelines of the
+        followers of its course, or mark the course as
+        pulled if it has too many followers. Runs in the
+        transaction of the post's insert.
+
+        :param course: Course the post belongs to.
+        :param post_id: Database id of the post.
+        :param created: Creation time of the post.
+        """
+
+        if query("SELECT 1 FROM timeline_pull WHERE course = ?;", (course.id,), count = 1):
+            return
+
+        # Follows of the course and of its university, a
+        # user following both is counted twice.
+        followers = query(
+            """
+            SELECT (SELECT COUNT(*) FROM user_courses WHERE course = ?)
+                 + (SELECT COUNT(*) FROM user_universities WHERE university = ?);
+            """,
+            (course.id, course.university_id),
+            count = 1
+        )[0]
+
+        if followers > FANOUT_LIMIT:
+            query("INSERT OR IGNORE INTO timeline_pull (course) VALUES (?);", (course.id,))
+            return
+
+        query(
+            f"""
+            INSERT OR IGNORE INTO timelines (user, created, post)
+            SELECT user, ?, ? FROM ({FOLLOWERS})
+            WHERE user IN (SELECT user FROM timeline_users);
+            """,
+            (created, post_id, course.id, course.university_id)
+        )
+
+        if next(self.fanouts) % TRIM_EVERY == 0:
+            self.trim(course)
+
+    def trim(self, course):
+        """
+        Drop the posts past TIMELINE_CAP from the timelines
+        of the followers of a course.
+        """
+
+        query(
+            f"""
+            DELETE FROM timelines WHERE (user, created, post) IN (
+                SELECT user, created, post FROM (
+                    SELECT user, created, post, ROW_NUMBER() OVER (
+                        PARTITION BY user ORDER BY created DESC, post DESC
+                    ) AS position
+                    FROM timelines WHERE user IN ({FOLLOWERS})
+                )
+                WHERE position > ?
+            );
+            """,
+            (course.id, course.university_id, TIMELINE_CAP)
+        )
+
+    def remove(self, post_id: int):
+        """
+        Remove a deleted post from every timeline. Runs in
+        the transaction of the post's delete.
+        """
+        query("DELETE FROM timelines WHERE post = ?;", (post_id,))
+
+    def built(self, user_id: int):
+        """Return if a user's timeline has been built."""
+        return bool(query("SELECT 1 FROM timeline_users WHERE user = ?;", (user_id,), count = 1))
+
+    def build(self, user_id: int):
+        """
+        Fill a user's timeline with the latest posts of every
+        course they follow and start fanning out to it. Posts
+        already in the timeline are kept.
+        """
+
+        query(
+            f"""
+            INSERT OR IGNORE INTO timelines (user, created, post)
+            SELECT ?, created, id FROM posts
+            WHERE parent IS NULL AND course IN (
+                {FOLLOWED_COURSES}
+                EXCEPT
+                SELECT course FROM timeline_pull
+            )
+            ORDER BY created DESC, id DESC
+            LIMIT ?;
+            """,
+            (user_id, user_id, user_id, TIMELINE_CAP)
+        )
+        query("INSERT OR IGNORE INTO timeline_users (user) VALUES (?);", (user_id,))
+
+    def follow(self, user_id: int, course = None, university = None):
+        """
+        Add the latest posts of a newly followed course or
+        university to a user's timeline, if it has been built
+        (otherwise the follow is picked up when it is).
+
+        :param user_id: The user that followed.
+        :param course: The followed course, or
+        :param university: the followed university.
+        """
+
+        if course is not None:
+            where, id = "posts.course = ?", course.id
+        else:
+            where, id = "courses.university = ?", university.id
+
+        query(
+            f"""
+            INSERT OR IGNORE INTO timelines (user, created, post)
+            SELECT ?, posts.created, posts.id FROM posts
+            INNER JOIN courses ON courses.id = posts.course
+            WHERE {where} AND posts.parent IS NULL
+            AND posts.course NOT IN (SELECT course FROM timeline_pull)
+            AND EXISTS (SELECT 1 FROM timeline_users WHERE user = ?)
+            ORDER BY posts.created DESC, posts.id DESC
+            LIMIT ?;
+            """,
+            (user_id, id, user_id, TIMELINE_CAP)
+        )
+
+    def page(self, user_id: int, cursor: tuple = None, page_size: int = 20):
+        """
+        Get one page of a user's timeline, most recent first,
+        with the posts of the pulled courses they follow
+        merged in. Uses the same (created, id) keyset cursor
+        as the site-wide feed.
+
+        :param user_id: The user whose timeline is read.
+        :param cursor: (created, id) of the last post of the previous page.
+        :param page_size: Number of posts per page.
+        :returns: (posts, next_cursor) where next_cursor is None on the last page.
+        """
+
+        # Avoid circular import.
+        from post import Post
+
+        timeline_clauses = ["user = ?"]       # Where clauses of the timeline scan.
+        pull_clauses     = ["parent IS NULL"] # Where clauses of the pulled posts.
+        timeline_params  = [user_id]          # Parameters of the timeline scan.
+        pull_params      = [user_id, user_id] # Parameters of the pulled posts.
+
+        # Continue strictly after the previous page's last post.
+        if cursor is not None:
+            timeline_clauses.append("(created, post) < (?, ?)")
+            pull_clauses.append("(posts.created, posts.id) < (?, ?)")
+            timeline_params.extend(cursor)
+            pull_params.extend(cursor)
+
+        # Both sources are cut to one page (+1 to know if there
+        # is a next one) before they are merged. The CROSS JOIN
+        # makes SQLite start from the (usually no) pulled courses
+        # and use posts_course, instead of scanning every post.
+        rows = query(
+            f"""
+            SELECT id, created, title, substr(content, 1, 301), author_id, course FROM posts
+            WHERE id IN (
+                SELECT post FROM (
+                    SELECT post FROM timelines
+                    WHERE {' AND '.join(timeline_clauses)}
+                    ORDER BY created DESC, post DESC
+                    LIMIT ?
+                )
+                UNION
+                SELECT id FROM (
+                    SELECT posts.id FROM ({FOLLOWED_PULL_COURSES}) AS pulled
+                    CROSS JOIN posts ON posts.course = pulled.course
+                    WHERE {' AND '.join(pull_clauses)}
+                    ORDER BY posts.created DESC, posts.id DESC
+                    LIMIT ?
+                )
+            )
+            ORDER BY created DESC, id DESC
+            LIMIT ?;
+            """,
+            (*timeline_params, page_size + 1, *pull_params, page_size + 1, page_size + 1)
+        )
+
+        posts = preload([Post(*row) for row in rows[:page_size]], "author", "course")
+
+        # The cursor of the next page is the last post shown.
+        next_cursor = None
+        if len(rows) > page_size:
+            next_cursor = (posts[-1].created, posts[-1].id)
+
+        return posts, next_cursor
+
+TIMELINE = Timeline() # Home timelines of the users
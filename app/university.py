@@ -6,6 +6,8 @@
 # Creation Date: 10/24/2024
 
 from db import query
+from eager import load_many, preload
+from identity_map import hydrate, lookup
 
 
 class University:
@@ -13,6 +15,10 @@ class University:
     Class which contains information about a university
     Identified mainly by the acronym of the university (e.g KU).
     """
+    __slots__ = ("id", "name", "acronym", "description", "logo", "sort_course_type")
+
+    relations = {} # Relationships that eager.preload can batch load
+
     def __init__(self, id, name, acronym, description, logo = None):
         self.id          = id          # db id
         self.name        = name        # ex: University of Kansas
@@ -38,13 +44,27 @@ class University:
                 WHERE university = ?
                 ORDER BY {self.sort_course_type} desc;                
             """
-        # Convert each database row into a Course object.
-        return [Course(*params, self.id) for params in query(
-           query_str,
-            (self.id,)
-        )]
+        # Convert each database row into a Course object,
+        # with the departments the listing shows.
+        return preload(query(
+            query_str,
+            (self.id,),
+            factory = lambda *params: Course.from_row(*params, self.id)
+        ), "department", "university")
 
 
+    @staticmethod
+    def from_row(id, name, acronym, description, logo = None):
+        """
+        Construct a university from a database row,
+        reusing the request's copy if already loaded.
+        """
+        return hydrate(
+            ("university", id),
+            lambda: University(id, name, acronym, description, logo),
+            ("university", "acronym", acronym)
+        )
+
     @staticmethod
     def get_university_by_id(id: int):
         """
@@ -52,13 +72,27 @@ class University:
         Return None if university not found.
         """
 
-        params = query(
-            "SELECT id, name, acronym, description FROM universities WHERE id = ?;",
-            (id,),
-            count = 1
+        def load():
+            return query(
+                "SELECT id, name, acronym, description FROM universities WHERE id = ?;",
+                (id,),
+                count   = 1,
+                factory = University.from_row
+            ) or None # None if university not found
+
+        return lookup(("university", id), load)
+
+    @staticmethod
+    def get_universities_by_ids(ids: list):
+        """
+        Get universities by their database ids in one query.
+        Returns a dict of id -> University of the ids found.
+        """
+        return load_many(
+            "university", ids,
+            "SELECT id, name, acronym, description FROM universities",
+            University.from_row
         )
-        if not params: return None # University not found
-        return University(*params) # Construct university object
 
     @staticmethod
     def get_university_by_name(name: str):
@@ -69,13 +103,12 @@ class University:
         :returns: University object or None if course not found.
         """
 
-        params = query(
+        return query(
             "SELECT id, name, acronym, description FROM universities WHERE name = ?;",
             (name,),
-            count = 1
-        )
-        if not params: return None # University not found
-        return University(*params) # Construct university object
+            count   = 1,
+            factory = University.from_row
+        ) or None # None if university not found
 
     @staticmethod
     def get_university_by_acronym(acronym: str):
@@ -86,13 +119,15 @@ class University:
         :returns: University object or None if course not found.
         """
 
-        params = query(
-            "SELECT id, name, acronym, description FROM universities WHERE acronym = ?;",
-            (acronym.upper(),),
-            count = 1
-        )
-        if not params: return None # University not found
-        return University(*params) # Construct university object
+        def load():
+            return query(
+                "SELECT id, name, acronym, description FROM universities WHERE acronym = ?;",
+                (acronym.upper(),),
+                count   = 1,
+                factory = University.from_row
+            ) or None # None if university not found
+
+        return lookup(("university", "acronym", acronym.upper()), load)
 
     @staticmethod
     def get_all_universities():
@@ -103,6 +138,7 @@ class University:
         # @TODO: Memoize this. This has bad performance rn.
 
         # Convert database rows into University objects
-        return [University(*params) for params in query(
-            "SELECT id, name, acronym, description FROM universities;"
-        )]
+        return query(
+            "SELECT id, name, acronym, description FROM universities;",
+            factory = University.from_row
+        )
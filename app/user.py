@@ -5,21 +5,37 @@
 # Authors: Xavier Ruyle, Andrew Ward
 # Creation Date: 10/24/2024
 
+import threading
+from collections import OrderedDict
+
 from db import query
+from eager import load_many, preload
+from identity_map import hydrate, lookup
 from university import University
 from course import Course
 from session import SESSION
-from datetime import datetime
 
 class User:
     """
     Class which contains information about users on the site
     """
+    __slots__ = ("id", "username", "profile_img", "_created")
+
+    relations = {} # Relationships that eager.preload can batch load
+
     def __init__(self, id, username):
         self.id          = id       # db id
         self.username    = username # full name of the user
         self.profile_img = None     # image id (stored on db?)
-        self.created     = datetime.now()
+        self._created    = None     # Loaded on first access
+
+    @property
+    def created(self):
+        """Time the user registered, loaded on first access."""
+        if self._created is None:
+            row = query("SELECT created FROM users WHERE id = ?;", (self.id,), count = 1)
+            self._created = row[0] if row else None
+        return self._created
 
     @property
     def followed_universities(self):
@@ -29,15 +45,16 @@ class User:
         """
 
         # Convert each database row to a University object.
-        return [University(*params) for params in query(
+        return query(
             """
                 SELECT DISTINCT universities.id, name, acronym, description
                 FROM universities INNER JOIN user_universities
                 ON universities.id = user_universities.university
                 WHERE user = ?;
             """,
-            (self.id,)
-        )]
+            (self.id,),
+            factory = University.from_row
+        )
 
     @property
     def followed_courses(self):
@@ -46,16 +63,26 @@ class User:
         Returns a list of the followed courses.
         """
 
-        # Convert each database row to a Course object.
-        return [Course(*params) for params in query(
+        # Convert each database row to a Course object,
+        # with the universities and departments shown.
+        return preload(query(
             """
                 SELECT DISTINCT courses.id, name, description, course_number, department, university
                 FROM courses INNER JOIN user_courses
                 ON courses.id = user_courses.course
                 WHERE user = ?;
             """,
-            (self.id,)
-        )]
+            (self.id,),
+            factory = Course.from_row
+        ), "department", "university")
+
+    @staticmethod
+    def from_row(id, username):
+        """
+        Construct a user from a database row,
+        reusing the request's copy if already loaded.
+        """
+        return hydrate(("user", id), lambda: User(id, username))
 
     @staticmethod
     def get_user_by_id(id: int):
@@ -64,16 +91,26 @@ class User:
         Return None if user not found.
         """
 
-        params = query(
-            """
-                SELECT id, username FROM users
-                WHERE id = ?;
-            """,
-            (id,),
-            count = 1
-        )
-        if not params: return None # User not found
-        return User(*params)       # Construct User object
+        def load():
+            return query(
+                """
+                    SELECT id, username FROM users
+                    WHERE id = ?;
+                """,
+                (id,),
+                count   = 1,
+                factory = User.from_row
+            ) or None # None if user not found
+
+        return lookup(("user", id), load)
+
+    @staticmethod
+    def get_users_by_ids(ids: list):
+        """
+        Get users by their database ids in one query.
+        Returns a dict of id -> User of the ids found.
+        """
+        return load_many("user", ids, "SELECT id, username FROM users", User.from_row)
 
     @staticmethod
     def get_user_by_username(username: str):
@@ -82,24 +119,16 @@ class User:
         :param username: The username.
         """
 
-        # @TEMPORARY: This is just a stopgap to
-        # allow the session based code to work
-        # for development purposes only.
-        for user in list(USERS.values()):
-            if user.username == username:
-                return user
-
         # Query the database for user data.
-        params = query(
+        return query(
             f"""
                 SELECT id, username FROM users
                 WHERE username = ?;
             """,
             (username,),
-            count = 1
-        )
-        if not params: return None # Course not found
-        return User(*params)       # Construct course object
+            count   = 1,
+            factory = User.from_row
+        ) or None # None if user not found
 
     def _get_image_db(self):
         """
@@ -107,4 +136,79 @@ class User:
         """
         pass
 
-USERS = {SESSION.current_user_id: User(1, "DEV")}  # USERS container (user id as key, User object instance as value)
\ No newline at end of file
+class UserCache:
+    """
+    LRU of User objects by user id, shared by the requests
+    of a worker process. Misses are loaded from the users
+    table, so any worker can resolve the user of a session
+    (USERS[SESSION.current_user_id]) and hits take no query.
+    """
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries      # Users kept before evicting
+        self.users       = OrderedDict()    # User id -> User
+        self.lock        = threading.Lock() # Guards users and metrics
+
+        # Statistics
+        self.hits   = 0 # Users served from the cache
+        self.misses = 0 # Users loaded from the database
+
+    def get(self, id: int, default = None):
+        """Get a user by id, default if there is no such user."""
+
+        if id is None:
+            return default
+
+        with self.lock:
+            user = self.users.get(id)
+            if user is not None:
+                self.hits += 1
+                self.users.move_to_end(id)
+                return user
+            self.misses += 1
+
+        user = query("SELECT id, username FROM users WHERE id = ?;", (id,), count = 1, factory = User)
+        if not user:
+            return default
+
+        self[id] = user
+        return user
+
+    def __getitem__(self, id: int):
+        user = self.get(id)
+        if user is None:
+            raise KeyError(id)
+        return user
+
+    def __setitem__(self, id: int, user: User):
+        with self.lock:
+            self.users[id] = user
+            self.users.move_to_end(id)
+            if len(self.users) > self.max_entries:
+                self.users.popitem(last = False)
+
+    def __contains__(self, id: int):
+        return self.get(id) is not None
+
+    def pop(self, id: int, default = None):
+        """Forget a user (ex: after renaming it)."""
+        with self.lock:
+            return self.users.pop(id, default)
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+
+    @property
+    def stats(self):
+        """Hit rate of the cache."""
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits"    : self.hits,
+                "misses"  : self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries" : len(self.users)
+            }
+
+USERS = UserCache()  # USERS container (user id as key, User object instance as value)
\ No newline at end of file
@@ -0,0 +1,85 @@
+# Filename: versions.py
+# Description: This module contains the per-entity version counters used for ETags
+# Inputs: N/A
+# Output: N/A
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+from db import query, query_many
+
+"""
+Every write that changes what a course, university, or
+post page shows bumps the version of that entity in the
+entity_versions table, in the same transaction as the
+write. Pages derive a weak ETag from these versions so a
+refresh of an unchanged page can be answered with a 304
+without rendering it. Kinds used: "university", "course",
+"post" and "user" (for what the user follows).
+"""
+
+def bump(*entities: tuple):
+    """
+    Increment the version of every given entity.
+    :param entities: (kind, id) tuples, ex: ("course", 4).
+    """
+
+    entities = [entity for entity in entities if entity[1] is not None]
+    if not entities:
+        return
+
+    query_many(
+        """
+        INSERT INTO entity_versions (kind, id, version) VALUES (?, ?, 1)
+        ON CONFLICT (kind, id) DO UPDATE SET version = version + 1;
+        """,
+        entities
+    )
+
+def bump_post(post_id: int):
+    """
+    Bump the version of a post and of every post above it,
+    since each of their pages shows the post's subtree.
+    :param post_id: Id of the changed post or reply.
+    """
+
+    # Parents are looked up with a scalar subquery rather than a
+    # join, which SQLite would plan with a Bloom filter built by
+    # scanning the whole posts table on every call.
+    bump(*(("post", id) for (id,) in query(
+        """
+        WITH RECURSIVE ancestors(id) AS (
+            SELECT ?
+            UNION ALL
+            SELECT (SELECT parent FROM posts WHERE posts.id = ancestors.id)
+            FROM ancestors WHERE ancestors.id IS NOT NULL
+        )
+        SELECT id FROM ancestors WHERE id IS NOT NULL;
+        """,
+        (post_id,)
+    )))
+
+def version(kind: str, id: int):
+    """Current version of an entity (0 if never bumped)."""
+
+    row = query(
+        "SELECT version FROM entity_versions WHERE kind = ? AND id = ?;",
+        (kind, id),
+        count = 1
+    )
+    return row[0] if row else 0
+
+def etag(kind: str, id: int, user_id: int = None):
+    """
+    Weak ETag value of an entity's page as seen by a user.
+    The user's id and follow version are part of it since
+    the sidebar shows what they follow. One query.
+    """
+
+    versions = dict(query(
+        """
+        SELECT kind, version FROM entity_versions
+        WHERE (kind = ? AND id = ?) OR (kind = 'user' AND id = ?);
+        """,
+        (kind, id, user_id)
+    ))
+    return f"{kind}-{id}-{versions.get(kind, 0)}-u{user_id}-{versions.get('user', 0)}"
@@ -0,0 +1,138 @@
+# Filename: view_tracker.py
+# Description: This module contains the buffered post view tracking
+# Inputs: N/A
+# Output: VIEW_TRACKER instance
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import threading
+import time
+from collections import Counter
+
+import db
+from db import query, query_many, transaction
+
+"""
+Writing one row per page view would put an INSERT and
+a commit on SQLite's single writer for every request.
+Instead, views are buffered in memory, deduplicated per
+(user, post, window), and written in batches by a
+background thread. The per-post totals are kept on the
+posts.views column.
+"""
+
+VIEW_WINDOW    = 30 * 60 # Seconds in which repeat views of a user count once
+FLUSH_INTERVAL = 5       # Seconds between background flushes
+FLUSH_SIZE     = 500     # Buffered views that trigger an early flush
+BUFFER_LIMIT   = 100000  # Max buffered views kept if flushes keep failing
+
+ANONYMOUS_USER = 0 # User id recorded for views without a login
+
+class ViewTracker:
+    """
+    Buffers post view events and flushes them to the
+    database in batched transactions on a background
+    thread, or on demand (ex: when shutting down).
+    """
+    def __init__(self):
+        self.buffer  = []                # (user, post, timestamp) events
+        self.seen    = set()             # (user, post, window) recorded
+        self.lock    = threading.Lock()  # Guards the buffer and seen set
+        self.wake    = threading.Event() # Wakes the flush thread early
+        self.stopped = threading.Event() # Tells the flush thread to exit
+        self.thread  = None              # Background flush thread
+
+    def record(self, user_id: int, post_id: int):
+        """
+        Record that a user viewed a post. Repeat views of
+        a logged in user within VIEW_WINDOW are ignored.
+
+        :param user_id: Id of the viewer, None if not logged in.
+        :param post_id: Id of the viewed post.
+        """
+
+        now = time.time()
+
+        with self.lock:
+            if user_id is not None:
+                key = (user_id, post_id, int(now // VIEW_WINDOW))
+                if key in self.seen:
+                    return
+                self.seen.add(key)
+
+            self.buffer.append((user_id or ANONYMOUS_USER, post_id, now))
+            buffered = len(self.buffer)
+
+        self.start()
+        if buffered >= FLUSH_SIZE:
+            self.wake.set()
+
+    def flush(self):
+        """
+        Write every buffered view in one transaction: the raw
+        view rows and the per-post view count increments.
+        Failed batches are put back to be retried later.
+
+        :returns: Number of views written.
+        """
+
+        with self.lock:
+            events, self.buffer = self.buffer, []
+
+            # Forget the dedup keys of windows that have passed.
+            window    = int(time.time() // VIEW_WINDOW)
+            self.seen = {key for key in self.seen if key[2] >= window - 1}
+
+        if not events:
+            return 0
+
+        written = False
+        with transaction():
+            query_many(
+                "INSERT INTO user_post_views (created, user, post) VALUES (?, ?, ?);",
+                [
+                    (time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(at)), user, post)
+                    for user, post, at in events
+                ]
+            )
+            query_many(
+                "UPDATE posts SET views = views + ? WHERE id = ?;",
+                [(count, post) for post, count in Counter(post for _, post, _ in events).items()]
+            )
+            written = True
+
+        # Return the connection so the thread doesn't hold one.
+        db.pool.release()
+
+        if not written:
+            with self.lock:
+                self.buffer = (events + self.buffer)[-BUFFER_LIMIT:]
+            return 0
+
+        return len(events)
+
+    def run(self):
+        """Background thread loop, flushes every FLUSH_INTERVAL."""
+        while not self.stopped.is_set():
+            self.wake.wait(FLUSH_INTERVAL)
+            self.wake.clear()
+            self.flush()
+
+    def start(self):
+        """Start the background flush thread if not running."""
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target = self.run, name = "view-tracker", daemon = True)
+                    self.thread.start()
+
+    def stop(self):
+        """Stop the background thread and flush what is left."""
+        self.stopped.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+# Tracker of the post page views.
+VIEW_TRACKER = ViewTracker()
@@ -0,0 +1,301 @@
+# Filename: generate.py
+# Description: This module generates deterministic synthetic datasets for the benchmarks
+# Inputs: Scale preset, seed, output path (command line)
+# Output: SQLite database with the app's current schema
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import argparse
+import heapq
+import os
+import random
+import sqlite3
+import sys
+import time
+
+"""
+Builds a UniHive database that looks like a busy site:
+course activity is Zipf distributed (a few courses hold
+most of the posts), thread sizes are heavy tailed, and
+replies tend to answer the latest reply so some threads
+get deep. The same scale and seed always produce the
+same database, so benchmark runs can be compared.
+
+The schema comes from the app itself (create_tables()
+and the migrations), the rows are bulk inserted with
+their denormalized counters and hot scores already set.
+"""
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app")
+
+# Rows generated by each preset.
+SCALES = {
+    "tiny": {
+        "universities": 5,  "departments": 6,  "courses": 200,   "users": 500,
+        "posts": 5000,      "votes": 10000,    "ratings": 1000,   "follows": 3
+    },
+    "small": {
+        "universities": 20, "departments": 10, "courses": 2000,  "users": 5000,
+        "posts": 100000,    "votes": 200000,   "ratings": 10000,  "follows": 5
+    },
+    "default": {
+        "universities": 50, "departments": 12, "courses": 20000, "users": 50000,
+        "posts": 2000000,   "votes": 4000000,  "ratings": 100000, "follows": 8
+    }
+}
+
+DEFAULT_SEED = 581
+BATCH_SIZE   = 10000 # Rows per executemany call
+
+COURSE_SKEW = 1.1  # Zipf exponent of posts per course
+THREAD_SKEW = 1.3  # Pareto shape of replies per thread (lower = heavier tail)
+MAX_REPLIES = 2000 # Cap on the replies of one thread
+DEEPEN      = 0.6  # Chance a reply answers the thread's latest post
+
+START = 1704067200  # Posts are spread over the year from 2024-01-01 UTC
+SPAN  = 365 * 86400
+
+WORDS = [
+    "intro", "advanced", "systems", "theory", "applied", "data", "networks",
+    "design", "analysis", "methods", "principles", "software", "modern",
+    "history", "physics", "chemistry", "biology", "calculus", "algebra",
+    "statistics", "ethics", "economics", "writing", "security", "robotics"
+]
+
+DEPARTMENTS = [
+    "EECS", "MATH", "PHYS", "CHEM", "BIOL", "ECON", "HIST", "ENGL",
+    "PSYC", "PHIL", "STAT", "MECH", "CIVL", "ARCH", "MUSC", "LING"
+]
+
+def timestamp(seconds: float):
+    """SQLite timestamp (YYYY-MM-DD HH:MM:SS, UTC) of epoch seconds."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(seconds))
+
+def zipf_weights(count: int, skew: float):
+    """Cumulative Zipf weights of ranks 1..count."""
+
+    total   = 0.0
+    weights = []
+    for rank in range(1, count + 1):
+        total += 1 / rank ** skew
+        weights.append(total)
+    return weights
+
+def insert(connection, table: str, columns: tuple, rows):
+    """Bulk insert rows (any iterable) in BATCH_SIZE chunks."""
+
+    statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))});"
+    batch     = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            connection.executemany(statement, batch)
+            batch = []
+    if batch:
+        connection.executemany(statement, batch)
+
+def generate(path: str, scale: dict, seed: int):
+    """
+    Generate a dataset.
+
+    :param path: Database file to create (must not exist).
+    :param scale: Row counts, one of SCALES.
+    :param seed: Random seed, same seed same dataset.
+    """
+
+    # Let the app create the schema on the new file.
+    os.environ["UNIHIVE_DATABASE"] = path
+    sys.path.insert(0, APP_DIR)
+    import db
+    from ranking import COURSE_TOP_POSTS, course_score, post_score
+    db.pool.close_all()
+
+    rng        = random.Random(seed)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode = WAL;")
+    connection.execute("PRAGMA synchronous = OFF;")
+
+    # Universities, departments and courses.
+    universities = scale["universities"]
+    insert(connection, "universities", ("id", "name", "acronym", "description"), (
+        (id, f"University {id}", f"U{id}", f"Synthetic university {id}")
+        for id in range(1, universities + 1)
+    ))
+
+    departments = []
+    for university in range(1, universities + 1):
+        for abbreviation in rng.sample(DEPARTMENTS, min(scale["departments"], len(DEPARTMENTS))):
+            # Named like the create course page does (ex: eecs, EECS).
+            departments.append((len(departments) + 1, abbreviation.lower(), abbreviation, university))
+    insert(connection, "departments", ("id", "name", "abbreviation", "university"), departments)
+
+    courses = []
+    numbers = {}
+    for id in range(1, scale["courses"] + 1):
+        department = rng.choice(departments)
+        taken      = numbers.setdefault(department[0], set())
+        number     = rng.randrange(100, 1000)
+        while number in taken:
+            number = rng.randrange(100, 1000)
+        taken.add(number)
+
+        name = " ".join(rng.sample(WORDS, 3)).title()
+        courses.append((id, timestamp(START + rng.random() * SPAN), name, "", str(number), department[0], rng.choice((1, 3, 3, 4)), department[3]))
+    insert(connection, "courses", ("id", "created", "name", "description", "course_number", "department", "hours", "university"), courses)
+
+    # Users and what they follow.
+    users = scale["users"]
+    insert(connection, "users", ("id", "username", "password"), (
+        (id, f"user{id}", "benchmark") for id in range(1, users + 1)
+    ))
+    insert(connection, "user_universities", ("user", "university"), (
+        (user, university)
+        for user in range(1, users + 1)
+        for university in rng.sample(range(1, universities + 1), min(rng.randint(1, 3), universities))
+    ))
+    insert(connection, "user_courses", ("user", "course"), (
+        (user, course)
+        for user in range(1, users + 1)
+        for course in rng.sample(range(1, len(courses) + 1), rng.randint(0, scale["follows"]))
+    ))
+
+    # Posts: whole threads at a time, mostly in popular courses.
+    course_weights = zipf_weights(len(courses), COURSE_SKEW)
+    course_order   = list(range(1, len(courses) + 1))
+    rng.shuffle(course_order) # Popularity independent of course id
+
+    def threads():
+        """Rows of the posts table, one thread at a time."""
+
+        total = 0
+        while total < scale["posts"]:
+            course  = rng.choices(course_order, cum_weights = course_weights)[0]
+            author  = rng.randint(1, users)
+            created = START + rng.random() * SPAN
+            root    = total + 1
+            rows    = [[root, created, f"Question about {rng.choice(WORDS)} {root}", f"Post body {root}", f"user{author}", author, course, 0, False, None]]
+
+            # Replies mostly answer the latest reply, so threads get deep.
+            replies = min(int(rng.paretovariate(THREAD_SKEW)) - 1, MAX_REPLIES, scale["posts"] - root)
+            for id in range(root + 1, root + replies + 1):
+                parent  = id - 1 if rng.random() < DEEPEN else rng.randint(root, id - 1)
+                created = rows[parent - root][1] + rng.random() * 86400
+                author  = rng.randint(1, users)
+                rows.append([id, created, "", f"Reply body {id}", author, author, course, 0, True, parent])
+                rows[parent - root][7] += 1
+
+            total += len(rows)
+            for row in rows:
+                row[1] = timestamp(row[1])
+                yield (*row, int(rng.paretovariate(1.0) * 10))
+
+    insert(connection, "posts", (
+        "id", "created", "title", "content", "author", "author_id",
+        "course", "reply_count", "is_reply", "parent", "views"
+    ), threads())
+
+    # Votes, skewed towards a small set of posts. Repeat votes
+    # of a user replace their earlier vote (UNIQUE constraint).
+    post_weights = zipf_weights(scale["posts"], 0.8)
+    post_order   = list(range(1, scale["posts"] + 1))
+    rng.shuffle(post_order)
+
+    def votes():
+        """Rows of the user_post_likes table."""
+        for start in range(0, scale["votes"], BATCH_SIZE):
+            count = min(BATCH_SIZE, scale["votes"] - start)
+            for post in rng.choices(post_order, cum_weights = post_weights, k = count):
+                yield (rng.random() < 0.8, rng.randint(1, users), post)
+
+    insert(connection, "user_post_likes", ("is_like", "user", "post"), votes())
+
+    # Counters and hot scores, as the app would have left them.
+    connection.execute(
+        """
+        UPDATE posts SET
+            likes    = (SELECT COUNT(*) FROM user_post_likes
+                        WHERE post = posts.id AND is_like = TRUE),
+            dislikes = (SELECT COUNT(*) FROM user_post_likes
+                        WHERE post = posts.id AND is_like = FALSE);
+        """
+    )
+    connection.create_function("post_score", 5, post_score, deterministic = True)
+    connection.execute(
+        """
+        UPDATE posts SET hot = post_score(created, likes, dislikes, reply_count, views)
+        WHERE parent IS NULL;
+        """
+    )
+
+    top_posts = {} # Course -> hot scores of its hottest posts
+    for course, hot in connection.execute("SELECT course, hot FROM posts WHERE parent IS NULL;"):
+        scores = top_posts.setdefault(course, [])
+        heapq.heappush(scores, hot)
+        if len(scores) > COURSE_TOP_POSTS:
+            heapq.heappop(scores)
+    connection.executemany(
+        "UPDATE courses SET hot = ? WHERE id = ?;",
+        [(course_score(scores), course) for course, scores in top_posts.items()]
+    )
+    connection.execute("DELETE FROM ranking_dirty;")
+
+    # Course ratings and their aggregates.
+    ratings = {}
+    for _ in range(scale["ratings"]):
+        course = rng.choices(course_order, cum_weights = course_weights)[0]
+        ratings[(rng.randint(1, users), course)] = (
+            rng.randint(1, 10), rng.randint(0, 4), rng.choice((1, 3, 3, 4)), f"Professor {rng.randint(1, 5)}"
+        )
+    insert(connection, "course_ratings", ("user", "course", "difficulty", "grade", "hours", "instructor"), (
+        (user, course, *rating) for (user, course), rating in ratings.items()
+    ))
+    connection.execute(
+        """
+        INSERT INTO course_stats (course, difficulty_sum, difficulty_count, grade_sum, grade_count)
+        SELECT course, TOTAL(difficulty), COUNT(difficulty), TOTAL(grade), COUNT(grade)
+        FROM course_ratings GROUP BY course;
+        """
+    )
+    connection.execute(
+        """
+        INSERT INTO course_stat_counts (course, field, value, count)
+        SELECT course, 'hours', hours, COUNT(*) FROM course_ratings GROUP BY course, hours
+        UNION ALL
+        SELECT course, 'grade', grade, COUNT(*) FROM course_ratings GROUP BY course, grade
+        UNION ALL
+        SELECT course, 'instructor', instructor, COUNT(*) FROM course_ratings GROUP BY course, instructor;
+        """
+    )
+
+    connection.commit()
+    connection.execute("ANALYZE;")
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
+    counts = {table: connection.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0] for table in (
+        "universities", "courses", "users", "posts", "user_post_likes", "course_ratings"
+    )}
+    connection.close()
+    return counts
+
+def main():
+    '''
+    Entry point of the dataset generator
+    '''
+    parser = argparse.ArgumentParser(description = "Generate a synthetic UniHive dataset.")
+    parser.add_argument("--scale", choices = SCALES, default = "small", help = "size preset (default: small)")
+    parser.add_argument("--seed", type = int, default = DEFAULT_SEED, help = "random seed")
+    parser.add_argument("--out", help = "database file (default: benchmarks/data/<scale>-<seed>.db)")
+    args = parser.parse_args()
+
+    path = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", f"{args.scale}-{args.seed}.db")
+    if os.path.exists(path):
+        print(f"[GENERATE ERROR] {path} already exists")
+        sys.exit(1)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+
+    start  = time.perf_counter()
+    counts = generate(path, SCALES[args.scale], args.seed)
+    print(f"[GENERATE] {path}: {counts} ({time.perf_counter() - start:.1f}s)")
+
+if __name__ == "__main__":
+    main()
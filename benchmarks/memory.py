@@ -0,0 +1,139 @@
+# Filename: memory.py
+# Description: This module measures the memory footprint of the model objects
+# Inputs: Dataset from generate.py (command line)
+# Output: Bytes per object of each model, JSON results
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+"""
+Builds COUNT objects of each model class from rows of a
+dataset and reports what one object costs: its own size
+(the instance plus its __dict__, if it has one) and the
+memory retained per object once built, which includes
+everything the constructor loaded along with it (ex: the
+author and course of a post) and the identity map entries.
+
+    python benchmarks/memory.py benchmarks/data/small-581.db --out memory.json
+
+Like run.py, it works on a scratch copy of the dataset.
+"""
+
+ROOT    = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+APP_DIR = os.path.join(ROOT, "app")
+
+COUNT = 10000 # Objects built per model
+
+def models():
+    """(name, class, SQL selecting the constructor's arguments) of every model."""
+
+    from course import Course
+    from department import Department
+    from post import Post
+    from university import University
+    from user import User
+
+    return [
+        ("University", University, "SELECT id, name, acronym, description FROM universities"),
+        ("Department", Department, "SELECT id, name, abbreviation, university FROM departments"),
+        ("Course",     Course,     "SELECT id, name, description, course_number, department, university FROM courses"),
+        ("Post",       Post,       "SELECT id, created, title, content, author_id, course FROM posts"),
+        ("User",       User,       "SELECT id, username FROM users")
+    ]
+
+def own_size(entity):
+    """Bytes of an object itself, with its __dict__ if it has one."""
+
+    size = sys.getsizeof(entity)
+    if hasattr(entity, "__dict__"):
+        size += sys.getsizeof(entity.__dict__)
+    return size
+
+def measure(app, connection, cls, sql: str, count: int):
+    """
+    Build up to count objects of a model class from the
+    rows of sql inside a fresh app context.
+
+    :returns: The measurements of the model.
+    """
+
+    rows = connection.execute(f"{sql} ORDER BY id LIMIT ?;", (count,)).fetchall()
+
+    with app.app_context():
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        start  = time.perf_counter()
+
+        entities = [cls(*row) for row in rows]
+
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        result = {
+            "objects"             : len(entities),
+            "own_bytes"           : own_size(entities[0]) if entities else 0,
+            "retained_per_object" : retained / len(entities) if entities else 0,
+            "build_us_per_object" : elapsed / len(entities) * 1e6 if entities else 0
+        }
+        del entities
+    return result
+
+def main():
+    '''
+    Entry point of the memory benchmark
+    '''
+    parser = argparse.ArgumentParser(description = "Measure the memory footprint of the UniHive models.")
+    parser.add_argument("dataset", help = "database file from generate.py")
+    parser.add_argument("--count", type = int, default = COUNT, help = "objects built per model")
+    parser.add_argument("--out", help = "write the results to this JSON file")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.dataset):
+        print(f"[BENCHMARK ERROR] {args.dataset} not found, see benchmarks/generate.py")
+        sys.exit(1)
+
+    # Point the app at a scratch copy before importing it.
+    scratch = tempfile.mkdtemp(prefix = "unihive-memory-")
+    shutil.copyfile(args.dataset, os.path.join(scratch, "bench.db"))
+    os.environ["UNIHIVE_DATABASE"] = os.path.join(scratch, "bench.db")
+    sys.path.insert(0, APP_DIR)
+    import db
+    from flask import Flask
+
+    app        = Flask("benchmarks")
+    connection = sqlite3.connect(os.environ["UNIHIVE_DATABASE"])
+    results    = {}
+
+    try:
+        db.pool.connection() # Migrate the scratch copy first
+        for name, cls, sql in models():
+            results[name] = measure(app, connection, cls, sql, args.count)
+            print(
+                f"{name:<12} {results[name]['own_bytes']:6d} B own "
+                f"{results[name]['retained_per_object']:10.1f} B retained "
+                f"{results[name]['build_us_per_object']:8.2f} us to build"
+            )
+    finally:
+        connection.close()
+        db.pool.close_all()
+        shutil.rmtree(scratch, ignore_errors = True)
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump({"dataset": os.path.basename(args.dataset), "count": args.count, "results": results}, file, indent = 2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+# Filename: run.py
+# Description: This module runs the model level microbenchmarks
+# Inputs: Dataset from generate.py, optional baseline results (command line)
+# Output: JSON results, regressions against the baseline
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+"""
+Times the core model accessors and db_util functions on a
+dataset from generate.py and counts the queries each call
+makes. Write benchmarks run on a scratch copy of the
+dataset, so the dataset itself is never modified and runs
+stay comparable.
+
+    python benchmarks/generate.py --scale small
+    python benchmarks/run.py benchmarks/data/small-581.db --out before.json
+    ... change something ...
+    python benchmarks/run.py benchmarks/data/small-581.db --baseline before.json
+
+Each call runs in a fresh Flask app context, so it gets
+its own identity map like a request would.
+"""
+
+ROOT    = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+APP_DIR = os.path.join(ROOT, "app")
+
+REPEAT    = 20   # Timed calls per benchmark
+THRESHOLD = 0.25 # Slowdown of the median that counts as a regression
+SEED      = 581  # Seed of the sampled users/courses/posts
+
+class QueryCounter:
+    """
+    Counts the SQL statements a connection runs, using
+    SQLite's trace hook. Transaction control statements
+    and the statements run by triggers are not counted.
+    """
+    def __init__(self, connection: sqlite3.Connection):
+        self.count = 0 # Statements since the last reset
+        connection.set_trace_callback(self.trace)
+
+    def trace(self, statement: str):
+        """Called by SQLite for every statement it runs."""
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        if keyword not in ("BEGIN", "COMMIT", "ROLLBACK", "--"):
+            self.count += 1
+
+    def reset(self):
+        """Start counting from zero again."""
+        self.count = 0
+
+def percentile(values: list, fraction: float):
+    """Nearest rank percentile of a list of numbers."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def sample(path: str):
+    """
+    Pick the entities the benchmarks run on: the biggest and
+    a median sized one of each kind, chosen by the data so
+    the same dataset always gets the same picks.
+    """
+
+    connection = sqlite3.connect(path)
+    one        = lambda sql: connection.execute(sql).fetchone()[0]
+    rng        = random.Random(SEED)
+
+    picks = {
+        "university"    : one("SELECT university FROM courses GROUP BY university ORDER BY COUNT(*) DESC, university LIMIT 1;"),
+        "course_popular": one("SELECT course FROM posts WHERE parent IS NULL GROUP BY course ORDER BY COUNT(*) DESC, course LIMIT 1;"),
+        "course_median" : one(
+            """
+            SELECT course FROM posts WHERE parent IS NULL GROUP BY course ORDER BY COUNT(*), course
+            LIMIT 1 OFFSET (SELECT COUNT(DISTINCT course) FROM posts WHERE parent IS NULL) / 2;
+            """
+        ),
+        "post_busy"     : one("SELECT id FROM posts ORDER BY reply_count DESC, id LIMIT 1;"),
+        # Generated threads have consecutive ids, so a thread's
+        # size is the gap to the next top-level post's id.
+        "thread_big"    : one(
+            """
+            SELECT id FROM (
+                SELECT id, LEAD(id, 1, (SELECT MAX(id) + 1 FROM posts)) OVER (ORDER BY id) - id AS size
+                FROM posts WHERE parent IS NULL
+            )
+            ORDER BY size DESC, id LIMIT 1;
+            """
+        ),
+        "user"          : rng.randint(1, one("SELECT MAX(id) FROM users;")),
+        "search"        : one("SELECT name FROM courses ORDER BY id LIMIT 1;").split()[0]
+    }
+    connection.close()
+    return picks
+
+def benchmarks(picks: dict):
+    """
+    The benchmarks as (name, setup, call) tuples. setup runs
+    once, outside of the timing, and returns the argument of
+    call (ex: the model object the accessor is read from).
+    """
+
+    import db_util
+    from course import Course, Grade
+    from post import Post
+    from session import SESSION
+    from university import University
+    from user import USERS, User
+
+    # The store functions act as the current user.
+    SESSION.current_user_id = picks["user"]
+    USERS[picks["user"]]    = User.get_user_by_id(picks["user"])
+
+    course  = lambda key: lambda: Course.get_course_by_id(picks[key])
+    post    = lambda key: lambda: Post.get_post_by_id(picks[key])
+    user    = lambda: User.get_user_by_id(picks["user"])
+    nothing = lambda: None
+
+    return [
+        # Model accessors
+        ("University.courses",              lambda: University.get_university_by_id(picks["university"]), lambda university: university.courses),
+        ("Course.posts (popular)",          course("course_popular"), lambda course: course.posts),
+        ("Course.posts (median)",           course("course_median"),  lambda course: course.posts),
+        ("Course.average_difficulty",       course("course_popular"), lambda course: course.average_difficulty),
+        ("Course.credit_hours",             course("course_popular"), lambda course: course.credit_hours),
+        ("Course.instructors",              course("course_popular"), lambda course: course.instructors),
+        ("Post.replies",                    post("post_busy"),  lambda post: post.replies),
+        ("Post.thread",                     post("thread_big"), lambda post: post.thread().reply_count),
+        ("User.followed_courses",           user, lambda user: user.followed_courses),
+        ("User.followed_universities",      user, lambda user: user.followed_universities),
+        ("Course.get_course_by_id",         nothing, lambda _: Course.get_course_by_id(picks["course_median"])),
+        ("Post.get_post_by_id",             nothing, lambda _: Post.get_post_by_id(picks["post_busy"])),
+
+        # Listings with the relations their templates show
+        ("Listing: University.courses",     lambda: University.get_university_by_id(picks["university"]),
+            lambda university: [course.name_combined for course in university.courses]),
+        ("Listing: Course.posts (popular)", course("course_popular"),
+            lambda course: [(post.author, post.course.name) for post in course.posts]),
+        ("Listing: User.followed_courses",  user,
+            lambda user: [(course.university.acronym, course.name_combined) for course in user.followed_courses]),
+        ("Listing: db_util.get_feed_page",  nothing,
+            lambda _: [(post.author, post.course.name) for post in db_util.get_feed_page()[0]]),
+
+        # db_util reads
+        ("db_util.get_feed_page",           nothing, lambda _: db_util.get_feed_page()),
+        ("db_util.get_home_page",           nothing, lambda _: db_util.get_home_page()),
+        ("db_util.search_for_university",   nothing, lambda _: db_util.search_for_university("univ")),
+        ("db_util.search_for_course",       nothing, lambda _: db_util.search_for_course(picks["search"], "U1")),
+        ("db_util.get_uni_and_course_from_route", lambda: Course.get_course_by_id(picks["course_median"]),
+            lambda course: db_util.get_uni_and_course_from_route(course.university.acronym, course.name_combined)),
+
+        # db_util / model writes
+        ("db_util.store_post",              course("course_median"), lambda course: db_util.store_post(course, "Benchmark", "Benchmark post")),
+        ("db_util.store_course_info",       course("course_median"), lambda course: db_util.store_course_info(course, 5, Grade.B, 3)),
+        ("db_util.store_course_follow",     course("course_median"), lambda course: db_util.store_course_follow(course)),
+        ("Post.add_reply",                  post("post_busy"), lambda post: post.add_reply(USERS[picks["user"]], "Benchmark reply")),
+        ("Post.toggle_like",                post("post_busy"), lambda post: post.toggle_like(USERS[picks["user"]]))
+    ]
+
+def run(path: str, repeat: int, only: str = None):
+    """
+    Run every benchmark on a scratch copy of a dataset.
+
+    :param path: Dataset from generate.py.
+    :param repeat: Timed calls per benchmark.
+    :param only: Only run benchmarks whose name contains this.
+    :returns: The results, ready to be written as JSON.
+    """
+
+    picks   = sample(path)
+    scratch = tempfile.mkdtemp(prefix = "unihive-bench-")
+    shutil.copyfile(path, os.path.join(scratch, "bench.db"))
+
+    # Point the app at the scratch copy before importing it.
+    os.environ["UNIHIVE_DATABASE"] = os.path.join(scratch, "bench.db")
+    sys.path.insert(0, APP_DIR)
+    import db
+    from flask import Flask
+
+    app     = Flask("benchmarks")
+    counter = QueryCounter(db.pool.connection())
+    results = {}
+
+    try:
+        for name, setup, call in benchmarks(picks):
+            if only and only not in name:
+                continue
+
+            with app.app_context():
+                argument = setup()
+
+            times   = []
+            queries = []
+            for _ in range(repeat + 1): # First call warms the caches
+                with app.app_context():
+                    counter.reset()
+                    start = time.perf_counter()
+                    call(argument)
+                    times.append(time.perf_counter() - start)
+                    queries.append(counter.count)
+
+            times   = times[1:]
+            queries = queries[1:]
+            results[name] = {
+                "median" : statistics.median(times),
+                "mean"   : statistics.fmean(times),
+                "min"    : min(times),
+                "p95"    : percentile(times, 0.95),
+                "queries": statistics.median(queries)
+            }
+            print(f"{name:<40} {results[name]['median'] * 1000:10.3f} ms {results[name]['queries']:8.0f} queries")
+
+    finally:
+        db.pool.close_all()
+        shutil.rmtree(scratch, ignore_errors = True)
+
+    return {
+        "meta": {
+            "dataset" : os.path.basename(path),
+            "picks"   : picks,
+            "repeat"  : repeat,
+            "commit"  : git_commit(),
+            "python"  : platform.python_version(),
+            "sqlite"  : sqlite3.sqlite_version,
+            "machine" : platform.machine(),
+            "time"    : time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        },
+        "results": results
+    }
+
+def git_commit():
+    """Current commit of the repo, None outside of git."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd = ROOT, capture_output = True, text = True, check = True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """
+    Compare results against a baseline run. A benchmark
+    regressed if its median got slower by more than the
+    threshold or if it makes more queries per call.
+
+    :returns: Names of the regressed benchmarks.
+    """
+
+    regressions = []
+    for name, result in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+
+        change = result["median"] / before["median"] - 1 if before["median"] else 0.0
+        slower = change > threshold
+        chatty = result["queries"] > before["queries"]
+        if slower or chatty:
+            regressions.append(name)
+
+        print(
+            f"{name:<40} {change:+8.1%} {before['queries']:6.0f} -> {result['queries']:<6.0f}"
+            f"{'  REGRESSION' if slower or chatty else ''}"
+        )
+
+    return regressions
+
+def main():
+    '''
+    Entry point of the benchmark runner
+    '''
+    parser = argparse.ArgumentParser(description = "Run the UniHive model benchmarks.")
+    parser.add_argument("dataset", help = "database file from generate.py")
+    parser.add_argument("--repeat", type = int, default = REPEAT, help = "timed calls per benchmark")
+    parser.add_argument("--only", help = "only run benchmarks whose name contains this")
+    parser.add_argument("--out", help = "write the results to this JSON file")
+    parser.add_argument("--baseline", help = "results JSON to compare against")
+    parser.add_argument("--threshold", type = float, default = THRESHOLD, help = "median slowdown counted as a regression")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.dataset):
+        print(f"[BENCHMARK ERROR] {args.dataset} not found, see benchmarks/generate.py")
+        sys.exit(1)
+
+    results = run(args.dataset, args.repeat, args.only)
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent = 2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f"[BENCHMARK] {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
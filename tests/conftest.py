@@ -0,0 +1,37 @@
+# Filename: conftest.py
+# Description: This module contains the shared fixtures of the tests
+# Inputs: app/database/unihive.db (copied, never modified)
+# Output: N/A
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import os
+import shutil
+import sys
+
+import pytest
+
+"""
+Runs the Flask app on a scratch copy of the database, so
+the tests can write to it. The app resolves its paths from
+the repo root, so run pytest from there:
+
+    python -m pytest -q
+"""
+
+ROOT    = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+APP_DIR = os.path.join(ROOT, "app")
+
+@pytest.fixture(scope = "session")
+def app(tmp_path_factory):
+    """The Flask app, on a copy of the database."""
+
+    database = tmp_path_factory.mktemp("unihive") / "unihive.db"
+    shutil.copyfile(os.path.join(APP_DIR, "database", "unihive.db"), database)
+
+    # Point the app at the copy before importing it.
+    os.environ["UNIHIVE_DATABASE"] = str(database)
+    os.chdir(ROOT)
+    sys.path.insert(0, APP_DIR)
+    import main
+    return main.app
@@ -0,0 +1,40 @@
+# Filename: test_assets.py
+# Description: This module tests the serving of the built static files
+# Inputs: app/static/main.css
+# Output: N/A
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import os
+
+import pytest
+
+@pytest.fixture
+def built(app, tmp_path, monkeypatch):
+    """Fingerprinted name of main.css, built into a scratch dist directory."""
+
+    from assets import ASSETS
+
+    monkeypatch.setattr(ASSETS, "dist_dir", str(tmp_path))
+    monkeypatch.setattr(ASSETS, "files", {})
+    monkeypatch.setattr(ASSETS, "variants", {})
+    monkeypatch.setattr(ASSETS, "loaded", None)
+    return ASSETS.build(["main.css"])["main.css"]
+
+def test_gzip_accepted(app, built):
+    """Clients that accept gzip get the gzip copy."""
+
+    response = app.test_client().get(f"/assets/{built}", headers = {"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+
+def test_refused_encoding(app, built):
+    """An encoding refused with q=0 is not used, the file is sent as is."""
+
+    from assets import ASSETS
+
+    response = app.test_client().get(f"/assets/{built}", headers = {"Accept-Encoding": "gzip;q=0, identity"})
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    with open(os.path.join(ASSETS.static_dir, "main.css"), "rb") as file:
+        assert response.get_data() == file.read()
@@ -0,0 +1,37 @@
+# Filename: test_catalog.py
+# Description: This module tests the course catalog import end to end
+# Inputs: N/A
+# Output: N/A
+# Authors: Andrew Ward
+# Creation Date: 10/18/2026
+
+import pytest
+
+@pytest.fixture(scope = "module")
+def client(app):
+    """Logged in test client of the app."""
+
+    client = app.test_client()
+    client.post("/register", data = {"username": "catalog", "password": "pw", "confirm_password": "pw"})
+    client.post("/login", data = {"username": "catalog", "password": "pw"})
+    return client
+
+def test_imported_course_link(client):
+    """The link to an imported course opens its page."""
+
+    response = client.post(
+        "/u/KU/import-catalog",
+        data         = b"department,department_name,course_number,course_name\n"
+                       b"MATH,Mathematics,999,Catalog Test Course\n",
+        content_type = "text/csv"
+    )
+    assert response.status_code == 200
+    assert response.get_json()["courses_created"] == 1
+
+    # The university page links to the course by its abbreviation.
+    page = client.get("/u/KU").get_data(as_text = True)
+    assert "/u/KU/MATH-999" in page
+
+    response = client.get("/u/KU/MATH-999")
+    assert response.status_code == 200
+    assert "MATH-999" in response.get_data(as_text = True)